@@ -1,5 +1,7 @@
 # app.py (Streamlit WebRTC Cloud Deployment)
 
+import time
+
 import streamlit as st
 import cv2
 from streamlit_webrtc import webrtc_streamer, VideoTransformerBase, WebRtcMode
@@ -7,6 +9,8 @@ from streamlit_webrtc import webrtc_streamer, VideoTransformerBase, WebRtcMode
 # NOTE: Assuming src.RecognitionModel and src.LogManager exist and are updated
 from src.RecognitionModel import RecognitionModel
 from src.LogManager import LogManager
+from src.EventAggregator import EventAggregator, write_events
+from src.StreamScheduler import StreamScheduler
 
 # --------------------------------------------------------
 # PAGE CONFIG (must be at the VERY top for Streamlit)
@@ -21,57 +25,66 @@ st.set_page_config(
 # --------------------------------------------------------
 @st.cache_resource
 def load_resources():
-    """Loads the heavy Recognition Model and LogManager only once."""
+    """
+    Loads the heavy Recognition Model, LogManager and EventAggregator only once,
+    plus the StreamScheduler whose single inference thread is the only caller of
+    the shared model, whatever the number of browser sessions.
+    """
     st.write("Initializing ML Models (This takes a moment)...")
     model = RecognitionModel()
     log_manager = LogManager()
+    aggregator = EventAggregator()
+    scheduler = StreamScheduler(model, detector_mode='cnn')
+    scheduler.start()
     st.write("Initialization complete.")
-    return model, log_manager
+    return model, log_manager, aggregator, scheduler
 
-model, log_manager = load_resources()
+model, log_manager, aggregator, scheduler = load_resources()
 
 
 # --------------------------------------------------------
 # VIDEO TRANSFORMER (WebRTC)
 # --------------------------------------------------------
 class FaceRecognitionTransformer(VideoTransformerBase):
-    def __init__(self, model, log_manager):
+    """
+    Non-blocking: `transform` only hands the frame to the shared scheduler
+    (which always analyzes the newest one) and draws the latest results on
+    it, so the media thread never waits for inference. Event logging happens
+    in the scheduler's result callback, off the media thread.
+    """
+
+    MAX_OVERLAY_AGE = 1.0  # Seconds before stale boxes stop being drawn
+
+    def __init__(self, model, log_manager, aggregator, scheduler):
         self.model = model
         self.log_manager = log_manager
-        self.frame_count = 0
+        self.aggregator = aggregator
+        self.scheduler = scheduler
+        self.stream_id = f"webrtc-{id(self):x}" # Sessions are kept per browser stream
+        self.latest = ([], 0.0)  # (results, monotonic time), replaced atomically by the callback
+        self.frame_slot = scheduler.create_slot()
+        scheduler.add_stream(self.stream_id, self.frame_slot, self._on_results)
+
+    def _on_results(self, seq, results):
+        # Scheduler thread
+        self.latest = (results, time.monotonic())
+        # One entry/exit per visit, rate-limited unknown-face alerts
+        write_events(self.log_manager, self.aggregator.observe(results, stream_id=self.stream_id))
 
     def transform(self, frame):
         img = frame.to_ndarray(format="bgr")
-        self.frame_count += 1
+        # The scheduler owns `img` from here on (newest frame wins)
+        self.frame_slot.put(img)
 
-        # ----------------------------------------
-        # Process only every 5 frames (boost FPS)
-        # ----------------------------------------
-        if self.frame_count % 5 != 0:
+        results, at = self.latest
+        if not results or time.monotonic() - at > self.MAX_OVERLAY_AGE:
             return img
+        return self.model.draw_results(img.copy(), results)
 
-        # ----------------------------------------
-        # HEAVY FACE RECOGNITION
-        # ----------------------------------------
-        processed_img, log_msg, recognized_user, log_data = self.model.process_frame(
-            img, detector_mode='cnn'
-        )
-
-        # If model returns None, avoid crash
-        if processed_img is None:
-            return img
-
-        # ----------------------------------------
-        # LOG EVENTS
-        # ----------------------------------------
-        if log_data and log_data.get("user_id") != "Unknown":
-            self.log_manager.log_access_event(
-                log_data.get("user_id"),
-                log_data.get("status"),
-                log_data.get("confidence")
-            )
-
-        return processed_img
+    def on_ended(self):
+        self.scheduler.remove_stream(self.stream_id)
+        self.frame_slot.close()
+        write_events(self.log_manager, self.aggregator.close(self.stream_id))
 
 
 # --------------------------------------------------------
@@ -92,7 +105,7 @@ with col1:
     webrtc_streamer(
         key="smart-office-stream",
         mode=WebRtcMode.SENDRECV,
-        video_processor_factory=lambda: FaceRecognitionTransformer(model, log_manager),
+        video_processor_factory=lambda: FaceRecognitionTransformer(model, log_manager, aggregator, scheduler),
         async_processing=True,
         media_stream_constraints={"video": True, "audio": False},
     )
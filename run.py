@@ -2,35 +2,127 @@
 
 import sys
 import argparse
-# Import CLI modules
-from src import register, recognize 
-# Import GUI module
-from PySide6.QtWidgets import QApplication
-from src.MainWindow import MainWindow 
 
 # Make the src directory accessible for absolute imports
 sys.path.append("./")
 
+# NOTE: Heavy modules (PySide6, DeepFace/TensorFlow) are imported only by the
+# branch that needs them, so CLI runs never load the GUI toolkit.
+
 if __name__ == "__main__":
     
     # Check if a specific CLI mode argument is present (e.g., 'register' or 'recognize')
     if '--mode' in sys.argv:
         # --- CLI MODE EXECUTION (OLD FUNCTIONALITY) ---
         parser = argparse.ArgumentParser(description="Smart Office Face Recognition System")
-        parser.add_argument('--mode', choices=['register', 'recognize'], required=True, help='Choose operation mode')
-        parser.add_argument('--detector', choices=['cnn', 'classical'], default='cnn', help='Choose face detector (cnn or classical)')
+        parser.add_argument('--mode', choices=['register', 'recognize', 'benchmark', 'enroll', 'compact', 'serve', 'parity', 'export-embedder'], required=True, help='Choose operation mode')
+        parser.add_argument('--detector', choices=['cnn', 'adaptive', 'classical'], default='cnn', help='Choose face detector (cnn, adaptive or classical)')
+        parser.add_argument('--index', choices=['flat', 'ivf'], default='flat', help='Gallery search index (exact flat scan or approximate IVF)')
+        parser.add_argument('--precision', choices=['float32', 'float16', 'int8'], default='float32', help='Flat index: gallery precision used for matching')
+        parser.add_argument('--rerank', type=int, default=0, help='Flat index: re-score the top N quantized candidates in float32')
+        parser.add_argument('--source', default='0', help='Camera index, video file or image directory')
+        parser.add_argument('--frames', type=int, default=None, help='Benchmark: stop after N measured frames')
+        parser.add_argument('--output', default=None, help='Benchmark: write the JSON report to this file')
+        parser.add_argument('--workers', type=int, default=None, help='Enroll: number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=32, help='Enroll: images per worker batch')
+        parser.add_argument('--max-templates', type=int, default=5, help='Enroll/compact: prototypes kept per identity')
+        parser.add_argument('--host', default='0.0.0.0', help='Serve: address to listen on')
+        parser.add_argument('--port', type=int, default=8000, help='Serve: HTTP port')
+        parser.add_argument('--log-db', default=':memory:', help='Serve: SQLite file for the access log')
+        parser.add_argument('--embedder', choices=['deepface', 'dnn'], default='deepface', help='Embedding backend (dnn = exported Facenet via ONNX Runtime/cv2.dnn, no TensorFlow)')
+        parser.add_argument('--embedder-model', default='data/models/facenet.onnx', help='Model file for --embedder dnn (and parity / export-embedder)')
         
         args = parser.parse_args()
+        if args.index != 'flat' and (args.precision != 'float32' or args.rerank):
+            parser.error("--precision/--rerank only apply to --index flat")
+        index_params = {'precision': args.precision, 'rerank': args.rerank} if args.index == 'flat' else {}
+        if args.embedder == 'dnn':
+            from src.Embedder import configure_embedder
+            configure_embedder('dnn', model_path=args.embedder_model)
 
         if args.mode == 'register':
-            register.register_user(detector=args.detector)
+            from src import register
+            register.register_user(detector=args.detector, source=args.source)
         elif args.mode == 'recognize':
+            from src import recognize
             # Note: This is CLI-only recognition, not the GUI feed
-            recognize.recognize_user(detector=args.detector)
+            recognize.recognize_user(detector=args.detector, index_type=args.index, source=args.source,
+                                     index_params=index_params)
+        elif args.mode == 'benchmark':
+            from src import benchmark
+            from src.RecognitionModel import RecognitionModel
+            benchmark.run_benchmark(
+                args.source, detector_mode=args.detector, max_frames=args.frames, output=args.output,
+                model=RecognitionModel(index_type=args.index, index_params=index_params),
+            )
+        elif args.mode == 'enroll':
+            from src import enroll
+            enroll.enroll_images(args.source, workers=args.workers, batch_size=args.batch_size,
+                                 max_templates=args.max_templates)
+        elif args.mode == 'compact':
+            from src.GalleryStore import open_gallery
+            store = open_gallery()
+            before = store.template_count()
+            store.compact(max_templates=args.max_templates)
+            print(f"INFO: Compacted {len(store)} identities from {before} to {store.template_count()} templates.")
+        elif args.mode == 'export-embedder':
+            from src.Embedder import export_deepface_onnx
+            export_deepface_onnx(args.output or args.embedder_model)
+        elif args.mode == 'parity':
+            import cv2
+            from src.Embedder import DeepFaceEmbedder, DnnEmbedder, check_parity
+            from src.FrameSource import ImageDirectorySource
+            crops = []
+            images = ImageDirectorySource(args.source)
+            while args.frames is None or len(crops) < args.frames:
+                ret, image = images.read()
+                if not ret:
+                    break
+                crops.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            report = check_parity(DeepFaceEmbedder(), DnnEmbedder(args.embedder_model), crops)
+            sys.exit(0 if report['passed'] else 1)
+        elif args.mode == 'serve':
+            from src import StreamServer
+            from src.LogManager import LogManager
+            from src.RecognitionModel import RecognitionModel
+            source = int(args.source) if args.source.isdigit() else args.source
+            StreamServer.serve(
+                host=args.host, port=args.port, source=source, detector_mode=args.detector,
+                model=RecognitionModel(index_type=args.index, index_params=index_params), log_manager=LogManager(args.log_db),
+            )
             
     else:
         # --- GUI MODE EXECUTION (NEW FUNCTIONALITY) ---
-        app = QApplication(sys.argv)
-        window = MainWindow()
+        parser = argparse.ArgumentParser(description="Smart Office Face Recognition System (GUI)")
+        parser.add_argument('--cameras', default='0', help='Comma-separated camera indices (or video files/image directories), e.g. 0,1,2 (one shared model)')
+        parser.add_argument('--workers', type=int, default=0, help='Run recognition in N worker processes (0 = in-process)')
+        parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port')
+        parser.add_argument('--embedder', choices=['deepface', 'dnn'], default='deepface', help='Embedding backend')
+        parser.add_argument('--embedder-model', default='data/models/facenet.onnx', help='Model file for --embedder dnn')
+        args, qt_args = parser.parse_known_args()
+        if args.embedder == 'dnn':
+            from src.Embedder import configure_embedder
+            configure_embedder('dnn', model_path=args.embedder_model)
+        camera_indices = [index.strip() for index in args.cameras.split(',') if index.strip()]
+        camera_indices = [int(index) if index.isdigit() else index for index in camera_indices]
+
+        from src.ModelRegistry import get_model_registry
+
+        # Start building/warming the models before the GUI toolkit even loads
+        # (not with --workers: the pool processes load their own, the GUI stays lean)
+        models = get_model_registry()
+        if args.workers <= 0:
+            models.warm_up(background=True)
+
+        if args.metrics_port:
+            from src.PerfStats import start_metrics_server
+            start_metrics_server(args.metrics_port)
+
+        with models.stage("import_gui"):
+            from PySide6.QtWidgets import QApplication
+            from src.MainWindow import MainWindow
+
+        app = QApplication(sys.argv[:1] + qt_args)
+        window = MainWindow(camera_indices=camera_indices, inference_workers=args.workers)
         window.show()
-        sys.exit(app.exec())
\ No newline at end of file
+        sys.exit(app.exec())
@@ -0,0 +1,114 @@
+# src/AccessLogModel.py
+
+import threading
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PySide6.QtGui import QColor
+
+class AccessLogModel(QAbstractTableModel):
+    """
+    Table model over the access_log table, newest row first.
+
+    New rows arrive through a LogManager listener (on the writer thread) and
+    are only buffered there; a QTimer on the GUI thread inserts the buffered
+    rows at the top at most `refresh_hz` times per second, so the view never
+    re-queries or clears. Older history is paged in from the DB when the view
+    scrolls to the bottom (canFetchMore/fetchMore). At most `max_rows` rows are
+    kept; trimmed ones can be paged back in.
+    """
+
+    COLUMNS = ("Time", "Status", "User", "Confidence")
+
+    def __init__(self, log_manager, page_size=100, max_rows=5000, refresh_hz=4, parent=None):
+        super().__init__(parent)
+        self.log_manager = log_manager
+        self.page_size = page_size
+        self.max_rows = max_rows
+
+        self._rows = []            # (id, timestamp, status, user_id, confidence), newest first
+        self._has_more = True
+        self._pending = []         # Rows written since the last refresh (writer thread -> GUI thread)
+        self._pending_lock = threading.Lock()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(1000 / refresh_hz))
+        self._timer.timeout.connect(self._apply_pending)
+        self._timer.start()
+
+        log_manager.add_listener(self._on_rows_written)
+        self.reload()
+
+    # --- Data sources ---
+
+    def reload(self):
+        """Drops the cached rows and loads the newest page."""
+        self.beginResetModel()
+        self._rows = self.log_manager.get_logs(limit=self.page_size)
+        self._has_more = len(self._rows) == self.page_size
+        self.endResetModel()
+
+    def _on_rows_written(self, rows):
+        # Runs on the LogManager writer thread: just buffer, never touch the model here
+        with self._pending_lock:
+            self._pending.extend(rows)
+
+    def _apply_pending(self):
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+        newest_id = self._rows[0][0] if self._rows else 0
+        rows = [row for row in rows if row[0] > newest_id]  # Already loaded by reload()
+        if not rows:
+            return
+
+        rows.reverse()
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._rows[:0] = rows
+        self.endInsertRows()
+
+        if len(self._rows) > self.max_rows:
+            self.beginRemoveRows(QModelIndex(), self.max_rows, len(self._rows) - 1)
+            del self._rows[self.max_rows:]
+            self.endRemoveRows()
+            self._has_more = True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self._rows:
+            return
+        older = self.log_manager.get_logs(limit=self.page_size, before_id=self._rows[-1][0])
+        self._has_more = len(older) == self.page_size
+        if older:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(older) - 1)
+            self._rows.extend(older)
+            self.endInsertRows()
+
+    # --- QAbstractTableModel interface ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        _, ts, status, user_id, confidence = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return ts
+            if column == 1:
+                return status.upper()
+            if column == 2:
+                return user_id if user_id and user_id != 'Unknown' else "N/A"
+            return f"{confidence:.2f}" if confidence is not None else "0.00"
+        if role == Qt.ForegroundRole:
+            return QColor("green") if status == "Granted" else QColor("red")
+        return None
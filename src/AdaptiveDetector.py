@@ -0,0 +1,153 @@
+# src/AdaptiveDetector.py
+
+import weakref
+
+import cv2
+
+from src.FaceTracker import box_iou
+
+
+class _StreamState:
+    """Per-stream memory of the adaptive detector."""
+
+    def __init__(self):
+        self.boxes = []               # Full-resolution boxes found in the previous frame
+        self.frames_since_full = 0
+        self.force_full = True        # First frame of a stream is always a full scan
+
+
+class AdaptiveDetector:
+    """
+    Resolution-adaptive face detection around an expensive detector.
+
+    `detect_fn(image)` runs the real detector on a BGR image and returns
+    (x, y, w, h) boxes in that image's coordinates. Instead of calling it on
+    the full frame every time:
+
+    - every `full_scan_interval` frames (or when nothing is being followed) the
+      whole frame is scanned at `scale`, and boxes are mapped back to full
+      resolution;
+    - in between, only padded regions of interest around the previous frame's
+      faces are re-detected (`roi_padding` = margin as a fraction of the face
+      size), again at `scale`;
+    - if an ROI comes back empty, it is retried at `escalation` times the scale
+      (up to `max_scale`) so small, distant faces are not lost to the downscale;
+      if that still misses, the next frame is a full scan. Empty full scans
+      are only escalated with `escalate_empty_scans=True`: off by default,
+      since it would double the cost of every frame of an empty scene.
+
+    State is kept per stream (keyed by the caller's tracker object), so several
+    cameras can share one detector. New faces entering outside the ROIs are
+    picked up by the next full scan.
+    """
+
+    def __init__(self, detect_fn, scale=0.5, full_scan_interval=10, roi_padding=0.5,
+                 escalation=2.0, max_scale=1.0, merge_iou=0.5, escalate_empty_scans=False):
+        self.detect_fn = detect_fn
+        self.scale = scale
+        self.full_scan_interval = full_scan_interval
+        self.roi_padding = roi_padding
+        self.escalation = escalation
+        self.max_scale = max_scale
+        self.merge_iou = merge_iou
+        self.escalate_empty_scans = escalate_empty_scans
+
+        self._states = weakref.WeakKeyDictionary()
+        self._default_state = _StreamState()
+        self.counts = {'frames': 0, 'full_scans': 0, 'roi_scans': 0, 'escalations': 0,
+                       'pixels_scanned': 0, 'pixels_total': 0}
+
+    def _state(self, key):
+        if key is None:
+            return self._default_state
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _StreamState()
+        return state
+
+    def reset(self, key=None):
+        """Forgets a stream's faces, so its next frame is a full scan."""
+        state = self._state(key)
+        state.boxes = []
+        state.force_full = True
+
+    def detect(self, frame, key=None):
+        """Boxes (full-resolution x, y, w, h) for one frame of the stream identified by `key`."""
+        state = self._state(key)
+        frame_h, frame_w = frame.shape[:2]
+        self.counts['frames'] += 1
+        self.counts['pixels_total'] += frame_h * frame_w
+
+        full_scan = state.force_full or not state.boxes or state.frames_since_full >= self.full_scan_interval
+        if full_scan:
+            region = (0, 0, frame_w, frame_h)
+            boxes = self._detect_region(frame, region, self.scale)
+            if self.escalate_empty_scans:
+                boxes = self._escalate(frame, region, boxes)
+            self.counts['full_scans'] += 1
+            state.frames_since_full = 0
+            state.force_full = False
+        else:
+            boxes = []
+            missed = False
+            for roi in self._rois(state.boxes, frame_w, frame_h):
+                self.counts['roi_scans'] += 1
+                found = self._escalate(frame, roi, self._detect_region(frame, roi, self.scale))
+                missed = missed or not found
+                boxes.extend(found)
+            boxes = self._merge(boxes)
+            state.frames_since_full += 1
+            state.force_full = missed  # Lost someone: look at the whole frame next time
+
+        state.boxes = boxes
+        return boxes
+
+    def _escalate(self, frame, region, found):
+        """Re-runs an empty search at growing scales until something is found or max_scale is reached."""
+        scale = self.scale
+        while not found and scale < self.max_scale:
+            scale = min(scale * self.escalation, self.max_scale)
+            self.counts['escalations'] += 1
+            found = self._detect_region(frame, region, scale)
+        return found
+
+    def _rois(self, boxes, frame_w, frame_h):
+        rois = []
+        for x, y, w, h in boxes:
+            pad = self.roi_padding * max(w, h)
+            x0, y0 = max(int(x - pad), 0), max(int(y - pad), 0)
+            x1, y1 = min(int(x + w + pad), frame_w), min(int(y + h + pad), frame_h)
+            if x1 > x0 and y1 > y0:
+                rois.append((x0, y0, x1 - x0, y1 - y0))
+        return rois
+
+    def _detect_region(self, frame, region, scale):
+        """Runs the detector on `region` of the frame resized by `scale`; boxes in frame coordinates."""
+        rx, ry, rw, rh = region
+        image = frame[ry:ry + rh, rx:rx + rw]
+        if scale < 1.0:
+            image = cv2.resize(image, (max(int(rw * scale), 1), max(int(rh * scale), 1)),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            scale = 1.0
+        self.counts['pixels_scanned'] += image.shape[0] * image.shape[1]
+
+        return [
+            (int(round(x / scale)) + rx, int(round(y / scale)) + ry, int(round(w / scale)), int(round(h / scale)))
+            for x, y, w, h in self.detect_fn(image)
+        ]
+
+    def _merge(self, boxes):
+        """Drops duplicates found by overlapping ROIs."""
+        if len(boxes) < 2:
+            return boxes
+        overlap = box_iou(boxes, boxes)
+        kept = []
+        for i in range(len(boxes)):
+            if all(overlap[i, j] < self.merge_iou for j in kept):
+                kept.append(i)
+        return [boxes[i] for i in kept]
+
+    def stats(self):
+        """Scan counters plus the fraction of frame pixels actually run through the detector."""
+        return dict(self.counts, pixel_ratio=self.counts['pixels_scanned'] / max(self.counts['pixels_total'], 1))
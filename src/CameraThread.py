@@ -1,84 +1,318 @@
 # src/CameraThread.py
 
 import cv2
+import numpy as np
+import threading
 import time
 from PySide6.QtCore import QThread, Signal, Slot
 from PySide6.QtGui import QImage
 from src.RecognitionModel import RecognitionModel
+from src.FrameSlot import FrameSlot, RateMeter
+from src.FrameBufferPool import FrameBufferPool
+from src.FrameSource import open_frame_source
+from src.PerfStats import get_perf_stats
+from src.EventAggregator import EventAggregator
 
 class CameraThread(QThread):
+    """
+    Runs the camera as three decoupled stages:
+
+    - capture: a worker thread reading the camera as fast as it delivers and
+      publishing only the newest frame (older unconsumed frames are dropped);
+    - inference: a worker thread that always takes the newest captured frame,
+      runs detection/recognition on it and stores the results;
+    - display: this QThread, which draws the most recent results onto every
+      captured frame and emits it, so the video runs at camera FPS while
+      recognition runs at whatever rate the CPU allows.
+
+    The display stage scales each frame once to the view size (see
+    `set_display_size`), draws onto the small copy and converts it to RGB
+    straight into a FrameBufferPool buffer that the emitted QImage wraps. The
+    GUI hands the buffer back with `release_frame()`. Allocations per frame:
+    one array from `cap.read()` (shared read-only by display and inference);
+    the display stage itself allocates no pixel buffers in steady state (see
+    `stats()['display_buffer_allocations']`), and the GUI makes one QPixmap upload.
+
+    With a shared StreamScheduler, the inference stage is not run here at all:
+    the frames go to the scheduler, which batches them with the other cameras
+    on one model and routes this camera's results back to `_on_results`.
+    With an InferencePool, the inference worker only hands the newest frame to
+    the pool's worker processes and results come back the same way.
+
+    Results pass through an EventAggregator before anything is logged, so a
+    person lingering in front of the camera yields one entry and one exit
+    (session) instead of an event per frame.
+    """
+
     # Signals must be defined on the class level
     frame_ready = Signal(QImage)
     log_message = Signal(str)
-    
+
     # --- NEW SIGNAL FOR STRUCTURED DB LOGGING ---
     # Emits: user_id (str), status (str), confidence (float)
-    log_event = Signal(str, str, float) 
+    log_event = Signal(str, str, float)
     # -------------------------------------------
-    
-    def __init__(self, model: RecognitionModel, camera_index=0, parent=None):
+    # Emits the session dict of an identity that left (see EventAggregator)
+    session_closed = Signal(dict)
+    # Emits stats() about once per second (for the performance panel)
+    stats_ready = Signal(dict)
+
+    def __init__(self, model: RecognitionModel, camera_index=0, parent=None, max_overlay_age=1.0,
+                 scheduler=None, stream_name=None, target_fps=None, pool=None, aggregator=None):
         super().__init__(parent)
         self.model = model
         self.camera_index = camera_index
+        self.scheduler = scheduler
+        self.pool = pool
+        self.stream_name = stream_name or f"Camera {camera_index}"
+        self.target_fps = target_fps  # Recognition rate cap when sharing a scheduler
+        self.aggregator = aggregator or EventAggregator()  # May be shared between cameras
         self._is_running = True
         self.detector_mode = 'cnn' # Default detection mode
+        self.max_overlay_age = max_overlay_age  # Seconds before stale boxes are hidden
+
+        # Stage hand-offs (drop-oldest) and counters
+        self._display_slot = FrameSlot()
+        self._inference_slot = FrameSlot()
+        self._capture_rate = RateMeter()
+        self._display_rate = RateMeter()
+        self._inference_rate = RateMeter()
+        self._results_lock = threading.Lock()
+        self._latest_results = []
+        self._latest_results_time = 0.0
+        self._latest_results_seq = 0
+
+        # Display buffers: a BGR scratch image at view size and pooled RGB images for the GUI
+        self._display_size = None  # (width, height) of the view, None = native size
+        self._display_pool = FrameBufferPool(size=3)
+        self._scaled_bgr = None
+        self._scratch_allocations = 0
+
+        self.perf = get_perf_stats()
+        self._stats_interval = 1.0
+        self._last_stats_time = 0.0
 
     def run(self):
-        """The main loop that runs in the separate thread."""
-        cap = cv2.VideoCapture(self.camera_index)
+        """Owns the camera, starts the capture/inference workers and runs the display loop."""
+        # camera_index may also be a video file or an image directory (replay)
+        cap = open_frame_source(self.camera_index)
         if not cap.isOpened():
             self.log_message.emit("ERROR: Cannot open webcam!")
             self._is_running = False
             return
 
+        # Keep the driver from queueing stale frames behind our back
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._is_running = True
+        self._display_slot = FrameSlot()
+        workers = [threading.Thread(target=self._capture_loop, args=(cap,), name="camera-capture", daemon=True)]
+        if self.scheduler is not None:
+            # Inference happens on the shared scheduler thread
+            self._inference_slot = self.scheduler.create_slot()
+            self.scheduler.add_stream(self.stream_name, self._inference_slot, self._on_results, self.target_fps)
+        else:
+            self._inference_slot = FrameSlot()
+            workers.append(threading.Thread(target=self._inference_loop, name="camera-inference", daemon=True))
+        for worker in workers:
+            worker.start()
+
+        self._display_loop()
+
+        self._is_running = False
+        if self.scheduler is not None:
+            self.scheduler.remove_stream(self.stream_name)
+        self._display_slot.close()
+        self._inference_slot.close()
+        for worker in workers:
+            worker.join()
+        cap.release()
+        # Nobody is in front of a stopped camera: close its open sessions
+        self._emit_events(self.aggregator.close(self.stream_name))
+
+    # --- Stage 1: capture ---
+
+    def _capture_loop(self, cap):
         while self._is_running:
-            ret, frame = cap.read()
+            # Time blocked on the driver: high values mean the door is camera-starved
+            with self.perf.timer('capture'):
+                ret, frame = cap.read()
             if not ret:
                 self.log_message.emit("ERROR: Failed to read frame from camera.")
+                self._is_running = False
                 break
+            self._capture_rate.tick()
+            # The same read-only frame goes to both consumers; neither modifies it
+            self._display_slot.put(frame)
+            self._inference_slot.put(frame)
+        self._display_slot.close()
+        self._inference_slot.close()
+
+    # --- Stage 2: inference ---
+
+    def _inference_loop(self):
+        models_announced = self.pool is not None  # Pool workers load their own models
+        submit_error = None
+        while self._is_running:
+            if not models_announced and not self.model.is_ready():
+                # Models are still warming up in the background: the display keeps running
+                time.sleep(0.05)
+                continue
+            if not models_announced:
+                self.log_message.emit(f"INFO: Models ready. Cold start: {self.model.models.format_timings()}")
+                models_announced = True
+
+            item = self._inference_slot.get(timeout=0.5)
+            if item is None:
+                continue
+            seq, frame = item
 
-            # --- MODIFICATION: RecognitionModel now returns structured log data ---
-            # It now returns 4 values: processed_frame, log_msg, recognized_user, log_data
-            processed_frame, log_msg, recognized_user, log_data = self.model.process_frame(
-                frame, 
-                detector_mode=self.detector_mode
-            )
-            # --------------------------------------------------------------------
-
-            # Convert OpenCV BGR image (NumPy array) to QImage (RGB format)
-            h, w, ch = processed_frame.shape
-            bytes_per_line = ch * w
-            
-            # The QImage MUST be created from an RGB image
-            rgb_image = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-            qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
+            if self.pool is not None:
+                # Non-blocking: if every worker is busy this frame is simply skipped
+                try:
+                    self.pool.submit(self.stream_name, seq, frame, self._on_results, self.detector_mode)
+                except Exception as e:
+                    # e.g. a frame larger than the pool's slots; report it once, not every frame
+                    if str(e) != submit_error:
+                        submit_error = str(e)
+                        self.log_message.emit(f"ERROR: Could not queue frame for recognition: {e}")
+                continue
+
+            try:
+                results = self.model.analyze_frame(frame, detector_mode=self.detector_mode)
+            except Exception as e:
+                # Keep the stage alive: the preview would look healthy while nothing is recognized
+                self.log_message.emit(f"ERROR: Recognition failed: {e}")
+                continue
+            if results is not None:
+                self._on_results(seq, results)
+
+    def _on_results(self, seq, results):
+        """Stores the newest results for the overlay and emits their log events."""
+        self._inference_rate.tick()
+        with self._results_lock:
+            self._latest_results = results
+            self._latest_results_time = time.monotonic()
+            self._latest_results_seq = seq
+
+        self._emit_events(self.aggregator.observe(results, stream_id=self.stream_name))
+
+    def _emit_events(self, events):
+        """Emits the console line and structured data of each aggregated event."""
+        for event in events:
+            # 1. Emit the verbose log message for the GUI console
+            log_msg = self.aggregator.describe(event)
+            if self.scheduler is not None or self.pool is not None:
+                log_msg = f"[{self.stream_name}] {log_msg}"
+            self.log_message.emit(log_msg)
+
+            # 2. Emit the structured data for the Database
+            if event['event'] == 'exit':
+                self.session_closed.emit(event['session'])
+            else:
+                self.log_event.emit(event['user_id'], event['status'], event['confidence'])
+
+    # --- Stage 3: display ---
+
+    def _display_loop(self):
+        while self._is_running:
+            item = self._display_slot.get(timeout=0.5)
+            if item is None:
+                if self._display_slot.closed:
+                    break
+                continue
+            _, frame = item
+
+            # Fit the frame into the view once, here, instead of rescaling on the GUI thread
+            h, w = frame.shape[:2]
+            scale = 1.0
+            if self._display_size is not None:
+                view_w, view_h = self._display_size
+                scale = min(view_w / w, view_h / h)
+            out_w, out_h = max(int(w * scale), 1), max(int(h * scale), 1)
+
+            rgb_image = self._display_pool.acquire((out_h, out_w, 3))
+            if rgb_image is None:
+                continue  # The GUI still holds every buffer: skip this frame
+
+            # Scale (or copy) into the reused BGR scratch: the captured frame is shared with inference
+            if self._scaled_bgr is None or self._scaled_bgr.shape != (out_h, out_w, 3):
+                self._scaled_bgr = np.empty((out_h, out_w, 3), dtype=np.uint8)
+                self._scratch_allocations += 1
+            if (out_w, out_h) == (w, h):
+                np.copyto(self._scaled_bgr, frame)
+            else:
+                cv2.resize(frame, (out_w, out_h), dst=self._scaled_bgr, interpolation=cv2.INTER_AREA)
+
+            # Overlay the newest recognition results (skip them once they are stale)
+            with self._results_lock:
+                results = self._latest_results
+                fresh = time.monotonic() - self._latest_results_time <= self.max_overlay_age
+            if results and fresh:
+                with self.perf.timer('draw'):
+                    self.model.draw_results(self._scaled_bgr, results, scale=scale)
+
+            # The only color conversion of the display path, written into the pooled buffer
+            cv2.cvtColor(self._scaled_bgr, cv2.COLOR_BGR2RGB, dst=rgb_image)
+            qt_image = QImage(rgb_image.data, out_w, out_h, 3 * out_w, QImage.Format_RGB888)
 
             # Emit the signals back to the main thread
             self.frame_ready.emit(qt_image)
-            
-            # If the RecognitionModel returned structured log data, emit both logs
-            if log_data:
-                # 1. Emit the verbose log message for the GUI console
-                self.log_message.emit(log_msg)
-                
-                # 2. Emit the structured data for the Database
-                user_id = log_data.get('user_id', 'Unknown')
-                status = log_data.get('status', 'Denied')
-                confidence = log_data.get('confidence', 0.0)
-                
-                self.log_event.emit(user_id, status, confidence)
-            
-            # Control the framerate (adjust as needed)
-            time.sleep(0.01) 
-            
-        cap.release()
-        
+            self._display_rate.tick()
+            self._publish_stats()
+
+    def _publish_stats(self):
+        """Exports this camera's rates/drops as gauges and emits stats_ready, at most once per interval."""
+        now = time.monotonic()
+        if now - self._last_stats_time < self._stats_interval:
+            return
+        self._last_stats_time = now
+        stats = self.stats()
+        label = f'{{stream="{self.stream_name}"}}'
+        for key in ('capture_fps', 'display_fps', 'inference_fps', 'display_drops', 'inference_drops',
+                    'results_lag_frames'):
+            self.perf.gauge(key + label, stats[key])
+        self.stats_ready.emit(stats)
+
+    def set_display_size(self, width, height):
+        """Size of the view the frames are shown in; frames are scaled to fit it on this thread."""
+        self._display_size = (int(width), int(height))
+
+    def release_frame(self):
+        """Called by the GUI once it is done with the oldest emitted QImage."""
+        self._display_pool.release()
+
+    def stats(self):
+        """Per-stage rates, queue depths and drop counters of the running pipeline."""
+        gate = self.model.motion_gate
+        cache = self.model.embedding_cache
+        return {
+            'motion_gate': gate.stats() if gate is not None else None, # Shared by all cameras of the model
+            'embedding_cache': cache.stats() if cache is not None else None,
+            'capture_fps': self._capture_rate.rate,
+            'display_fps': self._display_rate.rate,
+            'inference_fps': self._inference_rate.rate,
+            'frames_captured': self._capture_rate.count,
+            'frames_displayed': self._display_rate.count,
+            'frames_inferred': self._inference_rate.count,
+            'display_queue_depth': self._display_slot.depth,
+            'display_drops': self._display_slot.drops,
+            'inference_queue_depth': self._inference_slot.depth,
+            'inference_drops': self._inference_slot.drops,
+            'results_lag_frames': max(self._display_slot.puts - self._latest_results_seq, 0),
+            'display_buffer_allocations': self._display_pool.allocations + self._scratch_allocations,
+            'display_buffers_in_flight': self._display_pool.in_flight,
+            'display_pool_exhausted': self._display_pool.exhausted,
+        }
+
     def stop(self):
         """Gracefully stops the thread."""
         self._is_running = False
         self.wait() # Wait for the thread to finish execution
-        
+
     @Slot(str)
     def set_detector_mode(self, mode):
         """Slot to change the detector mode from the main thread."""
-        self.detector_mode = mode
\ No newline at end of file
+        self.detector_mode = mode
+        if self.scheduler is not None:
+            self.scheduler.detector_mode = mode
@@ -0,0 +1,202 @@
+# src/Embedder.py
+
+import os
+import threading
+import time
+
+import numpy as np
+
+# Spawned worker processes (enrollment, InferencePool) inherit the choice through these
+EMBEDDER_ENV = "SMART_OFFICE_EMBEDDER"
+EMBEDDER_MODEL_ENV = "SMART_OFFICE_EMBEDDER_MODEL"
+
+
+class DeepFaceEmbedder:
+    """Facenet through DeepFace/Keras (imports TensorFlow on first use)."""
+
+    name = "deepface"
+
+    def __init__(self, model_name="Facenet"):
+        self.model_name = model_name
+        self._model = None
+
+    def load(self):
+        if self._model is None:
+            from deepface import DeepFace
+            # build_model is cached by DeepFace, so this only constructs the network once
+            self._model = DeepFace.build_model(self.model_name)
+        return self
+
+    def embed(self, batch):
+        """(N, 160, 160, 3) float32 RGB in [0, 1] -> (N, 128) float32."""
+        self.load()
+        return np.asarray(self._model.model(batch, training=False), dtype=np.float32)
+
+
+class DnnEmbedder:
+    """
+    The same Facenet graph exported to a local file (ONNX, or a frozen
+    TensorFlow .pb for OpenCV), run without TensorFlow.
+
+    `runtime='onnxruntime'` uses ONNX Runtime, `'opencv'` uses cv2.dnn, and
+    `'auto'` picks ONNX Runtime when it is installed. The whole batch goes
+    through one forward pass. `layout` is the graph's input layout: 'nhwc'
+    for a graph exported from Keras (see `export_deepface_onnx`), 'nchw'
+    for channel-first exports.
+    """
+
+    name = "dnn"
+    RUNTIMES = ('auto', 'onnxruntime', 'opencv')
+
+    def __init__(self, model_path, runtime='auto', layout='nhwc'):
+        if runtime not in self.RUNTIMES:
+            raise ValueError(f"Unknown runtime '{runtime}'. Choose from: {', '.join(self.RUNTIMES)}")
+        if layout not in ('nhwc', 'nchw'):
+            raise ValueError(f"Unknown layout '{layout}'. Use 'nhwc' or 'nchw'.")
+        self.model_path = model_path
+        self.runtime = runtime
+        self.layout = layout
+        self._session = None
+        self._net = None
+        self._lock = threading.Lock()  # cv2.dnn nets are not safe to run concurrently
+
+    def load(self):
+        if self._session is not None or self._net is not None:
+            return self
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Embedding model not found: {self.model_path}")
+        with self._lock:
+            if self._session is not None or self._net is not None:
+                return self
+            if self.runtime in ('auto', 'onnxruntime') and self.model_path.endswith('.onnx'):
+                try:
+                    import onnxruntime
+                    self._session = onnxruntime.InferenceSession(self.model_path, providers=['CPUExecutionProvider'])
+                    self._input_name = self._session.get_inputs()[0].name
+                    self.runtime = 'onnxruntime'
+                    return self
+                except ImportError:
+                    if self.runtime == 'onnxruntime':
+                        raise
+            import cv2
+            self._net = cv2.dnn.readNet(self.model_path)
+            self.runtime = 'opencv'
+        return self
+
+    def embed(self, batch):
+        """(N, 160, 160, 3) float32 RGB in [0, 1] -> (N, 128) float32."""
+        self.load()
+        if self.layout == 'nchw':
+            batch = batch.transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if self._session is not None:
+            output = self._session.run(None, {self._input_name: batch})[0]
+        else:
+            with self._lock:
+                self._net.setInput(batch)
+                output = self._net.forward()
+        return np.asarray(output, dtype=np.float32).reshape(len(batch), -1)
+
+
+EMBEDDERS = {
+    DeepFaceEmbedder.name: DeepFaceEmbedder,
+    DnnEmbedder.name: DnnEmbedder,
+}
+
+def create_embedder(name="deepface", **params):
+    """Builds an embedding backend by name ('deepface' or 'dnn', which needs `model_path=`)."""
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder '{name}'. Choose from: {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[name](**params)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """
+    Returns the process-wide embedder used by `src.embed.get_embeddings`.
+    Defaults to DeepFace unless SMART_OFFICE_EMBEDDER=dnn (with
+    SMART_OFFICE_EMBEDDER_MODEL=<path>) is set.
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            name = os.environ.get(EMBEDDER_ENV, DeepFaceEmbedder.name)
+            params = {'model_path': os.environ[EMBEDDER_MODEL_ENV]} if name == DnnEmbedder.name else {}
+            _embedder = create_embedder(name, **params)
+        return _embedder
+
+def configure_embedder(name="deepface", **params):
+    """
+    Selects the process-wide embedder. Also exported to the environment so
+    worker processes started afterwards use the same backend.
+    """
+    global _embedder
+    embedder = create_embedder(name, **params)
+    with _embedder_lock:
+        _embedder = embedder
+    os.environ[EMBEDDER_ENV] = name
+    if 'model_path' in params:
+        os.environ[EMBEDDER_MODEL_ENV] = params['model_path']
+    return embedder
+
+
+# --- Export and parity ---
+
+def export_deepface_onnx(output_path, model_name="Facenet", opset=13):
+    """
+    Exports DeepFace's Keras Facenet to ONNX for DnnEmbedder. Needs
+    TensorFlow and tf2onnx, so run it once on a development machine.
+    """
+    import tensorflow as tf
+    import tf2onnx
+    from deepface import DeepFace
+
+    model = DeepFace.build_model(model_name).model
+    signature = (tf.TensorSpec((None, 160, 160, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=output_path)
+    print(f"INFO: Exported {model_name} to {output_path}")
+    return output_path
+
+
+def check_parity(reference, candidate, face_imgs, min_cosine=0.99):
+    """
+    Embeds the same crops with two backends and compares them. Returns the
+    per-crop cosine similarity summary, the largest absolute difference, the
+    per-face time of each backend and whether every crop reached `min_cosine`.
+    """
+    from src.embed import prepare_batch
+
+    batch = prepare_batch(face_imgs)
+    reference.embed(batch[:1])  # Warm both up outside the timed runs
+    candidate.embed(batch[:1])
+
+    start = time.perf_counter()
+    expected = reference.embed(batch)
+    reference_s = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = candidate.embed(batch)
+    candidate_s = time.perf_counter() - start
+
+    if expected.shape != actual.shape:
+        raise ValueError(f"Embedding shapes differ: {expected.shape} vs {actual.shape}")
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    cosine = np.sum(expected * actual, axis=1) / np.maximum(norms, 1e-12)
+    report = {
+        'faces': len(batch),
+        'reference': reference.name,
+        'candidate': candidate.name,
+        'cosine_mean': float(cosine.mean()),
+        'cosine_min': float(cosine.min()),
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+        'reference_ms_per_face': reference_s * 1000.0 / len(batch),
+        'candidate_ms_per_face': candidate_s * 1000.0 / len(batch),
+        'passed': bool(cosine.min() >= min_cosine),
+    }
+    print(f"INFO: Parity {reference.name} vs {candidate.name} on {report['faces']} crops: "
+          f"cosine mean {report['cosine_mean']:.5f}, min {report['cosine_min']:.5f}, "
+          f"max |diff| {report['max_abs_diff']:.5f}; "
+          f"{report['reference_ms_per_face']:.1f} vs {report['candidate_ms_per_face']:.1f} ms/face "
+          f"-> {'PASS' if report['passed'] else 'FAIL'}")
+    return report
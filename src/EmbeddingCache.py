@@ -0,0 +1,121 @@
+# src/EmbeddingCache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def dhash(crop):
+    """64-bit difference hash of an image: sign of horizontal gradients on a 9x8 grayscale thumbnail."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+    if gray.dtype != np.uint8:
+        gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    thumb = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumb[:, 1:] > thumb[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'box', 'key', 'embedding', 'stored_at')
+
+    def __init__(self, fingerprint, box, key, embedding, stored_at):
+        self.fingerprint = fingerprint
+        self.box = box
+        self.key = key
+        self.embedding = embedding
+        self.stored_at = stored_at
+
+
+class EmbeddingCache:
+    """
+    LRU cache of face embeddings in front of the embedder.
+
+    A crop is identified by a perceptual hash (`dhash`) plus its box in the
+    frame and the face track it belongs to (the caller's `key`, compared by
+    identity). A lookup hits an entry of the same track whose hash differs by
+    at most `hash_tolerance` bits and whose box centre moved by at most
+    `box_tolerance` face widths with a similar size, so a person standing
+    still is embedded once instead of on every re-confirmation. A new track
+    never inherits another face's embedding, even at the same spot. Entries
+    expire after `ttl` seconds (the embedder then re-checks the face) and the
+    least recently used entry is evicted beyond `max_size`.
+    """
+
+    def __init__(self, max_size=256, ttl=2.0, hash_tolerance=4, box_tolerance=0.1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hash_tolerance = hash_tolerance
+        self.box_tolerance = box_tolerance
+        self._entries = OrderedDict()  # entry id -> _Entry, least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def fingerprints(self, crops):
+        return [dhash(crop) for crop in crops]
+
+    def _near(self, entry, fingerprint, box, key):
+        if entry.key is not key or bin(entry.fingerprint ^ fingerprint).count('1') > self.hash_tolerance:
+            return False
+        x, y, w, h = box
+        ex, ey, ew, eh = entry.box
+        width = max(ew, 1)
+        shift = max(abs((x + w / 2) - (ex + ew / 2)), abs((y + h / 2) - (ey + eh / 2))) / width
+        return shift <= self.box_tolerance and abs(w - ew) / width <= self.box_tolerance
+
+    def _expire(self, now):
+        # Hits reorder the entries by use, not by age, so scan them all (max_size is small)
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry.stored_at > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self.counts['expired'] += len(expired)
+
+    def lookup(self, fingerprints, boxes, key=None, now=None):
+        """Cached embedding (or None) for every crop, marking hits as recently used."""
+        now = time.monotonic() if now is None else now
+        results = []
+        with self._lock:
+            self._expire(now)
+            for fingerprint, box in zip(fingerprints, boxes):
+                hit = None
+                for entry_id, entry in reversed(self._entries.items()):
+                    if self._near(entry, fingerprint, box, key):
+                        hit = entry_id
+                        break
+                if hit is None:
+                    self.counts['misses'] += 1
+                    results.append(None)
+                else:
+                    self.counts['hits'] += 1
+                    self._entries.move_to_end(hit)
+                    results.append(self._entries[hit].embedding)
+        return results
+
+    def insert(self, fingerprints, boxes, embeddings, key=None, now=None):
+        """Stores freshly computed embeddings, evicting the least recently used beyond `max_size`."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for fingerprint, box, embedding in zip(fingerprints, boxes, embeddings):
+                self._entries[self._next_id] = _Entry(fingerprint, tuple(box), key, np.array(embedding), now)
+                self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.counts['evictions'] += 1
+
+    def clear(self):
+        """Drops every entry (e.g. after the embedding model changed)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts, size=len(self._entries))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,192 @@
+# src/EventAggregator.py
+
+import itertools
+import threading
+import time
+
+UNKNOWN_USER = "Unknown"
+
+
+class Session:
+    """One continuous presence of an identity in front of one camera."""
+
+    def __init__(self, session_id, stream_id, user_id, status, confidence, now):
+        self.session_id = session_id
+        self.stream_id = stream_id
+        self.user_id = user_id
+        self.status = status
+        self.confidence = confidence       # At entry
+        self.peak_confidence = confidence
+        self.first_seen = now
+        self.last_seen = now
+        self.frames = 0
+        self.announced = False             # Entry event already emitted
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'stream_id': self.stream_id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'frames': self.frames,
+            'peak_confidence': self.peak_confidence,
+        }
+
+
+class EventAggregator:
+    """
+    Turns per-frame recognition results into access events.
+
+    Repeated sightings of the same identity on the same stream are collapsed
+    into one Session. `observe()` returns event dicts:
+
+    - 'entry': a session was opened (after `min_frames` sightings);
+    - 'exit':  a session saw no sighting for `cooldown` seconds and was closed;
+    - 'alert': an unknown face, at most once per `unknown_alert_interval`
+      seconds per stream ('suppressed' counts the sightings since the last alert).
+
+    Thread-safe, so one aggregator can serve several cameras (streams).
+    Timestamps are wall-clock seconds (time.time()).
+    """
+
+    def __init__(self, cooldown=10.0, unknown_alert_interval=30.0, min_frames=1):
+        self.cooldown = cooldown
+        self.unknown_alert_interval = unknown_alert_interval
+        self.min_frames = min_frames
+
+        self._lock = threading.Lock()
+        self._sessions = {}          # (stream_id, user_id) -> Session
+        self._last_alert = {}        # stream_id -> time of the last unknown-face alert
+        self._suppressed = {}        # stream_id -> unknown sightings since that alert
+        self._ids = itertools.count(1)
+        self.counts = {'frames': 0, 'sightings': 0, 'entry': 0, 'exit': 0, 'alert': 0, 'suppressed': 0}
+
+    def observe(self, results, stream_id=None, now=None):
+        """
+        Feeds the face results of one analyzed frame. Call it for every
+        analyzed frame, including ones without faces, so sessions can expire.
+        """
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            self.counts['frames'] += 1
+            seen = set()
+            for result in results:
+                self.counts['sightings'] += 1
+                user_id = result['user_id']
+                if not result.get('matched', True) or user_id == UNKNOWN_USER:
+                    events.extend(self._unknown_sighting(stream_id, result, now))
+                    continue
+                if user_id in seen:
+                    continue  # Same identity twice in one frame counts once
+                seen.add(user_id)
+                events.extend(self._known_sighting(stream_id, result, now))
+            events.extend(self._expire(now))
+        return events
+
+    def _known_sighting(self, stream_id, result, now):
+        key = (stream_id, result['user_id'])
+        session = self._sessions.get(key)
+        if session is None:
+            session = Session(next(self._ids), stream_id, result['user_id'], result['status'],
+                              result['confidence'], now)
+            self._sessions[key] = session
+        session.last_seen = now
+        session.frames += 1
+        session.peak_confidence = max(session.peak_confidence, result['confidence'])
+
+        if not session.announced and session.frames >= self.min_frames:
+            session.announced = True
+            self.counts['entry'] += 1
+            return [self._event('entry', session.stream_id, session.user_id, session.status,
+                                session.confidence, session=session)]
+        return []
+
+    def _unknown_sighting(self, stream_id, result, now):
+        last = self._last_alert.get(stream_id)
+        if last is not None and now - last < self.unknown_alert_interval:
+            self._suppressed[stream_id] = self._suppressed.get(stream_id, 0) + 1
+            self.counts['suppressed'] += 1
+            return []
+        self._last_alert[stream_id] = now
+        suppressed = self._suppressed.pop(stream_id, 0)
+        self.counts['alert'] += 1
+        return [self._event('alert', stream_id, UNKNOWN_USER, result['status'], result['confidence'],
+                            suppressed=suppressed)]
+
+    def _expire(self, now, stream_id=None, force=False):
+        events = []
+        for key, session in list(self._sessions.items()):
+            if stream_id is not None and session.stream_id != stream_id:
+                continue
+            if force or now - session.last_seen > self.cooldown:
+                del self._sessions[key]
+                if session.announced:  # Sightings below min_frames are dropped silently
+                    self.counts['exit'] += 1
+                    events.append(self._event('exit', session.stream_id, session.user_id, session.status,
+                                              session.peak_confidence, session=session))
+        return events
+
+    def expire(self, now=None):
+        """Closes sessions past their cooldown without feeding a frame. Returns their 'exit' events."""
+        with self._lock:
+            return self._expire(time.time() if now is None else now)
+
+    def close(self, stream_id=None):
+        """Closes the open sessions of one stream (or all of them), e.g. when a camera stops."""
+        with self._lock:
+            if stream_id is None:
+                self._last_alert.clear()
+                self._suppressed.clear()
+            else:
+                self._last_alert.pop(stream_id, None)
+                self._suppressed.pop(stream_id, None)
+            return self._expire(time.time(), stream_id=stream_id, force=True)
+
+    @staticmethod
+    def _event(kind, stream_id, user_id, status, confidence, session=None, suppressed=0):
+        return {
+            'event': kind,
+            'stream_id': stream_id,
+            'user_id': user_id,
+            'status': status,
+            'confidence': float(confidence),
+            'session': session.to_dict() if session is not None else None,
+            'suppressed': suppressed,
+        }
+
+    @staticmethod
+    def describe(event):
+        """Human-readable log line for one event."""
+        if event['event'] == 'entry':
+            return f"Access {event['status']}: {event['user_id']} ({event['confidence']:.2f})"
+        if event['event'] == 'exit':
+            session = event['session']
+            return (f"Left: {event['user_id']} after {session['last_seen'] - session['first_seen']:.0f}s "
+                    f"({session['frames']} frames, peak {session['peak_confidence']:.2f})")
+        suffix = f", {event['suppressed']} more sighting(s) since last alert" if event['suppressed'] else ""
+        return f"ALERT: Unknown face (Confidence: {event['confidence']:.2f}{suffix})"
+
+    def stats(self):
+        """Event counters and the number of open sessions."""
+        with self._lock:
+            return dict(self.counts, open_sessions=len(self._sessions))
+
+
+def write_session(log_manager, session):
+    """Stores a closed session dict (see Session.to_dict) in the sessions table."""
+    log_manager.log_session(
+        session['user_id'], session['status'], session['first_seen'], session['last_seen'],
+        session['frames'], session['peak_confidence'], stream_id=session['stream_id'],
+    )
+
+
+def write_events(log_manager, events):
+    """Persists events: entries and alerts as access_log rows, exits as sessions rows."""
+    for event in events:
+        if event['event'] == 'exit':
+            write_session(log_manager, event['session'])
+        else:
+            log_manager.log_access_event(event['user_id'], event['status'], event['confidence'])
@@ -0,0 +1,141 @@
+# src/FaceTracker.py
+
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between (N, 4) and (M, 4) arrays of (x, y, w, h) boxes -> (N, M)."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, 0][:, None], b[:, 0][None, :]), 0, None)
+    inter_h = np.clip(np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, 1][:, None], b[:, 1][None, :]), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    """One face followed across frames, carrying its last known identity."""
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = tuple(box)
+        self.first_frame = frame_index
+        self.last_seen_frame = frame_index
+        self.hits = 1           # Frames in which the face was detected
+        self.misses = 0         # Consecutive frames without a matching detection
+        self.user_id = None     # None until the face has been embedded and matched
+        self.status = None
+        self.confidence = 0.0
+        self.matched = False    # False if the last recognition had no gallery/embedding
+        self.recognized_frame = None
+
+    @property
+    def age(self):
+        return self.last_seen_frame - self.first_frame
+
+    def set_identity(self, identity, frame_index):
+        """Stores a fresh recognition result. Returns True if the identity changed."""
+        changed = self.recognized_frame is None or identity['user_id'] != self.user_id
+        self.user_id = identity['user_id']
+        self.status = identity['status']
+        self.confidence = identity['confidence']
+        self.matched = identity['matched']
+        self.recognized_frame = frame_index
+        return changed
+
+    def identity(self):
+        return {
+            'user_id': self.user_id,
+            'status': self.status,
+            'confidence': self.confidence,
+            'matched': self.matched,
+        }
+
+
+class FaceTracker:
+    """
+    Associates per-frame face detections into tracks with stable IDs, so the
+    expensive embedding + matching step only runs for new faces and for
+    periodic re-confirmation, not for every face in every frame.
+
+    Detections are matched greedily to tracks by IoU, falling back to centroid
+    distance (relative to face size) for fast-moving faces. Tracks that go
+    unmatched for more than `max_missed` frames are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_center_distance=0.6, max_missed=10, reconfirm_interval=30):
+        self.iou_threshold = iou_threshold
+        self.max_center_distance = max_center_distance  # In units of the track's face width
+        self.max_missed = max_missed
+        self.reconfirm_interval = reconfirm_interval
+        self.tracks = []
+        self.frame_index = 0
+        self._next_id = 1
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, boxes):
+        """
+        Advances one frame with this frame's detections. Returns the Track for
+        each box, in the same order as `boxes`.
+        """
+        self.frame_index += 1
+        assigned = [None] * len(boxes)
+        free_tracks = set(range(len(self.tracks)))
+
+        if self.tracks and len(boxes):
+            track_boxes = [track.box for track in self.tracks]
+
+            # 1. Greedy IoU association, best overlaps first
+            iou = box_iou(track_boxes, boxes)
+            for t, d in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in free_tracks and assigned[d] is None:
+                    assigned[d] = self.tracks[t]
+                    free_tracks.discard(t)
+
+            # 2. Centroid fallback for what IoU left unmatched
+            for d, box in enumerate(boxes):
+                if assigned[d] is not None or not free_tracks:
+                    continue
+                cx, cy = box[0] + box[2] / 2, box[1] + box[3] / 2
+                best, best_distance = None, self.max_center_distance
+                for t in free_tracks:
+                    tx, ty, tw, th = self.tracks[t].box
+                    distance = np.hypot(cx - (tx + tw / 2), cy - (ty + th / 2)) / max(tw, 1)
+                    if distance < best_distance:
+                        best, best_distance = t, distance
+                if best is not None:
+                    assigned[d] = self.tracks[best]
+                    free_tracks.discard(best)
+
+        # Refresh matched tracks, start new ones for unmatched detections
+        for d, box in enumerate(boxes):
+            track = assigned[d]
+            if track is None:
+                track = Track(self._next_id, box, self.frame_index)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track
+            else:
+                track.box = tuple(box)
+                track.last_seen_frame = self.frame_index
+                track.hits += 1
+                track.misses = 0
+
+        # Age out tracks that were not seen this frame
+        for t in free_tracks:
+            self.tracks[t].misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_missed]
+        return assigned
+
+    def needs_recognition(self, track):
+        """True for tracks never recognized, or due for periodic re-confirmation."""
+        if track.recognized_frame is None:
+            return True
+        return self.frame_index - track.recognized_frame >= self.reconfirm_interval
@@ -0,0 +1,75 @@
+# src/FrameBufferPool.py
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FrameBufferPool:
+    """
+    Fixed set of reusable uint8 image buffers for frames handed to the GUI.
+
+    The producer `acquire()`s a buffer, fills it and emits an image that wraps
+    it without copying; the consumer calls `release()` once it is done with
+    that image (Qt delivers queued signals in order, so releases are FIFO).
+    While a buffer is in flight it is never written to, so the wrapped image
+    stays valid. When every buffer is in flight `acquire()` returns None and
+    the producer skips the frame: a slow GUI drops frames instead of piling up
+    queued images. Buffers whose consumer never released them are reclaimed
+    after `max_in_flight_age` seconds.
+
+    Steady state allocates nothing; `allocations` counts every buffer ever
+    created (at most `size` per display size).
+    """
+
+    def __init__(self, size=3, max_in_flight_age=1.0):
+        self.size = size
+        self.max_in_flight_age = max_in_flight_age
+        self._lock = threading.Lock()
+        self._shape = None
+        self._free = []
+        self._in_flight = deque()    # (buffer, acquire time), oldest first
+        self.allocations = 0
+        self.exhausted = 0           # acquire() calls that found no buffer
+
+    def acquire(self, shape):
+        """A buffer of `shape` for the next frame, or None if all are in flight."""
+        shape = tuple(shape)
+        with self._lock:
+            if shape != self._shape:
+                # Display size changed: old buffers are dropped as they come back
+                self._shape = shape
+                self._free = []
+
+            if not self._free and len(self._in_flight) >= self.size:
+                buffer, acquired_at = self._in_flight[0]
+                if time.monotonic() - acquired_at < self.max_in_flight_age:
+                    self.exhausted += 1
+                    return None
+                # The consumer never released it: take it back
+                self._in_flight.popleft()
+                if buffer.shape == shape:
+                    self._free.append(buffer)
+
+            if self._free:
+                buffer = self._free.pop()
+            else:
+                buffer = np.empty(shape, dtype=np.uint8)
+                self.allocations += 1
+            self._in_flight.append((buffer, time.monotonic()))
+            return buffer
+
+    def release(self):
+        """Returns the oldest in-flight buffer to the pool."""
+        with self._lock:
+            if not self._in_flight:
+                return
+            buffer, _ = self._in_flight.popleft()
+            if buffer.shape == self._shape:
+                self._free.append(buffer)
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
@@ -0,0 +1,93 @@
+# src/FrameSlot.py
+
+import threading
+import time
+from collections import deque
+
+
+class FrameSlot:
+    """
+    Single-item, drop-oldest hand-off between two threads.
+
+    The producer overwrites whatever is waiting; the consumer always gets the
+    newest item. Overwritten items are counted in `drops`, so a slow consumer
+    shows up as a growing drop counter instead of a growing backlog.
+    """
+
+    def __init__(self, wakeup=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._pending = False
+        self.pending_since = None  # monotonic time the waiting item was put
+        self.wakeup = wakeup       # Optional threading.Event set on every put (for multi-slot consumers)
+        self.closed = False
+        self.puts = 0
+        self.drops = 0
+
+    @property
+    def depth(self):
+        """Items waiting to be consumed (0 or 1)."""
+        return int(self._pending)
+
+    def put(self, item):
+        """Publishes `item`, replacing an unconsumed one. Returns its sequence number."""
+        with self._cond:
+            if self._pending:
+                self.drops += 1
+            self._item = item
+            self._seq += 1
+            self._pending = True
+            self.pending_since = time.monotonic()
+            self.puts += 1
+            seq = self._seq
+            self._cond.notify_all()
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return seq
+
+    def get(self, timeout=None):
+        """
+        Waits for an item newer than the last one returned and returns
+        (seq, item), or None on timeout or once the slot is closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending or self.closed, timeout):
+                return None
+            if not self._pending:
+                return None
+            self._pending = False
+            self.pending_since = None
+            return self._seq, self._item
+
+    def peek(self):
+        """Returns the newest (seq, item) without consuming it, or None if nothing was put yet."""
+        with self._cond:
+            return (self._seq, self._item) if self._seq else None
+
+    def close(self):
+        """Wakes any waiting consumer; subsequent gets return None once drained."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+
+class RateMeter:
+    """Events per second over the last `window` events."""
+
+    def __init__(self, window=30):
+        self._times = deque(maxlen=window)
+        self.count = 0
+
+    def tick(self):
+        self._times.append(time.monotonic())
+        self.count += 1
+
+    @property
+    def rate(self):
+        if len(self._times) < 2:
+            return 0.0
+        elapsed = self._times[-1] - self._times[0]
+        return (len(self._times) - 1) / elapsed if elapsed > 0 else 0.0
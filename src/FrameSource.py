@@ -0,0 +1,68 @@
+# src/FrameSource.py
+
+import os
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+class ImageDirectorySource:
+    """
+    Replays the images of a directory (sorted by name) as if they were
+    camera frames. Same read()/isOpened()/release() interface as
+    cv2.VideoCapture, so it can stand in for a camera anywhere.
+    """
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._position = 0
+        self._released = False
+
+    def isOpened(self):
+        return not self._released and bool(self.files)
+
+    def read(self):
+        while self.isOpened():
+            if self._position >= len(self.files):
+                if not self.loop:
+                    return False, None
+                self._position = 0
+            file_path = self.files[self._position]
+            self._position += 1
+            frame = cv2.imread(file_path)
+            if frame is not None:
+                return True, frame
+            print(f"WARNING: Skipping unreadable image {file_path}")
+        return False, None
+
+    def set(self, prop_id, value):
+        return False  # No driver properties (e.g. CAP_PROP_BUFFERSIZE) to set
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.files))
+        return 0.0
+
+    def release(self):
+        self._released = True
+
+
+def open_frame_source(source=0, loop=False):
+    """
+    Opens a frame source from a camera index (int or digit string), a video
+    file or a directory of images. Every source has the cv2.VideoCapture
+    read()/isOpened()/release() interface.
+    """
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return cv2.VideoCapture(int(source))
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, loop=loop)
+    if loop:
+        print("WARNING: Looping is only supported for image directories; the video plays once.")
+    return cv2.VideoCapture(source)
@@ -0,0 +1,211 @@
+# src/GalleryIndex.py
+
+import os
+
+import numpy as np
+
+from src.SearchIndex import create_search_index, top_k
+
+# How an identity with several templates is scored against a query
+AGGREGATES = ('max', 'mean')
+
+
+def l2_normalize(vectors):
+    """Returns a float32 copy of `vectors` (N, D) with every row scaled to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # Leave all-zero rows as zeros instead of producing NaNs
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def reduce_templates(vectors, k, iters=10):
+    """
+    Clusters the templates of one identity (N, D) into at most `k` unit-length
+    prototypes with spherical k-means. Seeding is deterministic: the template
+    nearest the mean first, then repeatedly the one least similar to every
+    seed so far, so distinct poses/lighting each keep a prototype.
+    """
+    vectors = l2_normalize(vectors)
+    if len(vectors) <= k:
+        return vectors
+    centre = l2_normalize(vectors.mean(axis=0))[0]
+    seeds = [int(np.argmax(vectors @ centre))]
+    closest = vectors @ vectors[seeds[0]]
+    while len(seeds) < k and closest.min() < 1.0 - 1e-6:
+        seeds.append(int(np.argmin(closest)))
+        closest = np.maximum(closest, vectors @ vectors[seeds[-1]])
+
+    prototypes = vectors[seeds]
+    for _ in range(iters):
+        labels = np.argmax(vectors @ prototypes.T, axis=1)
+        sums = np.zeros_like(prototypes)
+        np.add.at(sums, labels, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = prototypes[empty]
+        prototypes = l2_normalize(sums)
+    return prototypes
+
+
+class GalleryIndex:
+    """
+    Holds the known faces as one contiguous float32 matrix of L2-normalized
+    embeddings, built once at load or registration time.
+
+    Because every row is unit length, cosine similarity against the whole
+    gallery is a single matrix multiply, and all faces of a frame are scored
+    together in one call to `match`. The matrix may also be a read-only
+    memmap of a GalleryStore, in which case tombstoned rows are masked out
+    at match time instead of being copied away.
+
+    The search itself is delegated to a pluggable backend from SearchIndex:
+    'flat' (exact, the default) or 'ivf' (approximate, for very large
+    galleries; tune it with e.g. `n_lists=` and `nprobe=`).
+
+    Rows are templates: several rows may carry the same id (captures from
+    different angles or lighting). `aggregate` picks how an identity is
+    scored: 'max' takes its best template (the search backend returns enough
+    rows to fill `k` distinct ids), 'mean' averages over all its templates in
+    one exact matrix multiply plus a segmented sum, bypassing the backend.
+    """
+
+    def __init__(self, embeddings=None, ids=None, index_type='flat', aggregate='max', **index_params):
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{aggregate}'. Choose from: {', '.join(AGGREGATES)}")
+        self.aggregate = aggregate
+        self.ids = []
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self._dead = None  # Boolean mask of rows to ignore, or None when every row is live
+        self.search_index = create_search_index(index_type, **index_params)
+        self._index_path = None  # Where the search backend persists itself, if anywhere
+        self._groups = None      # Cached per-identity row grouping, see _identity_groups
+        self._store_version = None  # (generation, records applied) of the store last loaded
+        if embeddings is not None and len(embeddings) > 0:
+            self.build(embeddings, ids)
+
+    def __len__(self):
+        if self._dead is None:
+            return len(self.ids)
+        return len(self.ids) - int(self._dead.sum())
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def build(self, embeddings, ids):
+        """Replaces the gallery contents with `embeddings` (N, D) labelled by `ids`."""
+        if len(embeddings) != len(ids):
+            raise ValueError(f"Got {len(embeddings)} embeddings but {len(ids)} ids.")
+        self.ids = list(ids)
+        self.matrix = l2_normalize(embeddings) if self.ids else np.empty((0, 0), dtype=np.float32)
+        self._dead = None
+        self._index_path = None
+        self._groups = None
+        self.search_index.build(self.matrix)
+
+    def load_store(self, store):
+        """Matches directly against a GalleryStore's memory-mapped rows, without copying them."""
+        self.matrix = store.embeddings
+        self.ids = list(store.row_ids)
+        dead = ~store.live_mask()
+        self._dead = dead if dead.any() else None
+        self._groups = None
+        self._store_version = (store.generation, store.records_applied)
+        # Persist the search backend next to the gallery files it indexes
+        self._index_path = os.path.join(store.path, f"{self.search_index.name}.index.npz")
+        self.search_index.build(self.matrix, path=self._index_path)
+
+    def sync_store(self, store):
+        """
+        Catches up with a GalleryStore refreshed since `load_store`: appended
+        rows are added to the search backend incrementally (IVF only assigns
+        them to buckets) and the tombstone mask is recomputed. Falls back to
+        `load_store` if the store was rewritten. Returns True if anything changed.
+        """
+        version = (store.generation, store.records_applied)
+        if version == self._store_version:
+            return False
+        if self._store_version is None or store.generation != self._store_version[0]:
+            self.load_store(store)
+            return True
+        self.matrix = store.embeddings
+        self.ids.extend(store.row_ids[len(self.ids):])
+        dead = ~store.live_mask()
+        self._dead = dead if dead.any() else None
+        self._groups = None
+        self._store_version = version
+        self.search_index.add(self.matrix, path=self._index_path)
+        return True
+
+    def add(self, embedding, user_id):
+        """Appends a single template row (e.g. right after registration)."""
+        row = l2_normalize(embedding)
+        if len(self.ids) == 0:
+            self.matrix = row
+        else:
+            if row.shape[1] != self.dim:
+                raise ValueError(f"Embedding has dimension {row.shape[1]}, gallery expects {self.dim}.")
+            self.matrix = np.ascontiguousarray(np.vstack([self.matrix, row]))
+        self.ids.append(user_id)
+        self._groups = None
+        if self._dead is not None:
+            self._dead = np.append(self._dead, False)
+        self.search_index.add(self.matrix)
+
+    def match(self, queries, k=1):
+        """
+        Scores all `queries` against the gallery in one search call.
+
+        Returns one list per query of up to `k` (id, score) pairs, best first.
+        """
+        if len(queries) == 0:
+            return []
+        if len(self) == 0:
+            return [[] for _ in range(len(queries))]
+
+        queries = l2_normalize(queries)
+        if self.aggregate == 'mean':
+            return self._match_mean(queries, k)
+
+        # Max over templates: the best row of each id, taking enough rows to see k ids
+        per_id = int(self._identity_groups()[3].max())
+        rows, scores = self.search_index.search(queries, k * per_id, dead=self._dead)
+        results = []
+        for q in range(len(rows)):
+            best, seen = [], set()
+            for j, score in zip(rows[q], scores[q]):
+                if not np.isfinite(score) or self.ids[j] in seen:
+                    continue
+                seen.add(self.ids[j])
+                best.append((self.ids[j], float(score)))
+                if len(best) == k:
+                    break
+            results.append(best)
+        return results
+
+    def _match_mean(self, queries, k):
+        identities, matrix, starts, counts = self._identity_groups(with_matrix=True)
+        scores = np.add.reduceat(queries @ matrix.T, starts, axis=1) / counts
+        top = top_k(scores, k)
+        return [[(identities[j], float(scores[q, j])) for j in top[q]] for q in range(len(queries))]
+
+    def _identity_groups(self, with_matrix=False):
+        """
+        (identity ids, live rows grouped by identity, group starts, template
+        counts). With `with_matrix` the second item is the grouped rows' matrix
+        instead of their indices (a contiguous copy, kept for 'mean').
+        """
+        if self._groups is None:
+            live = np.arange(len(self.ids)) if self._dead is None else np.flatnonzero(~self._dead)
+            position = {}
+            labels = np.fromiter((position.setdefault(self.ids[row], len(position)) for row in live),
+                                 dtype=np.int64, count=len(live))
+            order = live[np.argsort(labels, kind='stable')]
+            counts = np.bincount(labels, minlength=len(position))
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            self._groups = [list(position), order, starts, counts, None]
+        if with_matrix and self._groups[4] is None:
+            self._groups[4] = np.ascontiguousarray(self.matrix[self._groups[1]], dtype=np.float32)
+        identities, order, starts, counts, matrix = self._groups
+        return identities, (matrix if with_matrix else order), starts, counts
@@ -0,0 +1,392 @@
+# src/GalleryStore.py
+
+import json
+import os
+
+import numpy as np
+
+try:
+    import fcntl  # POSIX only; on Windows appends are serialized per process only
+except ImportError:
+    fcntl = None
+
+from src.GalleryIndex import l2_normalize, reduce_templates
+
+FORMAT_NAME = "smart-office-gallery"
+FORMAT_VERSION = 2  # 2: "template" records (several rows per identity)
+DEFAULT_GALLERY_PATH = "data/gallery"
+DEFAULT_MAX_TEMPLATES = 5  # Prototypes kept per identity by compaction
+LEGACY_PICKLE_PATH = "data/embeddings.pkl"
+
+HEADER_FILE = "header.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = ".lock"
+
+
+class GalleryStore:
+    """
+    Versioned on-disk gallery that can be memory-mapped without copying.
+
+    A gallery is a directory holding three files:
+
+    - ``header.json``: format version, embedding dimension, dtype and model name.
+    - ``embeddings.f32``: a raw, row-major float32 block of L2-normalized
+      embeddings, one row per ``add``/``template`` record.
+    - ``index.jsonl``: an append-only log of ``{"op": "add", "row", "id", "name"}``
+      (replaces the identity's templates), ``{"op": "template", ...}`` (adds
+      one more template, e.g. another capture or angle) and
+      ``{"op": "delete", "id"}`` records.
+
+    An identity may therefore own several rows; `live_rows` maps each id to
+    the list of its rows and GalleryIndex aggregates over them at match time.
+    `compact(max_templates=K)` clusters every identity down to at most K
+    prototypes so memory and match cost stay bounded.
+
+    Appends write the embedding rows first and the index records last, each
+    fsync'd, so the index is the commit point: rows past the last committed
+    ``add`` are ignored and overwritten by the next append. Deletes are
+    tombstones; `compact` rewrites the files without them. Readers replay the
+    index and map the embeddings under the same lock as the writers, so they
+    never pair one generation's index with another's embeddings while a
+    compaction swaps the two files. Nothing here is unpickled, so loading a
+    gallery is safe.
+    """
+
+    def __init__(self, path=DEFAULT_GALLERY_PATH, dim=128, model_name="Facenet"):
+        self.path = path
+        self.dim = dim
+        self.model_name = model_name
+        self.row_ids = []      # id of every committed row (including tombstoned ones)
+        self.names = {}        # id -> display name
+        self.live_rows = {}    # id -> rows currently holding its templates
+        self.generation = 0    # Bumped by every full reload (e.g. after another process compacted)
+        self.records_applied = 0
+        self._live = bytearray()  # 1 per live row, 0 per tombstoned/superseded row
+        self._index_offset = 0    # Bytes of index.jsonl applied so far
+        self._index_inode = None
+        self._embeddings = None
+
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._file(HEADER_FILE)):
+            self._read_header()
+        else:
+            self._write_header()
+        self.reload()
+
+    # --- Paths / header ---
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_header(self):
+        with open(self._file(HEADER_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("format") != FORMAT_NAME:
+            raise ValueError(f"{self.path} is not a gallery directory.")
+        if header.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"Gallery version {header['version']} is newer than supported ({FORMAT_VERSION}).")
+        if header.get("dtype") != "float32":
+            raise ValueError(f"Unsupported gallery dtype: {header.get('dtype')}")
+        self.dim = int(header["dim"])
+        self.model_name = header.get("model", self.model_name)
+        self.version = header["version"]
+
+    def _write_header(self):
+        self.version = FORMAT_VERSION
+        header = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "dim": self.dim,
+            "dtype": "float32",
+            "model": self.model_name,
+            "normalized": True,
+        }
+        _atomic_write(self._file(HEADER_FILE), json.dumps(header, indent=2).encode("utf-8"))
+
+    # --- Loading ---
+
+    def reload(self):
+        """Replays the whole index log and re-maps the embeddings block."""
+        with self._locked():
+            self._reload()
+
+    def _reload(self):
+        self.row_ids, self.names, self.live_rows = [], {}, {}
+        self._live = bytearray()
+        self._index_offset, self._index_inode = 0, None
+        self.records_applied = 0
+        self.generation += 1
+        self._read_new_records()
+        self._map_embeddings()
+
+    def refresh(self):
+        """
+        Applies only the index records committed (by any process) since the
+        last load. Returns the list of new records, or None if the gallery was
+        rewritten in the meantime (compaction) and had to be fully reloaded.
+        """
+        with self._locked():
+            return self._refresh()
+
+    def _refresh(self):
+        try:
+            inode = os.stat(self._file(INDEX_FILE)).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._index_inode and (self._index_inode is not None or self._index_offset):
+            self._reload()
+            return None
+        generation = self.generation
+        records = self._read_new_records()
+        if self.generation != generation:
+            return None  # Fully reloaded after all
+        if any(record["op"] != "delete" for record in records):
+            self._map_embeddings()  # Re-map to cover the appended rows
+        return records
+
+    def _read_new_records(self):
+        path = self._file(INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if self._index_inode is not None and inode != self._index_inode:
+                self._reload()  # Replaced between the caller's check and now
+                return []
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self._index_offset:
+                self._reload()  # Truncated behind our back
+                return []
+            self._index_inode = inode
+            f.seek(self._index_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # A torn trailing line from an interrupted append is not committed
+        records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        self._index_offset += end
+        for record in records:
+            self._apply(record)
+        return records
+
+    def _apply(self, record):
+        user_id = record["id"]
+        if record["op"] == "add":
+            for row in self.live_rows.get(user_id, ()):
+                self._live[row] = 0
+            self.row_ids.append(user_id)
+            self._live.append(1)
+            self.names[user_id] = record.get("name", user_id)
+            self.live_rows[user_id] = [record["row"]]
+        elif record["op"] == "template":
+            self.row_ids.append(user_id)
+            self._live.append(1)
+            self.names.setdefault(user_id, record.get("name", user_id))
+            self.live_rows.setdefault(user_id, []).append(record["row"])
+        elif record["op"] == "delete":
+            for row in self.live_rows.pop(user_id, ()):
+                self._live[row] = 0
+            self.names.pop(user_id, None)
+        self.records_applied += 1
+
+    def _map_embeddings(self):
+        """Maps the committed rows; called under the lock, together with the index replay."""
+        rows = len(self.row_ids)
+        if rows == 0:
+            self._embeddings = np.empty((0, self.dim), dtype=np.float32)
+        else:
+            self._embeddings = np.memmap(
+                self._file(EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(rows, self.dim)
+            )
+
+    @property
+    def embeddings(self):
+        """Read-only (rows, dim) float32 memmap of every committed row, tombstones included."""
+        return self._embeddings
+
+    def __len__(self):
+        return len(self.live_rows)
+
+    def __contains__(self, user_id):
+        return user_id in self.live_rows
+
+    def live_mask(self):
+        """Boolean mask over `embeddings` rows that are not tombstoned or superseded."""
+        return np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+
+    def ids(self):
+        """User ids of the live identities, in row order."""
+        return [user_id for user_id, _ in sorted(self.live_rows.items(), key=lambda item: item[1][0])]
+
+    def templates(self, user_id):
+        """(T, dim) float32 copy of the templates of `user_id`."""
+        return np.array(self.embeddings[self.live_rows[user_id]], dtype=np.float32)
+
+    def template_count(self):
+        """Number of live template rows across all identities."""
+        return sum(len(rows) for rows in self.live_rows.values())
+
+    # --- Writing ---
+
+    def append(self, user_ids, names, embeddings, replace=True):
+        """
+        Atomically appends one or more templates. With `replace`, an id's
+        first row in this call supersedes its previous templates (later rows
+        of the same id in the call are kept alongside it); otherwise every row
+        is added as an extra template of its id.
+        """
+        embeddings = l2_normalize(embeddings)
+        if len(user_ids) != len(embeddings) or len(names) != len(embeddings):
+            raise ValueError("user_ids, names and embeddings must have the same length.")
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding has dimension {embeddings.shape[1]}, gallery expects {self.dim}.")
+
+        with self._locked():
+            self._refresh()  # Pick up rows committed by other processes
+            first_row = len(self.row_ids)
+
+            # 1. Embedding rows, written past the last committed row
+            with open(self._file(EMBEDDINGS_FILE), "ab+") as f:
+                f.truncate(first_row * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(embeddings.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 2. Index records (commit point)
+            records, seen = [], set()
+            for i, (user_id, name) in enumerate(zip(user_ids, names)):
+                op = "add" if replace and user_id not in seen else "template"
+                seen.add(user_id)
+                records.append({"op": op, "row": first_row + i, "id": user_id, "name": name})
+            if self.version < FORMAT_VERSION and any(record["op"] == "template" for record in records):
+                self._write_header()  # Older readers must not silently drop "template" records
+            self._append_records(records)
+            self._read_new_records()
+            self._map_embeddings()
+
+    def add(self, user_id, name, embedding, replace=True):
+        """Appends a single identity (or, with `replace=False`, one more template of it)."""
+        self.append([user_id], [name], np.asarray(embedding, dtype=np.float32)[np.newaxis, :], replace=replace)
+
+    def delete(self, user_id):
+        """Tombstones `user_id`. Its row stays on disk until `compact`."""
+        with self._locked():
+            self._refresh()
+            if user_id not in self.live_rows:
+                return False
+            self._append_records([{"op": "delete", "id": user_id}])
+            self._read_new_records()
+            return True
+
+    def compact(self, max_templates=None):
+        """
+        Rewrites the gallery without tombstoned or superseded rows. With
+        `max_templates`, identities holding more templates are clustered down
+        to that many prototypes (see `reduce_templates`).
+        """
+        with self._locked():
+            self._reload()
+            blocks, lines, row = [], [], 0
+            for user_id in self.ids():
+                vectors = self.templates(user_id)
+                if max_templates and len(vectors) > max_templates:
+                    vectors = reduce_templates(vectors, max_templates)
+                for i in range(len(vectors)):
+                    record = {"op": "add" if i == 0 else "template", "row": row, "id": user_id,
+                              "name": self.names[user_id]}
+                    lines.append(json.dumps(record) + "\n")
+                    row += 1
+                blocks.append(vectors)
+            vectors = np.concatenate(blocks) if blocks else np.empty((0, self.dim), dtype=np.float32)
+            if self.version < FORMAT_VERSION and row > len(self.live_rows):
+                self._write_header()
+            lines = "".join(lines)
+            self._embeddings = None  # Drop our own mapping before replacing the file
+            _atomic_write(self._file(EMBEDDINGS_FILE), vectors.reshape(-1, self.dim).tobytes())
+            _atomic_write(self._file(INDEX_FILE), lines.encode("utf-8"))
+            self._reload()
+
+    def _append_records(self, records):
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        with open(self._file(INDEX_FILE), "ab+") as f:
+            # Drop a torn trailing line left by an interrupted append
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size:
+                f.seek(max(0, size - 4096))
+                tail = f.read()
+                if not tail.endswith(b"\n"):
+                    f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _locked(self):
+        return _FileLock(self._file(LOCK_FILE))
+
+    # --- Migration ---
+
+    def import_legacy_pickle(self, pickle_path=LEGACY_PICKLE_PATH):
+        """
+        One-time import of the old `embeddings.pkl` dictionary. Both layouts
+        ever written are accepted, {name: embedding} and {id: {'name',
+        'embedding'}}; an entry holding a (T, D) array becomes T templates.
+        Only run this on a pickle file you created yourself.
+        """
+        from src.utils import load_embeddings_dict
+
+        data = load_embeddings_dict(pickle_path)
+        if not data:
+            return 0
+        user_ids, names, vectors = [], [], []
+        for key, value in data.items():
+            name, embedding = (value.get("name", key), value["embedding"]) if isinstance(value, dict) else (key, value)
+            embedding = np.atleast_2d(np.asarray(embedding, dtype=np.float32))
+            user_ids += [key] * len(embedding)
+            names += [name] * len(embedding)
+            vectors.append(embedding)
+        self.append(user_ids, names, np.concatenate(vectors))
+        return len(data)
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file, serializing writers across processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def _atomic_write(path, data):
+    """Writes `data` to a temp file and renames it over `path`."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def open_gallery(path=DEFAULT_GALLERY_PATH, legacy_path=LEGACY_PICKLE_PATH):
+    """
+    Opens (or creates) the gallery at `path`. A brand-new gallery is seeded
+    from the legacy pickle file if one exists.
+    """
+    is_new = not os.path.exists(os.path.join(path, HEADER_FILE))
+    store = GalleryStore(path)
+    if is_new and legacy_path and os.path.exists(legacy_path):
+        count = store.import_legacy_pickle(legacy_path)
+        print(f"INFO: Migrated {count} identities from {legacy_path} to {path}.")
+    return store
@@ -0,0 +1,316 @@
+# src/InferencePool.py
+
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.FaceTracker import FaceTracker
+from src.GalleryStore import DEFAULT_GALLERY_PATH
+
+# Compact per-face record sent back by the workers
+RESULT_FIELDS = ('x', 'y', 'w', 'h', 'user_id', 'status', 'confidence', 'matched')
+
+
+def _worker_main(worker_id, tasks, results, shm_name, slot_shape, gallery_path):
+    """
+    Worker process: owns its own RecognitionModel and reads frames straight
+    out of the shared-memory ring, so frames are never pickled.
+    """
+    from src.RecognitionModel import RecognitionModel
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        ring = np.ndarray(slot_shape, dtype=np.uint8, buffer=shm.buf)
+        model = RecognitionModel(gallery_path=gallery_path, warm_up=False)
+        model.tracker = None  # Identity tracking happens in the parent
+        # Per-stream model state is keyed on a worker-side tracker per stream, so
+        # cameras never share it; reconfirm_interval=0 still recognizes every face
+        stream_keys = {}
+        model.models.wait_until_ready()
+        results.put(('ready', worker_id, mp.current_process().pid))
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            if task[0] == 'reload':
+                model.sync_gallery()
+                continue
+
+            _, job_id, slot, (h, w), detector_mode, stream_id = task
+            frame = ring[slot, :h, :w]
+            key = stream_keys.get(stream_id)
+            if key is None:
+                key = stream_keys[stream_id] = FaceTracker(reconfirm_interval=0)
+            try:
+                faces = model.analyze_frame(frame, detector_mode=detector_mode, tracker=key)
+                records = None if faces is None else [
+                    (*map(int, face['box']), face['user_id'], face['status'], float(face['confidence']), face['matched'])
+                    for face in faces
+                ]
+                results.put(('result', worker_id, job_id, records))
+            except Exception as e:
+                results.put(('error', worker_id, job_id, str(e)))
+    finally:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.tasks = None
+        self.ready = False
+        self.in_flight = {}   # job_id -> dispatch time
+        self.jobs_done = 0
+        self.restarts = 0
+        self.started_at = 0.0
+
+
+class InferencePool:
+    """
+    Optional multi-process inference backend for RecognitionModel.
+
+    Frames are copied once into a `multiprocessing.shared_memory` ring of
+    fixed-size slots and only the slot number travels over the task queue;
+    workers answer with compact tuples (see RESULT_FIELDS). Each worker
+    process has its own model, so recognition is no longer bound by the GUI
+    process' GIL or a single TensorFlow scheduler.
+
+    Workers fully recognize every frame (each stream has its own worker-side
+    tracker, so cameras never share model state); a per-stream FaceTracker in
+    the parent restores track IDs and identity changes, dropping results that
+    arrive out of order. A monitor thread restarts workers that die or exceed
+    `job_timeout` on a frame.
+    """
+
+    def __init__(self, n_workers=None, gallery_path=DEFAULT_GALLERY_PATH, frame_shape=(1080, 1920, 3),
+                 slots_per_worker=2, job_timeout=10.0):
+        self.n_workers = n_workers or max(1, (mp.cpu_count() or 2) // 2)
+        self.gallery_path = gallery_path
+        self.frame_shape = tuple(frame_shape)
+        self.slots_per_worker = slots_per_worker
+        self.job_timeout = job_timeout
+
+        self.submitted = 0
+        self.dropped = 0          # Frames refused because every slot was busy
+        self.stale_results = 0    # Results older than one already delivered for the stream
+
+        self._ctx = mp.get_context('spawn')  # Never fork a process that has TensorFlow loaded
+        self._lock = threading.Lock()
+        self._workers = [_Worker(i) for i in range(self.n_workers)]
+        self._jobs = {}           # job_id -> (stream_id, seq, slot, callback, worker_id)
+        self._free_slots = []
+        self._next_job = 0
+        self._streams = {}        # stream_id -> {'tracker': FaceTracker, 'last_seq': int}
+        self._shm = None
+        self._ring = None
+        self._results = None
+        self._is_running = False
+        self._threads = []
+
+    # --- Lifecycle ---
+
+    def start(self):
+        n_slots = self.n_workers * self.slots_per_worker
+        slot_bytes = int(np.prod(self.frame_shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=n_slots * slot_bytes)
+        self._ring = np.ndarray((n_slots, *self.frame_shape), dtype=np.uint8, buffer=self._shm.buf)
+        self._free_slots = list(range(n_slots))
+        self._results = self._ctx.Queue()
+        self._is_running = True
+
+        for worker in self._workers:
+            self._spawn(worker)
+        self._threads = [
+            threading.Thread(target=self._result_loop, name="pool-results", daemon=True),
+            threading.Thread(target=self._monitor_loop, name="pool-monitor", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._is_running = False
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.tasks.put(None)
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        self._results.put(None)  # Unblock the result thread
+        for thread in self._threads:
+            thread.join()
+        self._ring = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def _spawn(self, worker):
+        worker.tasks = self._ctx.Queue()
+        worker.ready = False
+        worker.started_at = time.monotonic()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, worker.tasks, self._results, self._shm.name,
+                  self._ring.shape, self.gallery_path),
+            name=f"inference-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    # --- Submitting frames ---
+
+    def submit(self, stream_id, seq, frame, callback, detector_mode='cnn'):
+        """
+        Queues `frame` for recognition without blocking. `callback(seq, results)`
+        is called on the pool's result thread. Returns False (frame dropped) if
+        no worker or ring slot is free.
+        """
+        h, w = frame.shape[:2]
+        if h > self.frame_shape[0] or w > self.frame_shape[1] or frame.shape[2:] != self.frame_shape[2:]:
+            raise ValueError(f"Frame shape {frame.shape} does not fit the pool's {self.frame_shape} slots.")
+
+        with self._lock:
+            candidates = [worker for worker in self._workers
+                          if worker.ready and len(worker.in_flight) < self.slots_per_worker]
+            if not candidates or not self._free_slots:
+                self.dropped += 1
+                return False
+            worker = min(candidates, key=lambda candidate: len(candidate.in_flight))
+            slot = self._free_slots.pop()
+            job_id = self._next_job
+            self._next_job += 1
+            self._jobs[job_id] = (stream_id, seq, slot, callback, worker.worker_id)
+            worker.in_flight[job_id] = time.monotonic()
+            self._streams.setdefault(stream_id, {'tracker': FaceTracker(), 'last_seq': -1})
+            self.submitted += 1
+
+        # The single copy of the frame: straight into shared memory
+        self._ring[slot, :h, :w] = frame
+        worker.tasks.put(('frame', job_id, slot, (h, w), detector_mode, stream_id))
+        return True
+
+    def reload_gallery(self):
+        """Asks every worker to apply the latest gallery changes (e.g. after a registration)."""
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.tasks.put(('reload',))
+
+    # --- Results ---
+
+    def _release(self, job_id):
+        """Frees a job's slot and bookkeeping. Returns the job tuple, or None if unknown."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return None
+            self._free_slots.append(job[2])
+            self._workers[job[4]].in_flight.pop(job_id, None)
+            return job
+
+    def _result_loop(self):
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            kind, worker_id = message[0], message[1]
+
+            if kind == 'ready':
+                self._workers[worker_id].ready = True
+                print(f"INFO: Inference worker {worker_id} ready (pid {message[2]}).")
+                continue
+
+            job = self._release(message[2])
+            if job is None:
+                continue  # Job of a worker that was restarted meanwhile
+            self._workers[worker_id].jobs_done += 1
+            if kind == 'error':
+                print(f"ERROR: Inference worker {worker_id} failed on a frame: {message[3]}")
+                continue
+            if message[3] is None:
+                continue  # Detection failed on that frame
+
+            stream_id, seq, _, callback, _ = job
+            results = self._track(stream_id, seq, message[3])
+            if results is not None:
+                try:
+                    callback(seq, results)
+                except Exception as e:
+                    print(f"ERROR: Result callback for stream '{stream_id}' failed: {e}")
+
+    def _track(self, stream_id, seq, records):
+        """Turns compact records into result dicts with per-stream track IDs."""
+        stream = self._streams[stream_id]
+        if seq <= stream['last_seq']:
+            self.stale_results += 1
+            return None
+        stream['last_seq'] = seq
+
+        faces = [dict(zip(RESULT_FIELDS, record)) for record in records]
+        tracker = stream['tracker']
+        tracks = tracker.update([(face['x'], face['y'], face['w'], face['h']) for face in faces])
+        results = []
+        for face, track in zip(faces, tracks):
+            identity = {key: face[key] for key in ('user_id', 'status', 'confidence', 'matched')}
+            identity_changed = track.set_identity(identity, tracker.frame_index)
+            results.append(dict(
+                identity,
+                box=(face['x'], face['y'], face['w'], face['h']),
+                track_id=track.track_id,
+                recognized=True,
+                identity_changed=identity_changed,
+            ))
+        return results
+
+    # --- Health monitoring ---
+
+    def _monitor_loop(self):
+        while self._is_running:
+            time.sleep(0.5)
+            now = time.monotonic()
+            for worker in self._workers:
+                if not self._is_running:
+                    break
+                with self._lock:
+                    hung = any(now - started > self.job_timeout for started in worker.in_flight.values())
+                dead = worker.process is not None and not worker.process.is_alive()
+                if not (dead or hung):
+                    continue
+                # Back off exponentially so a worker that cannot even load its model doesn't spin
+                if dead and now - worker.started_at < min(2 ** worker.restarts, 60):
+                    continue
+
+                reason = "died" if dead else f"exceeded {self.job_timeout:.0f}s on a frame"
+                print(f"WARNING: Inference worker {worker.worker_id} {reason}; restarting.")
+                if not dead:
+                    worker.process.terminate()
+                    worker.process.join(timeout=5)
+                for job_id in list(worker.in_flight):
+                    self._release(job_id)
+                worker.restarts += 1
+                self._spawn(worker)
+
+    def stats(self):
+        """Queue, drop and per-worker health counters."""
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'stale_results': self.stale_results,
+                'free_slots': len(self._free_slots),
+                'workers': [
+                    {
+                        'worker_id': worker.worker_id,
+                        'alive': worker.process is not None and worker.process.is_alive(),
+                        'ready': worker.ready,
+                        'in_flight': len(worker.in_flight),
+                        'jobs_done': worker.jobs_done,
+                        'restarts': worker.restarts,
+                    }
+                    for worker in self._workers
+                ],
+            }
@@ -1,29 +1,66 @@
 # src/LogManager.py
 
+import atexit
+import queue
 import sqlite3
 import datetime
-import os
+import threading
+import time
+
+from src.PerfStats import get_perf_stats
 
 # --- CHANGE: Remove the file path definition ---
 # DATABASE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'access_log.db')
 
+_STOP = object()
+
 class LogManager:
+    """
+    Access-event log backed by SQLite.
+
+    One long-lived connection is owned by a background writer thread.
+    `log_access_event` only enqueues the event (bounded queue, never blocks
+    the camera); the writer flushes queued events with a single `executemany`
+    + commit whenever `batch_size` events are waiting or `flush_interval`
+    seconds have passed. File databases run in WAL mode with
+    synchronous=NORMAL, so commits don't fsync individually.
+    """
+
     # --- CHANGE: Default db_file to ':memory:' if none is provided ---
-    def __init__(self, db_file=':memory:'): 
+    def __init__(self, db_file=':memory:', batch_size=100, flush_interval=0.5, max_queue=10000):
         """
-        Initializes the LogManager. By default, uses an in-memory database 
-        for cloud deployment stability. Logs will be lost on app restart.
+        Initializes the LogManager. By default, uses an in-memory database
+        for cloud deployment stability. Logs will be lost on app restart
+        (but, since the connection is kept open, not between events).
         """
         self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0  # Events discarded because the queue was full
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._conn_lock = threading.Lock()
+        self._listeners = []
+        self._conn = None
+        self._perf = get_perf_stats()
         self._initialize_db()
 
+        self._writer = threading.Thread(target=self._writer_loop, name="log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
     def _initialize_db(self):
-        """Creates the database (in-memory or file) and the access_log table."""
+        """Opens the long-lived connection and creates the access_log table and indexes."""
         try:
-            # The database connection will open an in-memory DB if self.db_file == ':memory:'
-            conn = sqlite3.connect(self.db_file) 
-            cursor = conn.cursor()
-            
+            # The connection is shared by the writer and readers under _conn_lock; an
+            # in-memory DB therefore lives as long as this LogManager, not one call
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            cursor = self._conn.cursor()
+
+            if self.db_file != ':memory:':
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+
             # Table Schema: Timestamp, User, Status, Confidence
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS access_log (
@@ -34,8 +71,25 @@ class LogManager:
                     confidence REAL
                 )
             """)
-            conn.commit()
-            conn.close()
+            # One row per aggregated presence (see EventAggregator)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    stream TEXT,
+                    first_seen TEXT NOT NULL,
+                    last_seen TEXT NOT NULL,
+                    frames INTEGER,
+                    peak_confidence REAL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_access_log_timestamp ON access_log (timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_access_log_user_id ON access_log (user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_access_log_status ON access_log (status)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_first_seen ON sessions (first_seen)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id)")
+            self._conn.commit()
             # Inform the user where the database is located
             if self.db_file == ':memory:':
                 print("INFO: Database initialized in-memory.")
@@ -45,39 +99,175 @@ class LogManager:
         except sqlite3.Error as e:
             print(f"ERROR: SQLite initialization failed: {e}")
 
+    def add_listener(self, callback):
+        """
+        Registers `callback(rows)`, called on the writer thread after each
+        flush with the newly committed rows as (id, timestamp, status, user_id, confidence).
+        """
+        self._listeners.append(callback)
+
     def log_access_event(self, user_id, status, confidence=None):
-        """Inserts a new access event into the database."""
+        """Queues a new access event; it is written with the next batch."""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._enqueue(('access', (timestamp, user_id, status, confidence)))
+
+    def log_session(self, user_id, status, first_seen, last_seen, frames, peak_confidence, stream_id=None):
+        """Queues a closed presence session; `first_seen`/`last_seen` are time.time() seconds."""
+        def fmt(seconds):
+            return datetime.datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S")
+        stream = None if stream_id is None else str(stream_id)
+        self._enqueue(('session', (user_id, status, stream, fmt(first_seen), fmt(last_seen), frames, peak_confidence)))
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            self._perf.count('db_events_dropped')
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"ERROR: Access log queue full, {self.dropped} event(s) dropped.")
+
+    def flush(self, timeout=5.0):
+        """Blocks until every event queued so far has been committed."""
+        if not self._writer.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Flushes outstanding events, stops the writer and closes the connection."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Background writer ---
+
+    def _writer_loop(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if not pending else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Time-based flush
+
+            if item is _STOP:
+                self._write_batch(pending)
+                return
+            if isinstance(item, threading.Event):
+                self._write_batch(pending)
+                pending = []
+                item.set()
+                continue
+            if item is not None:
+                pending.append(item)
+                if deadline is None or len(pending) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (item is None or len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_batch(pending)
+                pending = []
+
+    def _write_batch(self, items):
+        if not items:
+            return
+        events = [row for kind, row in items if kind == 'access']
+        sessions = [row for kind, row in items if kind == 'session']
+        self._perf.gauge('db_queue_depth', self._queue.qsize())
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Insert the new record
-            cursor.execute(
-                """INSERT INTO access_log (timestamp, user_id, status, confidence) 
-                   VALUES (?, ?, ?, ?)""",
-                (timestamp, user_id, status, confidence)
-            )
-            conn.commit()
-            conn.close()
-            
+            with self._conn_lock, self._perf.timer('db_write'):
+                if self._conn is None:
+                    return
+                cursor = self._conn.cursor()
+                cursor.executemany(
+                    """INSERT INTO access_log (timestamp, user_id, status, confidence)
+                       VALUES (?, ?, ?, ?)""",
+                    events
+                )
+                rows = []
+                if events:
+                    # The transaction holds the write lock, so no other connection can insert
+                    # in between and AUTOINCREMENT hands out one contiguous range ending here
+                    last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    rows = [
+                        (last_id - len(events) + 1 + i, timestamp, status, user_id, confidence)
+                        for i, (timestamp, user_id, status, confidence) in enumerate(events)
+                    ]
+                cursor.executemany(
+                    """INSERT INTO sessions (user_id, status, stream, first_seen, last_seen, frames, peak_confidence)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    sessions
+                )
+                self._conn.commit()
         except sqlite3.Error as e:
             print(f"ERROR: Failed to write to database: {e}")
+            return
+        self._perf.count('db_rows_written', len(items))
+
+        if self._listeners and rows:
+            for callback in self._listeners:
+                try:
+                    callback(rows)
+                except Exception as e:
+                    print(f"ERROR: Access log listener failed: {e}")
+
+    # --- Queries ---
 
     def get_recent_logs(self, limit=10):
-        """Fetches the N most recent logs."""
+        """Fetches the N most recent (committed) logs."""
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "SELECT timestamp, status, user_id, confidence FROM access_log ORDER BY id DESC LIMIT ?", 
-                (limit,)
-            )
-            logs = cursor.fetchall()
-            conn.close()
-            return logs
-        except sqlite3.Error as e:
+            with self._conn_lock:
+                cursor = self._conn.cursor()
+                cursor.execute(
+                    "SELECT timestamp, status, user_id, confidence FROM access_log ORDER BY id DESC LIMIT ?",
+                    (limit,)
+                )
+                return cursor.fetchall()
+        except (sqlite3.Error, AttributeError) as e:
+            print(f"ERROR: Failed to read from database: {e}")
+            return []
+
+    def get_logs(self, limit=100, before_id=None):
+        """
+        One page of logs, newest first, as (id, timestamp, status, user_id, confidence).
+        Pass the smallest id already shown as `before_id` to page further back.
+        """
+        try:
+            with self._conn_lock:
+                cursor = self._conn.cursor()
+                if before_id is None:
+                    cursor.execute(
+                        "SELECT id, timestamp, status, user_id, confidence FROM access_log ORDER BY id DESC LIMIT ?",
+                        (limit,)
+                    )
+                else:
+                    cursor.execute(
+                        """SELECT id, timestamp, status, user_id, confidence FROM access_log
+                           WHERE id < ? ORDER BY id DESC LIMIT ?""",
+                        (before_id, limit)
+                    )
+                return cursor.fetchall()
+        except (sqlite3.Error, AttributeError) as e:
+            print(f"ERROR: Failed to read from database: {e}")
+            return []
+
+    def get_recent_sessions(self, limit=10):
+        """Fetches the N most recent closed sessions."""
+        try:
+            with self._conn_lock:
+                cursor = self._conn.cursor()
+                cursor.execute(
+                    """SELECT first_seen, last_seen, user_id, status, stream, frames, peak_confidence
+                       FROM sessions ORDER BY id DESC LIMIT ?""",
+                    (limit,)
+                )
+                return cursor.fetchall()
+        except (sqlite3.Error, AttributeError) as e:
             print(f"ERROR: Failed to read from database: {e}")
-            return []
\ No newline at end of file
+            return []
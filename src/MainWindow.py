@@ -1,9 +1,10 @@
 # src/MainWindow.py
 
+import datetime
 import sys
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-    QLabel, QPushButton, QComboBox, QTextEdit, QSizePolicy
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
+    QLabel, QPushButton, QComboBox, QTextEdit, QSizePolicy, QTableView
 )
 from PySide6.QtCore import Qt, Slot
 from PySide6.QtGui import QPixmap, QImage
@@ -12,37 +13,64 @@ from PySide6.QtGui import QPixmap, QImage
 from src.CameraThread import CameraThread
 from src.RecognitionModel import RecognitionModel
 from src.LogManager import LogManager 
+from src.AccessLogModel import AccessLogModel
 from src.RegistrationDialog import RegistrationDialog
+from src.StreamScheduler import StreamScheduler
+from src.InferencePool import InferencePool
+from src.EventAggregator import EventAggregator, write_session
+from src.PerfStats import get_perf_stats
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, camera_indices=(0,), inference_workers=0):
         super().__init__()
         self.setWindowTitle("Smart Office Face Recognition System")
         self.setGeometry(100, 100, 1000, 700)
         
         # 1. Initialize the Log Manager (DB connection)
         self.log_manager = LogManager()
+        # Rows are pushed into the table model as they are written (no re-querying)
+        self.log_model = AccessLogModel(self.log_manager, parent=self)
 
         # 2. Initialize the Recognition Model (Backend)
-        self.model = RecognitionModel()
+        # Optionally offload recognition to a pool of worker processes; the local
+        # model is then only used for drawing and registration, so it isn't warmed up.
+        self.pool = None
+        if inference_workers > 0:
+            self.pool = InferencePool(n_workers=inference_workers)
+            self.pool.start()
+        self.model = RecognitionModel(warm_up=self.pool is None)
 
-        # 3. Initialize the Camera Thread (Engine)
-        self.camera_thread = CameraThread(model=self.model)
-        
-        # Connect signals
-        # NOTE: This line requires update_video_feed to be defined!
-        self.camera_thread.frame_ready.connect(self.update_video_feed) 
-        self.camera_thread.log_message.connect(self.update_live_console_log) # For internal messages/errors
-        
-        # --- NEW CONNECTION: Connect structured log event to the database handler ---
-        self.camera_thread.log_event.connect(self.handle_log_event)
-        # -------------------------------------------------------------------------
+        # 3. Initialize the Camera Threads (Engine)
+        # With several cameras, one scheduler shares the single model between them
+        # and batches their faces together instead of each door running its own inference.
+        camera_indices = list(camera_indices)
+        self.aggregator = EventAggregator() # Collapses repeated sightings into sessions
+
+        self.scheduler = StreamScheduler(self.model) if len(camera_indices) > 1 and self.pool is None else None
+        self.camera_threads = [
+            CameraThread(model=self.model, camera_index=index, scheduler=self.scheduler, pool=self.pool,
+                         aggregator=self.aggregator)
+            for index in camera_indices
+        ]
+        self.camera_thread = self.camera_threads[0] # Primary camera (used for registration)
 
         self._setup_ui()
+
+        # Connect signals
+        for camera_thread in self.camera_threads:
+            # NOTE: This line requires update_video_feed to be defined!
+            # (it routes each camera's frames to that camera's own view)
+            camera_thread.frame_ready.connect(self.update_video_feed) 
+            camera_thread.log_message.connect(self.update_live_console_log) # For internal messages/errors
+
+            # --- NEW CONNECTION: Connect structured log event to the database handler ---
+            camera_thread.log_event.connect(self.handle_log_event)
+            camera_thread.session_closed.connect(self.handle_session_closed)
+            camera_thread.stats_ready.connect(self.update_stats_panel)
+            # -------------------------------------------------------------------------
         
-        # Start the thread and populate the log display immediately
+        # Start the thread (the log model already loaded the existing logs)
         self.start_recognition() # Automatically start the camera feed
-        self.refresh_log_display() # Load any existing logs on startup
         
     def _setup_ui(self):
         # --- Central Widget & Main Layout ---
@@ -53,11 +81,23 @@ class MainWindow(QMainWindow):
         # --- Left Panel: Video Feed and Controls ---
         video_panel = QVBoxLayout()
         
-        self.video_label = QLabel("Webcam Feed will appear here...")
-        self.video_label.setAlignment(Qt.AlignCenter)
-        self.video_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.video_label.setFixedSize(640, 480) # Fixed size for the video display
-        video_panel.addWidget(self.video_label)
+        # One view per camera, tiled in a grid (a single camera keeps the full 640x480)
+        video_grid = QGridLayout()
+        columns = 1 if len(self.camera_threads) == 1 else 2
+        view_width = 640 // columns
+        self.video_labels = []
+        self._views = {} # camera thread -> its QLabel
+        for i, camera_thread in enumerate(self.camera_threads):
+            label = QLabel(f"{camera_thread.stream_name} feed will appear here...")
+            label.setAlignment(Qt.AlignCenter)
+            label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+            label.setFixedSize(view_width, view_width * 3 // 4) # Fixed size for the video display
+            video_grid.addWidget(label, i // columns, i % columns)
+            self.video_labels.append(label)
+            self._views[camera_thread] = label
+            camera_thread.set_display_size(label.width(), label.height()) # Frames arrive pre-scaled
+        self.video_label = self.video_labels[0]
+        video_panel.addLayout(video_grid)
         
         # --- Controls ---
         controls_layout = QHBoxLayout()
@@ -71,7 +111,7 @@ class MainWindow(QMainWindow):
         self.stop_button.setEnabled(True) 
 
         self.detector_combo = QComboBox()
-        self.detector_combo.addItems(["cnn", "classical"])
+        self.detector_combo.addItems(["cnn", "adaptive", "classical"])
         self.detector_combo.currentTextChanged.connect(self.change_detector)
         
         controls_layout.addWidget(self.start_button)
@@ -80,6 +120,19 @@ class MainWindow(QMainWindow):
         controls_layout.addWidget(self.detector_combo)
         
         video_panel.addLayout(controls_layout)
+
+        # --- Performance panel (per-camera rates + per-stage latencies) ---
+        self.perf = get_perf_stats()
+        self._camera_stats = {} # stream name -> last stats dict
+        self.stats_label = QLabel("Performance stats will appear here...")
+        self.stats_label.setStyleSheet("font-family: monospace; font-size: 9pt;")
+        self.stats_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        video_panel.addWidget(self.stats_label)
+
+        self.profile_button = QPushButton("Profile 100 Frames")
+        self.profile_button.clicked.connect(self.start_profile)
+        video_panel.addWidget(self.profile_button)
+
         main_layout.addLayout(video_panel)
 
         # --- Right Panel: Log/Registration ---
@@ -88,10 +141,19 @@ class MainWindow(QMainWindow):
         log_label = QLabel("--- Access Log (DB) ---")
         right_panel.addWidget(log_label)
         
-        # Log Text Area (Now displays DB contents)
+        # Access log table (newest first; older rows are paged in on scroll)
+        self.log_view = QTableView()
+        self.log_view.setModel(self.log_model)
+        self.log_view.verticalHeader().setVisible(False)
+        self.log_view.horizontalHeader().setStretchLastSection(True) # No ResizeToContents: it scans every row
+        self.log_view.setSelectionBehavior(QTableView.SelectRows)
+        right_panel.addWidget(self.log_view)
+
+        # Console for system messages and recognition events
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
         self.log_text.setFontPointSize(9) # Smaller font for more entries
+        self.log_text.document().setMaximumBlockCount(500) # Bounded, oldest lines drop off
         right_panel.addWidget(self.log_text)
         
         # Placeholder for registration functionality 
@@ -105,11 +167,34 @@ class MainWindow(QMainWindow):
 
     @Slot(QImage)
     def update_video_feed(self, image): # <--- DEFINITION RESTORED (FIX #1)
-        """Receives QImage from the thread and displays it in the QLabel."""
-        pixmap = QPixmap.fromImage(image)
-        self.video_label.setPixmap(
-            pixmap.scaled(self.video_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        )
+        """
+        Receives a QImage (already scaled to the view) from a camera thread and
+        displays it in that camera's QLabel. fromImage copies the pixels, so the
+        thread's buffer is handed back right away.
+        """
+        camera_thread = self.sender()
+        label = self._views.get(camera_thread, self.video_label)
+        label.setPixmap(QPixmap.fromImage(image))
+        if camera_thread in self._views:
+            camera_thread.release_frame()
+
+    @Slot(dict)
+    def update_stats_panel(self, stats):
+        """Shows each camera's rates and drops plus the shared stage latencies."""
+        self._camera_stats[self.sender().stream_name] = stats
+        lines = [
+            f"{name}: capture {s['capture_fps']:.1f} | display {s['display_fps']:.1f} | "
+            f"inference {s['inference_fps']:.1f} fps | drops {s['inference_drops']}/{s['frames_captured']}"
+            for name, s in sorted(self._camera_stats.items())
+        ]
+        lines.append(self.perf.format_summary())
+        self.stats_label.setText("\n".join(lines))
+
+    def start_profile(self):
+        """Captures a cProfile of the next 100 analyzed frames (printed and saved under data/)."""
+        path = f"data/profile_{datetime.datetime.now():%Y%m%d_%H%M%S}.prof"
+        self.perf.request_profile(frames=100, path=path)
+        self.update_live_console_log(f"INFO: Profiling the next 100 frames into {path}.")
 
     @Slot(str)
     def update_live_console_log(self, message):
@@ -120,50 +205,43 @@ class MainWindow(QMainWindow):
     @Slot(str, str, float)
     def handle_log_event(self, user_id, status, confidence):
         """
-        Receives structured event from the thread and logs it to the DB.
-        This runs every time a face is detected/recognized.
+        Receives structured event from the thread and queues it for the DB.
+        The log table picks the row up once the writer has committed it.
         """
-        # 1. Write the event to SQLite
         self.log_manager.log_access_event(user_id, status, confidence)
-        
-        # 2. Refresh the visible log display (calls DB again)
-        self.refresh_log_display()
-        
-    def refresh_log_display(self):
-        """Fetches the 20 most recent logs from DB and updates the QTextEdit."""
-        recent_logs = self.log_manager.get_recent_logs(limit=20)
-        self.log_text.clear()
-        
-        # Display logs in reverse order (newest at the bottom of the log)
-        for ts, status, user_id, confidence in recent_logs:
-            # Format display string
-            display_user = user_id if user_id and user_id != 'Unknown' else "N/A"
-            display_conf = f"{confidence:.2f}" if confidence is not None else "0.00"
-            color = "green" if status == "Granted" else "red"
-            
-            line = f"<span style='color:{color};'>{ts} - **{status.upper()}**: {display_user} (Conf: {display_conf})</span>"
-            self.log_text.append(line)
-            
+
+    @Slot(dict)
+    def handle_session_closed(self, session):
+        """Stores a finished presence session (first/last seen, frames, peak confidence)."""
+        write_session(self.log_manager, session)
+
     def start_recognition(self):
-        """Starts the camera thread."""
+        """Starts the camera threads (and the shared scheduler, if any)."""
         if not self.camera_thread.isRunning():
-            self.camera_thread.start()
+            if self.scheduler is not None:
+                self.scheduler.start()
+            for camera_thread in self.camera_threads:
+                camera_thread.start()
             self.start_button.setEnabled(False)
             self.stop_button.setEnabled(True)
             self.update_live_console_log("INFO: Recognition started.")
 
     def stop_recognition(self):
-        """Stops the camera thread."""
+        """Stops the camera threads (and the shared scheduler, if any)."""
         if self.camera_thread.isRunning():
-            self.camera_thread.stop()
+            for camera_thread in self.camera_threads:
+                camera_thread.stop()
+            if self.scheduler is not None:
+                self.scheduler.stop()
             self.start_button.setEnabled(True)
             self.stop_button.setEnabled(False)
             self.update_live_console_log("INFO: Recognition stopped.")
 
     @Slot(str)
     def change_detector(self, text):
-        """Passes the new detector mode to the camera thread."""
-        self.camera_thread.set_detector_mode(text)
+        """Passes the new detector mode to the camera threads."""
+        for camera_thread in self.camera_threads:
+            camera_thread.set_detector_mode(text)
         self.update_live_console_log(f"INFO: Detector mode switched to '{text}'.")
 
     def _open_registration_dialog(self): # <--- DEFINITION ADDED (FIX #2)
@@ -177,8 +255,10 @@ class MainWindow(QMainWindow):
             
         dialog = RegistrationDialog(self.camera_thread, self.model, parent=self)
         
-        # Reload embeddings after new registration so the recognition model instantly knows the new user
-        dialog.registration_complete.connect(self.model._load_data) 
+        # Apply the new registration as a delta so the recognition model instantly knows the new user
+        dialog.registration_complete.connect(self.model.sync_gallery)
+        if self.pool is not None:
+            dialog.registration_complete.connect(self.pool.reload_gallery)
 
         dialog.exec() # Run the dialog modal
         
@@ -188,6 +268,14 @@ class MainWindow(QMainWindow):
             self.start_button.setEnabled(False) 
             self.stop_button.setEnabled(True)
 
+    def closeEvent(self, event):
+        """Stops the cameras and inference workers, then flushes the access log."""
+        self.stop_recognition()
+        if self.pool is not None:
+            self.pool.stop()
+        self.log_manager.close()
+        super().closeEvent(event)
+
 # --- Main Entry Point ---
 
 def run_gui():
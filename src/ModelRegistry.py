@@ -0,0 +1,106 @@
+# src/ModelRegistry.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class ModelRegistry:
+    """
+    Builds the heavy detection and embedding models once per process and warms
+    them up on a dummy frame, so the first real frame doesn't pay for it.
+
+    DeepFace (and therefore TensorFlow) is only imported here, inside the
+    warm-up, which can run on a background thread. The embedder is whichever
+    backend src.Embedder is configured with. Every cold-start stage is timed
+    and kept in `timings` (seconds).
+    """
+
+    def __init__(self, detector_backends=('mtcnn',)):
+        self.detector_backends = list(detector_backends)
+        self.timings = {}
+        self.error = None
+        self._ready = threading.Event()
+        self._build_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block and records it under `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def warm_up(self, background=True):
+        """Builds and warms all models, on a daemon thread if `background`."""
+        if self._ready.is_set():
+            return
+        if not background:
+            self._build_and_warm()
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._build_and_warm, name="model-warmup", daemon=True)
+                self._thread.start()
+
+    def wait_until_ready(self, timeout=None):
+        """Blocks until the models are warm, building them here if nobody started it."""
+        if not self._ready.is_set() and self._thread is None:
+            self._build_and_warm()
+        return self._ready.wait(timeout)
+
+    def format_timings(self):
+        total = sum(self.timings.values())
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
+        return f"{stages} (total {total:.2f}s)"
+
+    def _build_and_warm(self):
+        with self._build_lock:
+            if self._ready.is_set():
+                return
+            try:
+                with self.stage("import_deepface"):
+                    from deepface import DeepFace
+                from src.embed import get_embeddings
+                from src.Embedder import get_embedder
+
+                for backend in self.detector_backends:
+                    with self.stage(f"build_detector:{backend}"):
+                        DeepFace.build_model(backend, task="face_detector")
+                embedder = get_embedder()
+                with self.stage(f"build_embedder:{embedder.name}"):
+                    embedder.load()
+
+                # Run each model once so graph tracing / allocation happens now
+                dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+                for backend in self.detector_backends:
+                    with self.stage(f"warmup_detect:{backend}"):
+                        DeepFace.extract_faces(dummy_frame, detector_backend=backend, enforce_detection=False)
+                with self.stage("warmup_embed"):
+                    get_embeddings([np.zeros((160, 160, 3), dtype=np.uint8)])
+            except Exception as e:
+                self.error = e
+                print(f"ERROR: Model warm-up failed: {e}")
+            finally:
+                self._ready.set()
+        print(f"INFO: Cold start timings: {self.format_timings()}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_model_registry():
+    """Returns the process-wide ModelRegistry shared by every RecognitionModel."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,124 @@
+# src/MotionGate.py
+
+import weakref
+
+import cv2
+
+from src.detect import haar_cascade
+
+
+class _GateState:
+    """Per-stream memory of the gate."""
+
+    def __init__(self):
+        self.previous = None          # Last small grayscale frame ('diff')
+        self.subtractor = None        # Background model ('mog2')
+        self.faces_present = False    # The last detector pass found faces
+        self.skipped_in_row = 0
+
+
+class MotionGate:
+    """
+    Cheap pre-filter deciding whether the expensive detector runs on a frame.
+
+    1. Motion: the frame is shrunk to `width` pixels wide grayscale and compared
+       with the previous one ('diff': absolute frame difference) or with a
+       background model ('mog2': cv2 MOG2 subtractor). Motion = more than
+       `min_motion` of the pixels changed by more than `threshold`.
+    2. Optional Haar proposals (`haar=True`): a moving frame is only passed on
+       if the Haar cascade finds at least one candidate face in it.
+
+    The detector always runs while the stream's last pass found faces (a person
+    standing still produces no motion), and at least every `max_skip` frames
+    so a missed proposal can't hide someone for long. State is kept per
+    stream, keyed by the caller's tracker object.
+    """
+
+    METHODS = ('diff', 'mog2')
+
+    def __init__(self, method='diff', width=160, threshold=25, min_motion=0.002, haar=False,
+                 haar_width=640, max_skip=30):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown motion method '{method}'. Choose from: {', '.join(self.METHODS)}")
+        self.method = method
+        self.width = width
+        self.threshold = threshold
+        self.min_motion = min_motion
+        self.haar = haar
+        self.haar_width = haar_width
+        self.max_skip = max_skip
+
+        self._states = weakref.WeakKeyDictionary()
+        self._default_state = _GateState()
+        # Decisions by reason: passed (faces/forced/motion/haar) and skipped (static/no_candidate)
+        self.counts = {'frames': 0, 'faces': 0, 'forced': 0, 'motion': 0, 'haar': 0,
+                       'static': 0, 'no_candidate': 0}
+
+    def _state(self, key):
+        if key is None:
+            return self._default_state
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _GateState()
+        return state
+
+    def check(self, frame, key=None):
+        """True if the detector should run on this BGR frame of the stream `key`."""
+        state = self._state(key)
+        self.counts['frames'] += 1
+
+        # The motion model is updated on every frame, whatever the decision
+        moving = self._motion(frame, state)
+
+        if state.faces_present:
+            reason = 'faces'
+        elif state.skipped_in_row >= self.max_skip:
+            reason = 'forced'
+        elif not moving:
+            reason = 'static'
+        elif self.haar:
+            reason = 'haar' if self._haar_candidates(frame) else 'no_candidate'
+        else:
+            reason = 'motion'
+
+        self.counts[reason] += 1
+        passed = reason not in ('static', 'no_candidate')
+        state.skipped_in_row = 0 if passed else state.skipped_in_row + 1
+        return passed
+
+    def update(self, key=None, faces=0):
+        """Reports how many faces the detector found on the last passed frame."""
+        self._state(key).faces_present = faces > 0
+
+    def _motion(self, frame, state):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(int(h * self.width / w), 1)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.method == 'mog2':
+            if state.subtractor is None:
+                state.subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=self.threshold,
+                                                                      detectShadows=False)
+            mask = state.subtractor.apply(gray)
+        else:
+            if state.previous is None or state.previous.shape != gray.shape:
+                state.previous = gray
+                return True  # Nothing to compare with yet
+            mask = cv2.absdiff(gray, state.previous) > self.threshold
+            state.previous = gray
+        return cv2.countNonZero(mask.astype('uint8')) >= self.min_motion * mask.size
+
+    def _haar_candidates(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(self.haar_width / w, 1.0)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        # Loose settings: proposals only need a high recall, MTCNN does the real work
+        candidates = haar_cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=3, minSize=(20, 20))
+        return len(candidates) > 0
+
+    def stats(self):
+        """Decision counters and the fraction of frames the detector was skipped on."""
+        skipped = self.counts['static'] + self.counts['no_candidate']
+        return dict(self.counts, skipped=skipped, skip_ratio=skipped / max(self.counts['frames'], 1))
@@ -0,0 +1,266 @@
+# src/PerfStats.py
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+METRIC_PREFIX = "smart_office"
+
+
+class RollingHistogram:
+    """Last `window` samples (for percentiles) plus all-time count and sum."""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        values = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples))
+        if not len(values):
+            p50 = p95 = p99 = mean = 0.0
+        else:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            mean = values.mean()
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean_ms': float(mean) * 1000.0,
+            'p50_ms': float(p50) * 1000.0,
+            'p95_ms': float(p95) * 1000.0,
+            'p99_ms': float(p99) * 1000.0,
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer:
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class PerfStats:
+    """
+    Process-wide performance counters for the recognition path.
+
+    - `timer(name)`: context manager recording a monotonic duration into a
+      rolling histogram (seconds);
+    - `count(name, n)`: monotonically increasing counter;
+    - `gauge(name, value)`: last value of a level (queue depth, FPS...).
+
+    Counter and gauge names may carry Prometheus labels, e.g.
+    'capture_fps{stream="Camera 0"}'.
+
+    `snapshot()` returns everything as a dict, `prometheus_text()` in the
+    Prometheus text exposition format. With `enabled = False` every call
+    returns right away (timers are a shared no-op context).
+
+    `request_profile(frames)` arms a cProfile capture that starts at the next
+    `frame_begin()` on the thread processing frames and stops after `frames`
+    frames; the top functions are printed and the raw stats saved if a path
+    was given.
+    """
+
+    def __init__(self, window=1000, enabled=True):
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+        self._gauges = {}
+
+        self._profile_request = None   # (frames, path) waiting for the next frame
+        self._profiler = None
+        self._profile_thread = None
+        self._profile_frames_left = 0
+        self._profile_path = None
+        self.last_profile = None       # Text report of the last capture
+
+    # --- Recording ---
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._timers.get(name)
+            if histogram is None:
+                histogram = self._timers[name] = RollingHistogram(self.window)
+            histogram.add(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    # --- Reporting ---
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timers': {name: histogram.summary() for name, histogram in self._timers.items()},
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'profiling': self._profiler is not None or self._profile_request is not None,
+            }
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Duration of pipeline stages (rolling quantiles).",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+        ]
+        for name, summary in sorted(snapshot['timers'].items()):
+            for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+                lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{name}",quantile="{quantile}"}} '
+                             f'{summary[key] / 1000.0:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{name}"}} {summary["sum"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{name}"}} {summary["count"]}')
+        # Names may carry labels, e.g. 'capture_fps{stream="Camera 0"}'; one TYPE line per metric
+        typed = set()
+        for kind, suffix, values in (('counter', '_total', snapshot['counters']), ('gauge', '', snapshot['gauges'])):
+            for name, value in sorted(values.items()):
+                value = value if kind == 'counter' else f"{float(value):.6f}"
+                base, _, labels = name.partition('{')
+                metric = f"{METRIC_PREFIX}_{base}{suffix}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric}{'{' + labels if labels else ''} {value}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        """Compact multi-line text for an on-screen panel."""
+        snapshot = self.snapshot()
+        lines = [
+            f"{name:<10} p50 {s['p50_ms']:6.1f}  p95 {s['p95_ms']:6.1f} ms"
+            for name, s in sorted(snapshot['timers'].items())
+        ]
+        lines += [f"{name}: {value}" for name, value in sorted(snapshot['counters'].items())]
+        lines += [f"{name}: {value:.1f}" for name, value in sorted(snapshot['gauges'].items())]
+        return "\n".join(lines)
+
+    # --- Profiling ---
+
+    def request_profile(self, frames=100, path=None):
+        """Profiles the next `frames` frames of the frame-processing thread."""
+        with self._lock:
+            if self._profiler is None:
+                self._profile_request = (frames, path)
+
+    def frame_begin(self):
+        if self._profile_request is None:
+            return  # The common case: one attribute check
+        with self._lock:
+            if self._profile_request is None or self._profiler is not None:
+                return
+            frames, path = self._profile_request
+            self._profile_request = None
+            self._profiler = cProfile.Profile()
+            self._profile_thread = threading.get_ident()
+            self._profile_frames_left = frames
+            self._profile_path = path
+        print(f"INFO: Profiling the next {frames} frames...")
+        self._profiler.enable()
+
+    def frame_end(self):
+        if self._profiler is None or self._profile_thread != threading.get_ident():
+            return
+        self._profile_frames_left -= 1
+        if self._profile_frames_left > 0:
+            return
+        profiler = self._profiler
+        profiler.disable()
+        with self._lock:
+            self._profiler = None
+            self._profile_thread = None
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(20)
+        self.last_profile = output.getvalue()
+        print(self.last_profile)
+        if self._profile_path:
+            profiler.dump_stats(self._profile_path)
+            print(f"INFO: Profile saved to {self._profile_path}")
+
+
+_perf_stats = None
+_perf_stats_lock = threading.Lock()
+
+def get_perf_stats():
+    """Returns the process-wide PerfStats every component records into."""
+    global _perf_stats
+    with _perf_stats_lock:
+        if _perf_stats is None:
+            _perf_stats = PerfStats()
+        return _perf_stats
+
+
+# --- Prometheus endpoint for headless deployments ---
+
+def start_metrics_server(port=9100, host="0.0.0.0", stats=None):
+    """Serves `GET /metrics` (Prometheus text format) on a daemon thread. Returns the server."""
+    stats = stats or get_perf_stats()
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = stats.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"INFO: Prometheus metrics on http://{host}:{port}/metrics")
+    return server
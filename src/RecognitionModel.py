@@ -1,15 +1,25 @@
 # src/RecognitionModel.py
 
 import os
-import pickle
+import threading
+
 import cv2
 import numpy as np
-from deepface import DeepFace 
 
 # Import your existing core logic functions
-from src.detect import detect_face
-from src.embed import get_embedding as extract_embedding
-from src.utils import load_embeddings as load_known_embeddings, save_embeddings as save_known_embeddings
+from src.embed import get_embeddings as extract_embeddings
+from src.GalleryIndex import GalleryIndex
+from src.GalleryStore import DEFAULT_GALLERY_PATH, INDEX_FILE, open_gallery
+from src.ModelRegistry import get_model_registry
+from src.FaceTracker import FaceTracker
+from src.AdaptiveDetector import AdaptiveDetector
+from src.MotionGate import MotionGate
+from src.EmbeddingCache import EmbeddingCache
+from src.PerfStats import get_perf_stats
+
+# Internal detector mode name -> DeepFace backend name
+# ('adaptive' = MTCNN on a downscaled frame plus ROI re-detection, see AdaptiveDetector)
+DETECTOR_BACKENDS = {'cnn': 'mtcnn', 'classical': 'opencv', 'adaptive': 'mtcnn'}
 
 class RecognitionModel:
     """
@@ -17,125 +27,427 @@ class RecognitionModel:
     Handles persistent data and model loading.
     """
     
-    def __init__(self, embedding_path='data/embeddings.pkl'):
-        self.embedding_path = embedding_path
-        self.known_embeddings, self.known_names = self._load_data()
+    def __init__(self, gallery_path=DEFAULT_GALLERY_PATH, warm_up=True, index_type='flat', index_params=None,
+                 detection_params=None, motion_gate=True, template_aggregate='max',
+                 embedding_cache=True, watch_gallery=True):
+        self.gallery_path = gallery_path
+        # Detector/embedder are built and warmed once per process, off the caller's thread
+        self.models = get_model_registry()
+        self.perf = get_perf_stats()  # Per-stage timers and counters (process-wide)
+        if warm_up:
+            self.models.warm_up(background=True)
         self.recognize_threshold = 0.5  # Cosine similarity threshold
+        self.store = None
+        # 'flat' = exact scan; 'ivf' = approximate search for very large galleries.
+        # Identities may hold several templates, scored by their 'max' or 'mean'
+        self.gallery = GalleryIndex(index_type=index_type, aggregate=template_aggregate, **(index_params or {}))
+        # Recognition runs per face track, not per frame (set to None to disable)
+        self.tracker = FaceTracker()
+        # Used by the 'adaptive' detector mode (scale, full_scan_interval, roi_padding, ...)
+        self.adaptive_detector = AdaptiveDetector(
+            lambda image: self._run_detector(image, DETECTOR_BACKENDS['adaptive']),
+            **(detection_params or {})
+        )
+        # Skips detection (and embedding) on static scenes: True = defaults,
+        # a dict = MotionGate parameters, False/None = detect on every frame
+        if motion_gate:
+            self.motion_gate = MotionGate(**(motion_gate if isinstance(motion_gate, dict) else {}))
+        else:
+            self.motion_gate = None
+        # Reuses a track's embedding while its crop barely changes: True =
+        # defaults, a dict = EmbeddingCache parameters, False/None = always embed
+        if embedding_cache:
+            self.embedding_cache = EmbeddingCache(**(embedding_cache if isinstance(embedding_cache, dict) else {}))
+        else:
+            self.embedding_cache = None
+        # Gallery changes are applied under this lock, never in the middle of a match
+        self._gallery_lock = threading.RLock()
+        self._gallery_changed = threading.Event()
+        self._watch_stop = None
+        self.reload_gallery()
+        if watch_gallery:
+            self.watch_gallery()
 
     def _load_data(self):
-        """Loads known embeddings and names from the pickle file."""
-        if not os.path.exists(self.embedding_path):
-            print("INFO: Embeddings file not found. Starting with empty database.")
-            return [], []
-        
-        known_embeddings, known_names = load_known_embeddings(self.embedding_path)
-        return known_embeddings, known_names
+        """Opens the on-disk gallery store (migrating the legacy pickle on first run)."""
+        store = open_gallery(self.gallery_path)
+        if len(store) == 0:
+            print("INFO: Gallery is empty. Starting with empty database.")
+        return store
+
+    def reload_gallery(self):
+        """Re-opens the gallery store and rebuilds the index (slow for big galleries; see sync_gallery)."""
+        with self._gallery_lock:
+            self.store = self._load_data()
+            self.gallery.load_store(self.store)
+        if self.tracker is not None:
+            self.tracker.reset()  # Re-recognize everyone against the new gallery
+
+    # --- Incremental gallery updates ---
+
+    def sync_gallery(self):
+        """
+        Applies gallery changes committed since the last load (by this or any
+        other process, e.g. the CLI enroller) as a delta: only the new index
+        records are read and only the new rows indexed. Returns True if the
+        gallery changed. Faces already tracked pick the change up at their
+        next re-confirmation.
+        """
+        with self._gallery_lock:
+            self._gallery_changed.clear()
+            self.store.refresh()
+            return self.gallery.sync_store(self.store)
+
+    def add_identity(self, user_id, name, embeddings, replace=True):
+        """
+        Stores one or more templates (N, 128) for `user_id` and makes them
+        matchable right away. With `replace`, they supersede the id's existing
+        templates (an update); otherwise they are added alongside them.
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        with self._gallery_lock:
+            self.store.append([user_id] * len(embeddings), [name] * len(embeddings), embeddings, replace=replace)
+            self.gallery.sync_store(self.store)
+
+    def update_identity(self, user_id, name, embeddings):
+        """Replaces the templates of `user_id`."""
+        self.add_identity(user_id, name, embeddings, replace=True)
+
+    def remove_identity(self, user_id):
+        """Deletes `user_id` from the gallery and the live index. Returns False if it was unknown."""
+        with self._gallery_lock:
+            removed = self.store.delete(user_id)
+            self.gallery.sync_store(self.store)
+        return removed
+
+    def watch_gallery(self, interval=1.0):
+        """
+        Polls the gallery's index log every `interval` seconds on a daemon
+        thread. A change is only flagged there; the delta is applied by the
+        next `analyze_frames` call, between two frames.
+        """
+        if self._watch_stop is not None:
+            return
+        self._watch_stop = threading.Event()
+        path = os.path.join(self.gallery_path, INDEX_FILE)
+
+        def signature():
+            try:
+                st = os.stat(path)
+                return st.st_ino, st.st_size, st.st_mtime_ns
+            except FileNotFoundError:
+                return None
+
+        def poll(stop):
+            last = signature()
+            while not stop.wait(interval):
+                current = signature()
+                if current != last:
+                    last = current
+                    self._gallery_changed.set()
+
+        threading.Thread(target=poll, args=(self._watch_stop,), name="gallery-watch", daemon=True).start()
+
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+    def is_ready(self):
+        """True once the detector and embedder have been built and warmed up."""
+        return self.models.is_ready()
+
+
+    # --- Pipeline stages (also used directly by batching/streaming callers) ---
 
+    def detect_faces(self, frame, detector_mode='cnn', tracker=None):
+        """
+        Runs the face detector on a BGR frame and returns a list of (x, y, w, h)
+        boxes. Raises if the detector itself fails. In 'adaptive' mode `tracker`
+        identifies the stream whose previous faces seed the ROI search.
+        """
+        if detector_mode == 'adaptive':
+            return self.adaptive_detector.detect(frame, key=tracker)
+
+        # Map the internal detector mode name to the DeepFace backend name
+        return self._run_detector(frame, DETECTOR_BACKENDS.get(detector_mode, 'mtcnn'))
+
+    def _run_detector(self, frame, backend_name):
+        """One DeepFace detector pass over a BGR image; boxes in that image's coordinates."""
+        from deepface import DeepFace
+
+        # Convert to RGB for DeepFace's raw API calls
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        detected_results = DeepFace.extract_faces(
+            frame_rgb, 
+            detector_backend=backend_name, 
+            enforce_detection=False
+        )
+
+        boxes = []
+        for item in detected_results:
+            # With enforce_detection=False, "no face" comes back as the whole
+            # frame with zero confidence; that is not a face
+            if item.get("confidence", 1) == 0:
+                continue
+            region = item["facial_area"]
+            boxes.append((region['x'], region['y'], region['w'], region['h']))
+        return boxes
+
+    def crop_faces(self, frame, boxes):
+        """Cuts each box out of the BGR frame as a 160x160 RGB crop for the embedder."""
+        frame_h, frame_w = frame.shape[:2]
+        face_crops = []
+        for x, y, w, h in boxes:
+            x0, y0 = max(int(x), 0), max(int(y), 0)
+            x1, y1 = min(int(x + w), frame_w), min(int(y + h), frame_h)
+            face_img = frame[y0:y1, x0:x1]
+            if face_img.size == 0:
+                face_img = np.zeros((160, 160, 3), dtype=frame.dtype)
+            face_img = cv2.resize(face_img, (160, 160))
+            face_crops.append(cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB))
+        return face_crops
+
+    def embed_faces(self, face_crops, boxes=None, tracks=None):
+        """
+        One batched embedder call for all crops. Returns (N, 128) or None on failure.
+        With `boxes` and the per-crop face `tracks`, the embedding cache is
+        keyed by track: re-confirmations of an already recognized track whose
+        crop barely changed are not sent to the embedder. New tracks (and crops
+        without a track) are always embedded.
+        """
+        cache = self.embedding_cache
+        if cache is None or boxes is None or tracks is None:
+            try:
+                return extract_embeddings(face_crops)
+            except Exception as e:
+                print(f"Embedding failed in RecognitionModel: {e}")
+                return None
+
+        cacheable = [i for i, track in enumerate(tracks) if track is not None]
+        fingerprints = dict(zip(cacheable, cache.fingerprints([face_crops[i] for i in cacheable])))
+        cached = [None] * len(face_crops)
+        for i in cacheable:
+            if tracks[i].recognized_frame is not None:
+                cached[i] = cache.lookup([fingerprints[i]], [boxes[i]], tracks[i])[0]
+        misses = [i for i, embedding in enumerate(cached) if embedding is None]
+        self.perf.count('embed_cache_hits', len(face_crops) - len(misses))
+
+        if misses:
+            try:
+                fresh = extract_embeddings([face_crops[i] for i in misses])
+            except Exception as e:
+                print(f"Embedding failed in RecognitionModel: {e}")
+                return None
+            for i, embedding in zip(misses, fresh):
+                cached[i] = embedding
+                if tracks[i] is not None:
+                    cache.insert([fingerprints[i]], [boxes[i]], [embedding], tracks[i])
+        return np.stack(cached)
+
+    def match_embeddings(self, embeddings, count):
+        """
+        Matches all embeddings against the gallery at once. Returns `count`
+        identity dicts ({'user_id', 'status', 'confidence', 'matched'}).
+        """
+        matches = [None] * count
+        if embeddings is not None and len(embeddings):
+            with self._gallery_lock:
+                matches = self.gallery.match(embeddings, k=1)
+
+        identities = []
+        for top in matches:
+            if top:
+                best_match_id, best_distance = top[0]
+                if best_distance > self.recognize_threshold:
+                    identities.append({'user_id': best_match_id, 'status': "Granted", 'confidence': best_distance, 'matched': True})
+                else:
+                    identities.append({'user_id': "Unknown", 'status': "Denied", 'confidence': best_distance, 'matched': True})
+            else:
+                # No DB or embedding failed
+                identities.append({'user_id': "Unknown", 'status': "Denied", 'confidence': 0.0, 'matched': False})
+        return identities
+
+    def draw_results(self, frame, results, scale=1.0):
+        """
+        Draws a box and label for every face result onto the BGR frame (in place).
+        `scale` maps the result boxes onto a resized frame.
+        """
+        for result in results:
+            x, y, w, h = (int(round(v * scale)) for v in result['box'])
+            if not result['matched']:
+                color = (255, 255, 0) # Yellow
+            elif result['status'] == "Granted":
+                color = (0, 255, 0) # Green
+            else:
+                color = (0, 0, 255) # Red (BGR)
+
+            # Draw bounding box and text (using BGR frame)
+            frame = cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+            if result['user_id']:
+                cv2.putText(frame, result['user_id'], (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+        return frame
+
+    @staticmethod
+    def describe(result):
+        """Human-readable log line for one face result."""
+        if not result['matched']:
+            return "Face detected, no DB or embedding failed"
+        if result['status'] == "Granted":
+            return f"Access Granted: {result['user_id']} ({result['confidence']:.2f})"
+        return f"Access Denied (Confidence: {result['confidence']:.2f})"
+
+    @classmethod
+    def log_entries(cls, results):
+        """
+        (log_msg, log_data) for every face whose identity was just established
+        or changed; repeated sightings of a tracked face produce nothing.
+        """
+        return [
+            (cls.describe(result), {
+                'user_id': result['user_id'],
+                'status': result['status'],
+                'confidence': result['confidence']
+            })
+            for result in results if result['identity_changed']
+        ]
+
+    def analyze_frame(self, frame, detector_mode='cnn', tracker=None):
+        """
+        Detects, tracks and recognizes the faces in a frame without drawing.
+
+        Returns a list of result dicts ({'box', 'track_id', 'user_id', 'status',
+        'confidence', 'matched', 'recognized', 'identity_changed'}), or None if
+        detection failed. Only new tracks and tracks due for re-confirmation are
+        embedded; the rest reuse the identity their track carries.
+        """
+        tracker = tracker if tracker is not None else self.tracker
+        return self.analyze_frames([frame], detector_mode, [tracker])[0]
+
+    def analyze_frames(self, frames, detector_mode='cnn', trackers=None):
+        """
+        `analyze_frame` for several frames at once (e.g. one per camera): each
+        frame is detected and tracked with its own tracker, then the faces that
+        need recognition from ALL frames are embedded in one batch and matched
+        in one call. Returns one result list (or None) per frame.
+        """
+        if trackers is None:
+            trackers = [None] * len(frames)
+
+        # Blocks only if the background warm-up is still running
+        self.models.wait_until_ready()
+        if self._gallery_changed.is_set():
+            self.sync_gallery()  # Swap in external gallery changes between frames
+
+        perf = self.perf
+        perf.frame_begin()
+        try:
+            with perf.timer('analyze'):
+                all_results = self._analyze_frames(frames, detector_mode, trackers)
+        finally:
+            perf.frame_end()
+        perf.count('frames_analyzed', len(frames))
+        return all_results
+
+    def _analyze_frames(self, frames, detector_mode, trackers):
+        perf = self.perf
+        per_frame = []
+        face_crops, crop_boxes, crop_tracks = [], [], []
+        for frame, tracker in zip(frames, trackers):
+            try:
+                # 1. Detect faces and get bounding boxes (unless nothing moves in an empty scene)
+                if self.motion_gate is not None:
+                    with perf.timer('gate'):
+                        passed = self.motion_gate.check(frame, key=tracker)
+                if self.motion_gate is None or passed:
+                    with perf.timer('detect'):
+                        boxes = self.detect_faces(frame, detector_mode, tracker=tracker)
+                    if self.motion_gate is not None:
+                        self.motion_gate.update(key=tracker, faces=len(boxes))
+                else:
+                    boxes = []
+                    perf.count('frames_gated')
+            except Exception as e:
+                # Handle case where DeepFace/CV fails entirely
+                print(f"DeepFace/CV detection failed in RecognitionModel: {e}")
+                perf.count('detect_failures')
+                per_frame.append(None)
+                continue
+
+            # 2. Associate detections with tracks
+            tracks = tracker.update(boxes) if tracker is not None else [None] * len(boxes)
+            pending = [i for i, track in enumerate(tracks) if track is None or tracker.needs_recognition(track)]
+            with perf.timer('crop'):
+                face_crops.extend(self.crop_faces(frame, [boxes[i] for i in pending]))
+            crop_boxes.extend(boxes[i] for i in pending)
+            crop_tracks.extend(tracks[i] for i in pending)
+            per_frame.append((boxes, tracks, pending, tracker))
+            perf.count('faces_seen', len(boxes))
+
+        # 3. Embed + match only the faces that need it, across all frames (one batch each)
+        identities = []
+        if face_crops:
+            with perf.timer('embed'):
+                embeddings = self.embed_faces(face_crops, crop_boxes, crop_tracks)
+            with perf.timer('match'):
+                identities = self.match_embeddings(embeddings, len(face_crops))
+            perf.count('faces_embedded', len(face_crops))
+
+        all_results = []
+        cursor = 0
+        for entry in per_frame:
+            if entry is None:
+                all_results.append(None)
+                continue
+            boxes, tracks, pending, tracker = entry
+            fresh = dict(zip(pending, identities[cursor:cursor + len(pending)]))
+            cursor += len(pending)
+
+            results = []
+            for i, (box, track) in enumerate(zip(boxes, tracks)):
+                identity_changed = False
+                if i in fresh:
+                    identity = fresh[i]
+                    identity_changed = track.set_identity(identity, tracker.frame_index) if track is not None else True
+                else:
+                    identity = track.identity()
+                results.append(dict(
+                    identity,
+                    box=box,
+                    track_id=track.track_id if track is not None else None,
+                    recognized=i in fresh,
+                    identity_changed=identity_changed,
+                ))
+            all_results.append(results)
+        return all_results
 
     def process_frame(self, frame: np.ndarray, detector_mode='cnn'):
         """
         Detects faces in a frame, extracts embeddings, and performs recognition.
 
         Returns: (processed_frame, log_msg, recognized_user, log_data)
+
+        `log_data` is only set when a track's identity is first established or
+        changes, so one person standing at the door produces one event, not one
+        per frame.
         """
-        detected_results = []
-        
         # Initialize log variables
         recognized_user = None
         log_message = "No face detected"
         log_data = None # Will store {'user_id': ..., 'status': ..., 'confidence': ...}
-        
-        try:
-            # --- Map the internal detector mode name to the DeepFace backend name ---
-            if detector_mode == 'cnn':
-                backend_name = 'mtcnn'
-            elif detector_mode == 'classical':
-                backend_name = 'opencv'
-            else:
-                backend_name = 'mtcnn'
-            # --------------------------------------------------------------------------
-            
-            # Convert to RGB for DeepFace's raw API calls
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # 1. Detect faces and get bounding boxes
-            detected_results = DeepFace.extract_faces(
-                frame_rgb, 
-                detector_backend=backend_name, 
-                enforce_detection=False
-            )
-            
-        except Exception as e:
-            # Handle case where DeepFace/CV fails entirely
+
+        results = self.analyze_frame(frame, detector_mode)
+        if results is None:
             # log_data is None in this error case
-            print(f"DeepFace/CV detection failed in RecognitionModel: {e}")
             return frame, "ERROR: Detection failed", None, None
-        
-        
-        # Now iterate over the structured results
-        for item in detected_results:
-            region = item["facial_area"]
-            
-            # Extract coordinates (x, y, w, h)
-            x, y, w, h = region['x'], region['y'], region['w'], region['h']
-            
-            # Crop the face image (use the original BGR frame)
-            face_img = frame[y:y+h, x:x+w] 
-            face_img = cv2.resize(face_img, (160, 160)) 
-            
-            # Convert to RGB for the embedding step
-            face_img_rgb = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            
-            # 2. Extract embedding
-            embedding = extract_embedding(face_img_rgb) 
-
-            best_distance = 0.0 # Default confidence
-            current_user_id = "Unknown"
-            current_status = "Denied"
-            color = (0, 0, 255) # Default Red (BGR)
-
-            if embedding is not None and self.known_embeddings:
-                # 3. Recognition (using Cosine Similarity)
-                distances = np.dot(self.known_embeddings, embedding) / (
-                            np.linalg.norm(self.known_embeddings, axis=1) * np.linalg.norm(embedding)
-                        )
-                best_match_index = np.argmax(distances)
-                best_distance = float(distances[best_match_index])
-
-                if best_distance > self.recognize_threshold:
-                    current_user_id = self.known_names[best_match_index]
-                    current_status = "Granted"
-                    log_message = f"Access Granted: {current_user_id} ({best_distance:.2f})"
-                    color = (0, 255, 0) # Green
-                else:
-                    current_user_id = "Unknown"
-                    current_status = "Denied"
-                    log_message = f"Access Denied (Confidence: {best_distance:.2f})"
-                    # Color is already Red
-            else:
-                log_message = "Face detected, no DB or embedding failed"
-                color = (255, 255, 0) # Yellow
-            
-            # Assign final recognized user name (the last one detected/recognized in the frame)
-            recognized_user = current_user_id
-            
-            # --- NEW: Package the structured data for logging ---
-            # This is created for EVERY face detected in the frame.
-            log_data = {
-                'user_id': current_user_id,
-                'status': current_status,
-                'confidence': best_distance
-            }
-            # ----------------------------------------------------
 
+        if results:
+            # Report the last face detected/recognized in the frame
+            recognized_user = results[-1]['user_id']
+            log_message = self.describe(results[-1])
+        entries = self.log_entries(results)
+        if entries:
+            log_message, log_data = entries[-1]
 
-            # Draw bounding box and text (using BGR frame)
-            frame = cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-            if recognized_user:
-                cv2.putText(frame, recognized_user, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-        
-        # If no faces were detected, log_message and log_data remain their initialized values
-        
-        # --- MODIFICATION: RETURN 4 VALUES ---
+        frame = self.draw_results(frame, results)
         return frame, log_message, recognized_user, log_data
-        # -------------------------------------
\ No newline at end of file
@@ -167,7 +167,7 @@ class RegistrationDialog(QDialog):
             self.stop_button.setEnabled(False) # Prevent user from stopping a stopped thread
             
         dialog = RegistrationDialog(self.camera_thread, self.model, parent=self)
-        dialog.registration_complete.connect(self.model._load_data) # Reload embeddings after new registration
+        dialog.registration_complete.connect(self.model.sync_gallery) # Pick up the new registration incrementally
 
         dialog.exec() # Run the dialog
         
@@ -0,0 +1,343 @@
+# src/SearchIndex.py
+
+import os
+import zlib
+
+import numpy as np
+
+
+def top_k(scores, k):
+    """Column indices of the `k` highest scores in each row of `scores`, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k == scores.shape[1]:
+        return np.argsort(-scores, axis=1)
+    # Partial selection first, then order only the k survivors
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _exact_search(matrix, queries, k, dead=None):
+    scores = queries @ matrix.T
+    if dead is not None:
+        scores[:, dead] = -np.inf
+    top = top_k(scores, k)
+    return top, np.take_along_axis(scores, top, axis=1)
+
+
+def quantize(rows, precision):
+    """
+    Row-wise quantization of unit vectors: 'float16' -> (float16 rows, None);
+    'int8' -> (int8 codes, float32 per-row scales) with row ~= codes * scale.
+    """
+    rows = np.asarray(rows, dtype=np.float32)
+    if precision == 'float16':
+        return rows.astype(np.float16), None
+    scales = np.abs(rows).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(rows / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class FlatIndex:
+    """
+    Exact search: scores every gallery row with one matrix multiply.
+
+    With `precision='float16'` or `'int8'` the scan runs over a quantized
+    copy of the gallery held in RAM (2x / ~4x smaller than float32), while
+    the float32 rows stay where they are (usually the store's memmap, so they
+    are only paged in when touched). int8 uses a per-row scale and quantizes
+    the queries the same way; the code dot products are integers below 2^24,
+    so they are computed exactly on the float32 BLAS path, `chunk_rows` rows
+    at a time to bound the temporary upcast. `rerank=N` re-scores the best N
+    candidate rows per query against the float32 rows, so the returned
+    scores (and order) are exact for those candidates.
+    """
+
+    name = "flat"
+    PRECISIONS = ('float32', 'float16', 'int8')
+
+    def __init__(self, precision='float32', rerank=0, chunk_rows=8192):
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Choose from: {', '.join(self.PRECISIONS)}")
+        self.precision = precision
+        self.rerank = rerank
+        self.chunk_rows = chunk_rows
+        self.matrix = None
+        self.codes = None
+        self.scales = None
+
+    def build(self, matrix, path=None):
+        self.matrix = matrix
+        self.codes, self.scales = None, None
+        # An empty gallery (fresh install, every user deleted) has nothing to quantize yet
+        if self.precision != 'float32' and len(matrix):
+            self.codes, self.scales = quantize(matrix, self.precision)
+            report = self.report()
+            print(f"INFO: {self.precision} gallery: {report['bytes'] / 1e6:.1f} MB instead of "
+                  f"{report['float32_bytes'] / 1e6:.1f} MB ({report['memory_ratio']:.1f}x smaller), "
+                  f"score error mean {report['mean_abs_score_error']:.4f} / max {report['max_abs_score_error']:.4f}")
+
+    def add(self, matrix, path=None):
+        """`matrix` is the full gallery after new rows were appended to it."""
+        self.matrix = matrix
+        if self.precision == 'float32' or not len(matrix):
+            return
+        if self.codes is None:
+            self.codes, self.scales = quantize(matrix, self.precision)
+        elif len(matrix) > len(self.codes):
+            codes, scales = quantize(matrix[len(self.codes):], self.precision)
+            self.codes = np.concatenate([self.codes, codes])
+            if scales is not None:
+                self.scales = np.concatenate([self.scales, scales])
+
+    def search(self, queries, k, dead=None):
+        """
+        Returns (rows, scores), both (Q, <=k), best first. Masked or missing
+        results carry a score of -inf.
+        """
+        if self.precision == 'float32' or self.codes is None:
+            return _exact_search(self.matrix, queries, k, dead)
+
+        scores = self._approximate_scores(queries)
+        if dead is not None:
+            scores[:, dead] = -np.inf
+        if not self.rerank:
+            top = top_k(scores, k)
+            return top, np.take_along_axis(scores, top, axis=1)
+
+        # Exact float32 re-rank of the best candidates
+        candidates = top_k(scores, max(k, self.rerank))
+        exact = np.einsum('qd,qnd->qn', queries, np.asarray(self.matrix[candidates], dtype=np.float32))
+        exact[~np.isfinite(np.take_along_axis(scores, candidates, axis=1))] = -np.inf
+        order = top_k(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(exact, order, axis=1)
+
+    def _approximate_scores(self, queries, codes=None, scales=None):
+        codes = self.codes if codes is None else codes
+        scales = self.scales if scales is None else scales
+        if self.precision == 'int8':
+            query_codes, query_scales = quantize(queries, 'int8')
+            queries = query_codes.astype(np.float32)
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), self.chunk_rows):
+            block = codes[start:start + self.chunk_rows].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if self.precision == 'int8':
+            scores *= query_scales[:, None] * scales[None, :]
+        return scores
+
+    def report(self, sample=256, seed=0):
+        """
+        Memory of the quantized scan copy vs float32, and how far quantized
+        scores stray from exact ones on a sample of gallery rows used as queries.
+        """
+        n_rows, dim = self.matrix.shape
+        float32_bytes = n_rows * dim * 4
+        if self.precision == 'float32' or n_rows == 0:
+            return {'precision': self.precision, 'bytes': float32_bytes, 'float32_bytes': float32_bytes,
+                    'memory_ratio': 1.0, 'mean_abs_score_error': 0.0, 'max_abs_score_error': 0.0}
+        n_bytes = self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(n_rows, min(sample, n_rows), replace=False))
+        columns = np.sort(rng.choice(n_rows, min(4096, n_rows), replace=False))
+        queries = np.asarray(self.matrix[rows], dtype=np.float32)
+        exact = queries @ np.asarray(self.matrix[columns], dtype=np.float32).T
+        approximate = self._approximate_scores(
+            queries, self.codes[columns], self.scales[columns] if self.scales is not None else None
+        )
+        error = np.abs(approximate - exact)
+        return {
+            'precision': self.precision,
+            'bytes': n_bytes,
+            'float32_bytes': float32_bytes,
+            'memory_ratio': float32_bytes / n_bytes,
+            'mean_abs_score_error': float(error.mean()),
+            'max_abs_score_error': float(error.max()),
+        }
+
+
+class IVFIndex:
+    """
+    Approximate search with an inverted file (IVF) over spherical k-means
+    centroids, in plain NumPy.
+
+    Rows are bucketed by their nearest centroid; a query only scores the rows
+    in its `nprobe` closest buckets. `n_lists` and `nprobe` trade recall for
+    latency: more probes scan more rows and miss fewer true neighbours.
+    Galleries smaller than `min_rows` are searched exactly, since a full scan
+    is already cheaper than probing.
+    """
+
+    name = "ivf"
+
+    def __init__(self, n_lists=None, nprobe=8, train_iters=10, min_rows=4096, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.min_rows = min_rows
+        self.seed = seed
+        self.matrix = None
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.lists = []
+
+    # --- Building ---
+
+    def build(self, matrix, path=None):
+        """Trains on `matrix`, reusing a persisted index at `path` if it still fits."""
+        self.matrix = matrix
+        if len(matrix) < self.min_rows:
+            self.centroids = None
+            self.assignments = np.empty(0, dtype=np.int32)
+            return
+        if path and self._load(path):
+            self._assign_new_rows()
+            if len(self.assignments) > self._loaded_rows:
+                self.save(path)
+            return
+        self._train()
+        if path:
+            self.save(path)
+
+    def add(self, matrix, path=None):
+        """Incrementally assigns rows appended to `matrix` since the last build/add."""
+        trained_rows = len(self.assignments)
+        self.matrix = matrix
+        if self.centroids is None or len(matrix) > 4 * max(trained_rows, 1):
+            # Not trained yet, or grown so much the centroids no longer represent the data
+            self.build(matrix, path=None)
+            if path and self.centroids is not None:
+                self.save(path)
+            return
+        self._assign_new_rows()
+        if path:
+            self.save(path)
+
+    def _train(self):
+        n_rows = len(self.matrix)
+        n_lists = self.n_lists or int(np.clip(4 * np.sqrt(n_rows), 1, n_rows))
+        rng = np.random.default_rng(self.seed)
+
+        # Train on a bounded sample; 64 points per centroid is plenty for k-means
+        sample_size = min(n_rows, 64 * n_lists)
+        sample = np.asarray(self.matrix[np.sort(rng.choice(n_rows, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.train_iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=n_lists)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            nonempty = counts > 0
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts[nonempty], axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self._assign_new_rows()
+
+    def _assign_new_rows(self, chunk_size=65536):
+        start = len(self.assignments)
+        if start >= len(self.matrix):
+            return
+        labels = [
+            np.argmax(np.asarray(self.matrix[i:i + chunk_size]) @ self.centroids.T, axis=1).astype(np.int32)
+            for i in range(start, len(self.matrix), chunk_size)
+        ]
+        new_labels = np.concatenate(labels)
+        self.assignments = np.concatenate([self.assignments, new_labels])
+        rows = np.arange(start, len(self.matrix))
+        for list_id in np.unique(new_labels):
+            self.lists[list_id] = np.concatenate([self.lists[list_id], rows[new_labels == list_id]])
+
+    # --- Searching ---
+
+    def search(self, queries, k, dead=None):
+        """Same contract as FlatIndex.search, but only scans the probed buckets."""
+        if self.centroids is None:
+            return _exact_search(self.matrix, queries, k, dead)
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = top_k(queries @ self.centroids.T, nprobe)
+
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([self.lists[list_id] for list_id in probes[q]])
+            if dead is not None:
+                candidates = candidates[~dead[candidates]]
+            if len(candidates) == 0:
+                continue
+            candidate_scores = np.asarray(self.matrix[candidates]) @ query
+            best = top_k(candidate_scores[np.newaxis, :], k)[0]
+            rows[q, :len(best)] = candidates[best]
+            scores[q, :len(best)] = candidate_scores[best]
+        return rows, scores
+
+    # --- Persistence ---
+
+    def _fingerprint(self, n_rows):
+        """Checksum of the last indexed row, to detect a gallery rewritten by compaction."""
+        return zlib.crc32(np.asarray(self.matrix[n_rows - 1], dtype=np.float32).tobytes())
+
+    def save(self, path):
+        n_rows = len(self.assignments)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assignments=self.assignments,
+                fingerprint=np.int64(self._fingerprint(n_rows)),
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _load(self, path):
+        """Loads a persisted index if it matches the current gallery rows."""
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                centroids = data["centroids"]
+                assignments = data["assignments"]
+                fingerprint = int(data["fingerprint"])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable search index {path}: {e}")
+            return False
+
+        n_rows = len(assignments)
+        if (n_rows == 0 or n_rows > len(self.matrix) or centroids.shape[1] != self.matrix.shape[1]
+                or self._fingerprint(n_rows) != fingerprint):
+            return False
+
+        self.centroids = centroids.astype(np.float32)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=len(centroids)))[:-1]
+        self.lists = list(np.split(order.astype(np.int64), bounds))
+        self.assignments = assignments.astype(np.int32)
+        self._loaded_rows = n_rows
+        return True
+
+
+SEARCH_INDEXES = {
+    FlatIndex.name: FlatIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+def create_search_index(index_type="flat", **params):
+    """Builds a search backend by name ('flat' or 'ivf') with backend-specific knobs."""
+    if index_type not in SEARCH_INDEXES:
+        raise ValueError(f"Unknown search index '{index_type}'. Choose from: {', '.join(SEARCH_INDEXES)}")
+    return SEARCH_INDEXES[index_type](**params)
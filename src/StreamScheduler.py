@@ -0,0 +1,189 @@
+# src/StreamScheduler.py
+
+import threading
+import time
+
+from src.FaceTracker import FaceTracker
+from src.FrameSlot import FrameSlot, RateMeter
+
+
+class _Stream:
+    """Scheduler-side state of one registered frame source."""
+
+    def __init__(self, stream_id, frame_slot, on_results, target_fps):
+        self.stream_id = stream_id
+        self.frame_slot = frame_slot
+        self.on_results = on_results
+        self.target_fps = target_fps
+        self.tracker = FaceTracker()  # Tracks never mix across cameras
+        self.next_due = 0.0
+        self.rate = RateMeter()
+        self.last_latency = 0.0       # Seconds from frame capture to results delivered
+
+    def is_due(self, now):
+        return self.frame_slot.depth > 0 and now >= self.next_due
+
+
+class StreamScheduler:
+    """
+    Runs ONE shared RecognitionModel for any number of frame sources.
+
+    Every source publishes its newest frame into a FrameSlot. A single
+    inference thread repeatedly picks the streams that have a new frame and
+    are due under their FPS target, detects faces in each frame, then embeds
+    and matches the faces of all picked frames in one batch
+    (RecognitionModel.analyze_frames). Results go back to each stream's own
+    `on_results(seq, results)` callback, called on the scheduler thread.
+
+    Policies for choosing streams when more are due than `max_batch_streams`:
+    - 'round_robin': rotate the starting stream every cycle (fair share).
+    - 'latency': most overdue (longest-waiting frame) first.
+    """
+
+    POLICIES = ('round_robin', 'latency')
+
+    def __init__(self, model, detector_mode='cnn', policy='round_robin', max_batch_streams=8):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}'. Choose from: {', '.join(self.POLICIES)}")
+        self.model = model
+        self.detector_mode = detector_mode
+        self.policy = policy
+        self.max_batch_streams = max_batch_streams
+        self.batch_rate = RateMeter()
+        self.frames_batched = 0
+
+        self._streams = {}
+        self._streams_lock = threading.Lock()
+        self._rotation = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._is_running = False
+
+    # --- Stream registration ---
+
+    def create_slot(self):
+        """A FrameSlot wired to wake this scheduler whenever a frame is put into it."""
+        return FrameSlot(wakeup=self._wakeup)
+
+    def add_stream(self, stream_id, frame_slot, on_results, target_fps=None):
+        """
+        Registers a source. `frame_slot` should come from `create_slot()`;
+        `target_fps` caps how often this stream is analyzed (None = as fast as possible).
+        """
+        with self._streams_lock:
+            self._streams[stream_id] = _Stream(stream_id, frame_slot, on_results, target_fps)
+        self._wakeup.set()
+
+    def remove_stream(self, stream_id):
+        with self._streams_lock:
+            self._streams.pop(stream_id, None)
+
+    def set_target_fps(self, stream_id, target_fps):
+        with self._streams_lock:
+            if stream_id in self._streams:
+                self._streams[stream_id].target_fps = target_fps
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._is_running = True
+        self._thread = threading.Thread(target=self._run, name="stream-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._is_running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # --- Scheduling ---
+
+    def _select_streams(self, now):
+        with self._streams_lock:
+            streams = list(self._streams.values())
+        if not streams:
+            return []
+
+        if self.policy == 'latency':
+            due = [stream for stream in streams if stream.is_due(now)]
+            due.sort(key=lambda stream: stream.frame_slot.pending_since or now)
+        else:
+            start = self._rotation % len(streams)
+            self._rotation += 1
+            due = [stream for stream in streams[start:] + streams[:start] if stream.is_due(now)]
+        return due[:self.max_batch_streams]
+
+    def _run(self):
+        while self._is_running:
+            # Cleared before looking, so a frame put meanwhile still wakes us up
+            self._wakeup.clear()
+            now = time.monotonic()
+            streams = self._select_streams(now)
+            if not streams:
+                # Sleep until a new frame arrives (or the next FPS deadline passes)
+                self._wakeup.wait(timeout=self._next_deadline(now))
+                continue
+
+            batch = []
+            for stream in streams:
+                captured_at = stream.frame_slot.pending_since or now
+                item = stream.frame_slot.get(timeout=0)
+                if item is not None:
+                    batch.append((stream, item[0], item[1], captured_at))
+                    if stream.target_fps:
+                        stream.next_due = now + 1.0 / stream.target_fps
+            if not batch:
+                continue
+
+            # Detect per frame, then embed + match the faces of ALL frames in one batch
+            try:
+                all_results = self.model.analyze_frames(
+                    [frame for _, _, frame, _ in batch],
+                    detector_mode=self.detector_mode,
+                    trackers=[stream.tracker for stream, _, _, _ in batch],
+                )
+            except Exception as e:
+                # One bad batch must not stop recognition for every camera
+                names = ", ".join(f"'{stream.stream_id}'" for stream, _, _, _ in batch)
+                print(f"ERROR: Inference failed for stream(s) {names}: {e}")
+                continue
+            self.batch_rate.tick()
+            self.frames_batched += len(batch)
+
+            done = time.monotonic()
+            for (stream, seq, _, captured_at), results in zip(batch, all_results):
+                stream.rate.tick()
+                stream.last_latency = done - captured_at
+                if results is not None:
+                    try:
+                        stream.on_results(seq, results)
+                    except Exception as e:
+                        print(f"ERROR: Result callback for stream '{stream.stream_id}' failed: {e}")
+
+    def _next_deadline(self, now):
+        """Seconds until the earliest FPS-capped stream becomes due (bounded)."""
+        with self._streams_lock:
+            waits = [stream.next_due - now for stream in self._streams.values()
+                     if stream.frame_slot.depth and stream.next_due > now]
+        return min(waits + [0.5])
+
+    def stats(self):
+        """Per-stream analysis rate, latency and drops, plus batch statistics."""
+        with self._streams_lock:
+            streams = list(self._streams.values())
+        return {
+            'batches_per_sec': self.batch_rate.rate,
+            'avg_streams_per_batch': self.frames_batched / max(self.batch_rate.count, 1),
+            'streams': {
+                stream.stream_id: {
+                    'analyzed_fps': stream.rate.rate,
+                    'target_fps': stream.target_fps,
+                    'latency_ms': stream.last_latency * 1000.0,
+                    'frames_dropped': stream.frame_slot.drops,
+                }
+                for stream in streams
+            },
+        }
@@ -0,0 +1,216 @@
+# src/StreamServer.py
+
+import asyncio
+import os
+import threading
+
+import cv2
+
+from src.EventAggregator import EventAggregator, write_events
+from src.FaceTracker import FaceTracker
+from src.FrameSource import open_frame_source
+from src.PerfStats import get_perf_stats
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "index.html")
+BOUNDARY = "frame"
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame fan-out from one producer thread to any number of asyncio
+    clients.
+
+    The producer publishes each JPEG once, already wrapped as a multipart
+    part, and every client sends that same bytes object. There is no
+    per-client queue: a client that is still busy sending when newer frames
+    arrive simply skips to the newest one, so a slow browser loses frames
+    instead of buffering them (and never slows the others down).
+    """
+
+    def __init__(self):
+        self._latest = (0, None)   # (sequence number, multipart bytes), swapped atomically
+        self._loop = None
+        self._event = None
+        self.clients = 0
+        self.dropped = 0
+        self.perf = get_perf_stats()
+
+    def attach(self, loop):
+        """Binds the broadcaster to the server's event loop (call from that loop)."""
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def publish(self, jpeg):
+        """Producer side (any thread): replaces the latest frame and wakes the clients."""
+        part = (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n"
+                .encode() + jpeg + b"\r\n")
+        self._latest = (self._latest[0] + 1, part)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def parts(self):
+        """Async generator of multipart parts for one client, newest frame first."""
+        self.clients += 1
+        self.perf.gauge('stream_clients', self.clients)
+        last = None
+        try:
+            while True:
+                seq, part = self._latest
+                if part is None or seq == last:
+                    await self._event.wait()
+                    continue
+                if last is not None and seq - last > 1:
+                    self.dropped += seq - last - 1
+                    self.perf.count('stream_frames_dropped', seq - last - 1)
+                last = seq
+                yield part
+        finally:
+            self.clients -= 1
+            self.perf.gauge('stream_clients', self.clients)
+
+
+class InferenceLoop:
+    """
+    The one capture -> recognize -> annotate -> encode loop shared by every
+    client, on its own thread. Recognition events go through the
+    EventAggregator into the LogManager; each annotated frame is JPEG-encoded
+    once and handed to the broadcaster.
+    """
+
+    def __init__(self, model, log_manager, broadcaster, source=0, detector_mode='cnn', jpeg_quality=80,
+                 aggregator=None, stream_id="server"):
+        self.model = model
+        self.log_manager = log_manager
+        self.broadcaster = broadcaster
+        self.source = source
+        self.detector_mode = detector_mode
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self.aggregator = aggregator or EventAggregator()
+        self.stream_id = stream_id
+        self.tracker = FaceTracker()
+        self.perf = get_perf_stats()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stream-inference", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        cap = open_frame_source(self.source)
+        if not cap.isOpened():
+            print(f"ERROR: Could not open video source {self.source}.")
+            return
+        print(f"INFO: Streaming '{self.source}' with detector '{self.detector_mode}'.")
+        try:
+            while not self._stop.is_set():
+                with self.perf.timer('capture'):
+                    ret, frame = cap.read()
+                if not ret:
+                    print("INFO: Video source exhausted.")
+                    break
+
+                try:
+                    results = self.model.analyze_frame(frame, self.detector_mode, tracker=self.tracker)
+                    if results is not None:
+                        write_events(self.log_manager, self.aggregator.observe(results, self.stream_id))
+                        with self.perf.timer('draw'):
+                            self.model.draw_results(frame, results)
+                except Exception as e:
+                    # Keep /video_feed alive for every client; the frame goes out unannotated
+                    print(f"ERROR: Recognition failed on stream '{self.stream_id}': {e}")
+
+                # Skip the encode entirely while nobody is watching
+                if self.broadcaster.clients:
+                    with self.perf.timer('encode'):
+                        ok, jpeg = cv2.imencode('.jpg', frame, self.encode_params)
+                    if ok:
+                        self.broadcaster.publish(jpeg.tobytes())
+        finally:
+            cap.release()
+            # Nobody is in front of a stopped stream: close its open sessions
+            write_events(self.log_manager, self.aggregator.close(self.stream_id))
+
+
+def create_app(model=None, log_manager=None, source=0, detector_mode='cnn', jpeg_quality=80, max_page=500):
+    """
+    Builds the FastAPI app:
+
+    - `GET /`: templates/index.html;
+    - `GET /video_feed`: multipart MJPEG of the shared annotated stream;
+    - `GET /logs?limit=&before_id=`: one page of access logs as JSON, newest
+      first; pass `next_before_id` back as `before_id` for the next page;
+    - `GET /metrics`: PerfStats in the Prometheus text format.
+
+    FastAPI and uvicorn are only imported here, so the other modes run without them.
+    """
+    try:
+        from contextlib import asynccontextmanager
+        from fastapi import FastAPI, Query
+        from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+    except ImportError as e:
+        raise ImportError("The stream server needs FastAPI: pip install -r requirements.txt") from e
+    from src.RecognitionModel import RecognitionModel
+    from src.LogManager import LogManager
+
+    model = model or RecognitionModel()
+    log_manager = log_manager or LogManager()
+    broadcaster = FrameBroadcaster()
+    loop = InferenceLoop(model, log_manager, broadcaster, source=source, detector_mode=detector_mode,
+                         jpeg_quality=jpeg_quality)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        broadcaster.attach(asyncio.get_running_loop())
+        loop.start()
+        yield
+        loop.stop()
+        log_manager.close()
+
+    app = FastAPI(title="Smart Office Face Recognition", lifespan=lifespan)
+    app.state.model, app.state.log_manager, app.state.broadcaster = model, log_manager, broadcaster
+
+    @app.get("/", response_class=HTMLResponse)
+    def index():
+        with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+            return f.read()
+
+    @app.get("/video_feed")
+    async def video_feed():
+        return StreamingResponse(broadcaster.parts(), media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+
+    # Plain `def`: FastAPI runs it in its threadpool, keeping SQLite off the event loop
+    @app.get("/logs")
+    def logs(limit: int = Query(100, ge=1, le=max_page), before_id: int = None):
+        rows = log_manager.get_logs(limit=limit, before_id=before_id)
+        return {
+            'logs': [
+                {'id': row[0], 'timestamp': row[1], 'status': row[2], 'user_id': row[3], 'confidence': row[4]}
+                for row in rows
+            ],
+            'next_before_id': rows[-1][0] if len(rows) == limit else None,
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return PlainTextResponse(get_perf_stats().prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+def serve(host="0.0.0.0", port=8000, **app_params):
+    """Runs the app with uvicorn (blocking)."""
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise ImportError("The stream server needs uvicorn: pip install -r requirements.txt") from e
+    uvicorn.run(create_app(**app_params), host=host, port=port, log_level="warning")
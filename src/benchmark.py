@@ -0,0 +1,189 @@
+# src/benchmark.py
+
+import datetime
+import functools
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from src.FrameSource import open_frame_source
+
+# Stages timed per frame, in pipeline order
+STAGES = ('detect', 'crop', 'embed', 'match', 'draw', 'log')
+
+
+def _peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (ru_maxrss is KB on Linux,
+    bytes on macOS), or None where `resource` does not exist (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _summary(values_ms):
+    values = np.asarray(values_ms, dtype=np.float64)
+    if not len(values):
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(values.max()),
+    }
+
+
+def _instrument(model, timings):
+    """
+    Wraps the model's stage methods (on this instance only) to add their time
+    to `timings`; detected boxes are counted in timings['faces'].
+    """
+    stage_methods = {
+        'detect': 'detect_faces',
+        'crop': 'crop_faces',
+        'embed': 'embed_faces',
+        'match': 'match_embeddings',
+        'draw': 'draw_results',
+    }
+    for stage, name in stage_methods.items():
+        method = getattr(model, name)
+
+        @functools.wraps(method)
+        def timed(*args, _method=method, _stage=stage, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = _method(*args, **kwargs)
+            finally:
+                timings[_stage] += time.perf_counter() - start
+            if _stage == 'detect':
+                timings['faces'] += len(result)
+            return result
+
+        setattr(model, name, timed)
+
+
+def run_benchmark(source, detector_mode='cnn', max_frames=None, warmup_frames=5, output=None,
+                  loop=False, model=None):
+    """
+    Replays a video file or image directory through RecognitionModel.process_frame
+    as fast as possible and reports per-stage latency, end-to-end FPS and
+    p50/p95/p99 frame latency, faces/sec and peak RSS. The first
+    `warmup_frames` frames are processed but not measured. The report is
+    returned and, if `output` is given, written there as JSON.
+    """
+    from src.RecognitionModel import RecognitionModel
+    from src.LogManager import LogManager
+
+    cap = open_frame_source(source, loop=loop)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open frame source '{source}'.")
+
+    if model is None:
+        model = RecognitionModel()
+    model.models.wait_until_ready()  # Cold start is reported separately, not mixed into frame times
+    log_manager = LogManager()
+
+    timings = dict.fromkeys(STAGES + ('faces',), 0.0)
+    _instrument(model, timings)
+
+    per_stage = {stage: [] for stage in STAGES}
+    frame_ms = []
+    faces = 0
+    frame_shape = None
+    processed = 0
+    wall_start = None
+
+    print(f"INFO: Replaying '{source}' with detector '{detector_mode}'...")
+    while max_frames is None or len(frame_ms) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_shape = frame.shape
+        for key in timings:
+            timings[key] = 0.0
+
+        start = time.perf_counter()
+        _, _, _, log_data = model.process_frame(frame, detector_mode=detector_mode)
+        log_start = time.perf_counter()
+        if log_data:
+            log_manager.log_access_event(log_data['user_id'], log_data['status'], log_data['confidence'])
+        end = time.perf_counter()
+        timings['log'] = end - log_start
+
+        processed += 1
+        if processed <= warmup_frames:
+            continue
+        if wall_start is None:
+            wall_start = start
+        frame_ms.append((end - start) * 1000.0)
+        for stage in STAGES:
+            per_stage[stage].append(timings[stage] * 1000.0)
+        faces += int(timings['faces'])
+
+    wall = (time.perf_counter() - wall_start) if wall_start is not None else 0.0
+    cap.release()
+    log_manager.close()
+
+    report = {
+        'source': str(source),
+        'detector_mode': detector_mode,
+        'frame_shape': list(frame_shape) if frame_shape is not None else None,
+        'frames': len(frame_ms),
+        'warmup_frames': min(processed, warmup_frames),
+        'wall_seconds': wall,
+        'fps': len(frame_ms) / wall if wall > 0 else 0.0,
+        'faces': faces,
+        'faces_per_sec': faces / wall if wall > 0 else 0.0,
+        'frame_latency': _summary(frame_ms),
+        'stages': {stage: _summary(values) for stage, values in per_stage.items()},
+        'peak_rss_mb': _peak_rss_mb(),
+        'cold_start': dict(model.models.timings),
+        'git_commit': _git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    if model.motion_gate is not None:
+        report['motion_gate'] = model.motion_gate.stats()
+    if model.embedding_cache is not None:
+        report['embedding_cache'] = model.embedding_cache.stats()
+
+    print(format_report(report))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"INFO: Benchmark report written to {output}")
+    return report
+
+
+def format_report(report):
+    """Short human-readable summary of a benchmark report."""
+    latency = report['frame_latency']
+    peak_rss = 'n/a' if report['peak_rss_mb'] is None else f"{report['peak_rss_mb']:.0f} MB"
+    lines = [
+        f"Frames: {report['frames']}  FPS: {report['fps']:.2f}  Faces/sec: {report['faces_per_sec']:.2f}  "
+        f"Peak RSS: {peak_rss}",
+        f"Frame latency ms  p50 {latency['p50_ms']:.1f}  p95 {latency['p95_ms']:.1f}  p99 {latency['p99_ms']:.1f}",
+    ]
+    for stage, summary in report['stages'].items():
+        lines.append(f"  {stage:<7} mean {summary['mean_ms']:7.2f}  p50 {summary['p50_ms']:7.2f}  "
+                     f"p95 {summary['p95_ms']:7.2f}  p99 {summary['p99_ms']:7.2f}")
+    return "\n".join(lines)
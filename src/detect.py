@@ -1,5 +1,4 @@
 import cv2
-from deepface import DeepFace
 
 # Load OpenCV Haar Cascade
 haar_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
@@ -20,6 +19,7 @@ def detect_face(frame, detector='cnn'):
     else:
         print("Using CNN-based detection (DeepFace - MTCNN backend)")
         try:
+            from deepface import DeepFace  # Lazy: importing DeepFace loads TensorFlow
             detected_faces = DeepFace.extract_faces(frame, detector_backend='mtcnn', enforce_detection=False)
             for item in detected_faces:
                 face = item["face"]
@@ -1,6 +1,39 @@
-from deepface import DeepFace
 import cv2
+import numpy as np
+
+from src.Embedder import get_embedder
+
+FACENET_INPUT_SIZE = (160, 160)
+EMBEDDING_DIM = 128
+
+def _prepare_face(face_img):
+    """Resizes one crop to the Facenet input size and scales it to float32 in [0, 1]."""
+    face = np.asarray(face_img)
+    if face.shape[:2] != FACENET_INPUT_SIZE:
+        face = cv2.resize(face, FACENET_INPUT_SIZE)
+    face = face.astype(np.float32)
+    # DeepFace.extract_faces already returns [0, 1] crops; raw frame crops are 0-255
+    if face.max() > 1:
+        face /= 255.0
+    return face
+
+def prepare_batch(face_imgs):
+    """Stacks crops into one (N, 160, 160, 3) float32 batch in [0, 1]."""
+    return np.stack([_prepare_face(face) for face in face_imgs])
+
+def get_embeddings(face_imgs):
+    """
+    Embeds N aligned face crops (RGB, ideally 160x160) in a single Facenet
+    forward pass of the configured backend (see src/Embedder.py: DeepFace by
+    default, or an exported graph through ONNX Runtime / cv2.dnn).
+    Returns an (N, 128) float32 array.
+    """
+    if len(face_imgs) == 0:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+    embeddings = get_embedder().embed(prepare_batch(face_imgs))
+    return np.asarray(embeddings, dtype=np.float32).reshape(len(face_imgs), EMBEDDING_DIM)
 
 def get_embedding(face_img):
-    embedding = DeepFace.represent(face_img, model_name='Facenet', enforce_detection=False)[0]["embedding"]
-    return embedding
\ No newline at end of file
+    """Single-crop convenience wrapper around get_embeddings."""
+    return get_embeddings([face_img])[0]
@@ -0,0 +1,215 @@
+# src/enroll.py
+
+import csv
+import json
+import multiprocessing as mp
+import os
+import time
+
+import cv2
+
+from src.FrameSource import IMAGE_EXTENSIONS
+from src.GalleryStore import DEFAULT_GALLERY_PATH, DEFAULT_MAX_TEMPLATES, open_gallery
+
+JOURNAL_FILE = "enroll_journal.jsonl"
+MAX_IMAGE_SIDE = 1024  # Badge photos are often huge; MTCNN cost grows with pixel count
+
+
+# --- Input discovery ---
+
+def find_images(source):
+    """
+    Lists (user_id, name, image_path) for a directory tree with one folder per
+    person (folder name = user id and name) or a CSV manifest with
+    `user_id,name,image` columns (image paths relative to the CSV).
+    """
+    if os.path.isdir(source):
+        entries = []
+        for person in sorted(os.listdir(source)):
+            person_dir = os.path.join(source, person)
+            if not os.path.isdir(person_dir):
+                continue
+            for root, _, files in os.walk(person_dir):
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                        entries.append((person, person, os.path.join(root, file_name)))
+        return entries
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="", encoding="utf-8") as f:
+        return [
+            (row["user_id"].strip(), (row.get("name") or row["user_id"]).strip(), os.path.join(base, row["image"].strip()))
+            for row in csv.DictReader(f)
+        ]
+
+
+def _chunk_by_person(entries, batch_size):
+    """Packs whole persons into chunks of about `batch_size` images (a person is never split)."""
+    by_person = {}
+    for entry in entries:
+        by_person.setdefault(entry[0], []).append(entry)
+    chunks, current = [], []
+    for images in by_person.values():
+        if current and len(current) + len(images) > batch_size:
+            chunks.append(current)
+            current = []
+        current.extend(images)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- Worker processes ---
+
+def _init_worker():
+    """Builds the detector and embedder once per worker process."""
+    from src.ModelRegistry import get_model_registry
+    get_model_registry().warm_up(background=False)
+
+
+def _enroll_chunk(chunk):
+    """
+    Detects one face per image and embeds all accepted faces of the chunk in
+    a single batch. Returns (user_id, name, image_path, status, embedding) per image.
+    """
+    from deepface import DeepFace
+    from src.embed import get_embeddings
+
+    outcomes, faces = [], []
+    for user_id, name, image_path in chunk:
+        image = cv2.imread(image_path)
+        if image is None:
+            outcomes.append([user_id, name, image_path, "unreadable", None])
+            continue
+        h, w = image.shape[:2]
+        if max(h, w) > MAX_IMAGE_SIDE:
+            scale = MAX_IMAGE_SIDE / max(h, w)
+            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        try:
+            detected = DeepFace.extract_faces(image, detector_backend='mtcnn', enforce_detection=False)
+        except Exception as e:
+            outcomes.append([user_id, name, image_path, f"error: {e}", None])
+            continue
+        detected = [item for item in detected if item.get("confidence", 1) > 0]
+        if len(detected) != 1:
+            outcomes.append([user_id, name, image_path, "no_face" if not detected else "multiple_faces", None])
+            continue
+        outcomes.append([user_id, name, image_path, "ok", None])
+        faces.append((len(outcomes) - 1, detected[0]["face"]))
+
+    if faces:
+        try:
+            embeddings = get_embeddings([face for _, face in faces])
+            for (i, _), embedding in zip(faces, embeddings):
+                outcomes[i][4] = embedding
+        except Exception as e:
+            for i, _ in faces:
+                outcomes[i][3] = f"error: {e}"
+    return [tuple(outcome) for outcome in outcomes]
+
+
+# --- Driver ---
+
+def _read_journal(journal_path):
+    done = {}
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    record = json.loads(line)
+                    done[record["image"]] = record
+    return done
+
+
+def enroll_images(source, db_path=DEFAULT_GALLERY_PATH, workers=None, batch_size=32, journal_path=None,
+                  max_templates=DEFAULT_MAX_TEMPLATES):
+    """
+    Bulk-enrolls every image under `source` (folder per person or CSV manifest).
+
+    Chunks of whole persons are detected and embedded in `workers` processes.
+    Each finished chunk is committed with one transactional GalleryStore.append
+    (every accepted image becomes a template of its person) and then recorded
+    in a journal, so an interrupted run resumes where it stopped. At the end
+    the gallery is compacted to at most `max_templates` prototypes per person.
+    Images with zero or several faces are skipped and reported. Returns a
+    summary dict.
+    """
+    store = open_gallery(db_path)
+    journal_path = journal_path or os.path.join(store.path, JOURNAL_FILE)
+    done = _read_journal(journal_path)
+
+    entries = find_images(source)
+    pending = [entry for entry in entries if entry[2] not in done]
+    if len(pending) < len(entries):
+        print(f"INFO: Resuming: {len(entries) - len(pending)} of {len(entries)} images already processed.")
+    if not pending:
+        print("INFO: Nothing to enroll.")
+        return _summary(done, elapsed=0.0, processed=0)
+
+    chunks = _chunk_by_person(pending, batch_size)
+    workers = workers or max(1, (mp.cpu_count() or 2) // 2)
+    print(f"INFO: Enrolling {len(pending)} images in {len(chunks)} batches with {workers} worker(s)...")
+
+    start = time.perf_counter()
+    last_report = start
+    processed = 0
+    # Spawned, not forked: TensorFlow does not survive a fork
+    with mp.get_context('spawn').Pool(processes=workers, initializer=_init_worker) as pool, \
+            open(journal_path, "a", encoding="utf-8") as journal:
+        for outcomes in pool.imap_unordered(_enroll_chunk, chunks):
+            _commit(store, outcomes)
+
+            # Journal after the gallery commit: a crash in between only re-enrolls this chunk
+            for user_id, _, image_path, status, _ in outcomes:
+                record = {"image": image_path, "user_id": user_id, "status": status}
+                journal.write(json.dumps(record) + "\n")
+                done[image_path] = record
+            journal.flush()
+            os.fsync(journal.fileno())
+
+            processed += len(outcomes)
+            now = time.perf_counter()
+            if now - last_report >= 2.0 or processed == len(pending):
+                rate = processed / (now - start)
+                eta = (len(pending) - processed) / rate if rate > 0 else 0.0
+                print(f"INFO: {processed}/{len(pending)} images ({rate:.1f} images/sec, ETA {eta:.0f}s)")
+                last_report = now
+
+    elapsed = time.perf_counter() - start
+    if max_templates:
+        # Also absorbs templates duplicated by a chunk re-run after a crash
+        store.compact(max_templates=max_templates)
+    return _summary(done, elapsed=elapsed, processed=processed)
+
+
+def _commit(store, outcomes):
+    """Appends every accepted image of the chunk as a template of its person, in one transaction."""
+    accepted = [(user_id, name, embedding) for user_id, name, _, status, embedding in outcomes
+                if status == "ok" and embedding is not None]
+    if accepted:
+        user_ids, names, embeddings = zip(*accepted)
+        store.append(list(user_ids), list(names), embeddings, replace=False)
+
+
+def _summary(done, elapsed, processed):
+    statuses = {}
+    for record in done.values():
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    skipped = sorted(
+        (record["image"], record["status"]) for record in done.values() if record["status"] != "ok"
+    )
+    enrolled = len({record["user_id"] for record in done.values() if record["status"] == "ok"})
+    summary = {
+        'images': len(done),
+        'processed_this_run': processed,
+        'enrolled_identities': enrolled,
+        'statuses': statuses,
+        'skipped': skipped,
+        'seconds': elapsed,
+        'images_per_sec': processed / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"INFO: Enrolled {enrolled} identities from {statuses.get('ok', 0)} images "
+          f"({summary['images_per_sec']:.1f} images/sec this run).")
+    for image_path, status in skipped:
+        print(f"WARNING: Skipped {image_path}: {status}")
+    return summary
@@ -1,16 +1,19 @@
 import cv2
 from src.detect import detect_face
-from src.embed import get_embedding
-from src.utils import load_embeddings
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from src.embed import get_embeddings
+from src.GalleryStore import DEFAULT_GALLERY_PATH, open_gallery
+from src.GalleryIndex import GalleryIndex
+from src.FrameSource import open_frame_source
 
-def recognize_user(db_path='data/embeddings.pkl', detector='cnn'):
-    cap = cv2.VideoCapture(0)
+def recognize_user(db_path=DEFAULT_GALLERY_PATH, detector='cnn', index_type='flat', source=0, index_params=None):
+    cap = open_frame_source(source)
     print("Press 'c' to capture and recognize.")
 
     while True:
         ret, frame = cap.read()
+        if not ret:
+            print("Error: Could not read frame from camera.")
+            break
         cv2.imshow("Recognize - Press 'c'", frame)
         key = cv2.waitKey(1)
 
@@ -20,25 +23,23 @@ def recognize_user(db_path='data/embeddings.pkl', detector='cnn'):
                 print("No face detected.")
                 continue
 
-            face = faces[0]
-            embedding = get_embedding(face)
-            db = load_embeddings(db_path)
+            store = open_gallery(db_path)
 
-            if not db:
+            if len(store) == 0:
                 print("No registered users.")
                 continue
 
-            names = list(db.keys())
-            embeddings = np.array(list(db.values()))
-
-            similarities = cosine_similarity([embedding], embeddings)[0]
-            best_match_idx = np.argmax(similarities)
-            best_score = similarities[best_match_idx]
-
-            if best_score > 0.7:  # Threshold for recognition
-                print(f"Hello, {names[best_match_idx]}!")
-            else:
-                print("Face not recognized.")
+            # Embed every detected face in one pass and match them all at once
+            gallery = GalleryIndex(index_type=index_type, **(index_params or {}))
+            gallery.load_store(store)
+            embeddings = get_embeddings(faces)
+
+            for top in gallery.match(embeddings, k=1):
+                best_id, best_score = top[0]
+                if best_score > 0.7:  # Threshold for recognition
+                    print(f"Hello, {store.names[best_id]}!")
+                else:
+                    print("Face not recognized.")
 
             break
         elif key == ord('q'):
@@ -1,18 +1,17 @@
 import cv2
-import numpy as np
-from deepface import DeepFace # <-- REQUIRED IMPORT for save_user_from_frame
 from src.detect import detect_face
-from src.embed import get_embedding
-from src.utils import load_embeddings, save_embeddings
+from src.embed import get_embeddings
+from src.GalleryStore import DEFAULT_GALLERY_PATH, open_gallery
+from src.FrameSource import open_frame_source
 
 # --- 1. ORIGINAL CLI REGISTRATION FUNCTION (RETAINED) ---
 
-def register_user(db_path='data/embeddings.pkl', detector='cnn'):
+def register_user(db_path=DEFAULT_GALLERY_PATH, detector='cnn', source=0):
     """
     CLI function for registering a user via webcam interaction.
     (Kept for compatibility with the old CLI entry point)
     """
-    cap = cv2.VideoCapture(0)
+    cap = open_frame_source(source)
     print("Press 'c' to capture your face.")
     print(f"Using '{detector}' face detector.")
 
@@ -48,14 +47,11 @@ def register_user(db_path='data/embeddings.pkl', detector='cnn'):
             
             # Ensure the face image is RGB before embedding (if not guaranteed by detect_face)
             face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-            embedding = get_embedding(face_rgb) # Use the RGB version for FaceNet
+            embedding = get_embeddings([face_rgb])[0] # Use the RGB version for FaceNet
 
-            db = load_embeddings(db_path)
-            
-            # Structure data for GUI compatibility: {ID: {'name': NAME, 'embedding': EMBEDDING}}
-            db[user_id] = {'name': name, 'embedding': embedding} 
-            
-            save_embeddings(db_path, db)
+            # Append just this capture to the gallery (no full rewrite); an
+            # existing user gains it as an extra template
+            open_gallery(db_path).add(user_id, name, embedding, replace=False)
             print(f"User '{name}' (ID: {user_id}) registered successfully.")
             break
             
@@ -68,13 +64,16 @@ def register_user(db_path='data/embeddings.pkl', detector='cnn'):
 
 # --- 2. GUI HELPER FUNCTION (NEW) ---
 
-def save_user_from_frame(frame, user_id, user_name):
+def save_user_from_frame(frame, user_id, user_name, db_path=DEFAULT_GALLERY_PATH, replace=False):
     """
     Saves a new user from a given frame, user ID, and user name.
-    This function is called by the GUI RegistrationDialog.
+    This function is called by the GUI RegistrationDialog. Registering an
+    existing ID again adds another template (pose, lighting) unless `replace`.
     """
     # 1. Detect face in the frame using DeepFace's raw extractor for bounding box/structure
     try:
+        from deepface import DeepFace  # Lazy: importing DeepFace loads TensorFlow
+
         # NOTE: DeepFace.extract_faces expects the frame to be BGR or RGB. 
         # Since the frame comes directly from the webcam via the thread, it is BGR.
         detected_faces = DeepFace.extract_faces(frame, detector_backend='mtcnn', enforce_detection=True)
@@ -87,4 +86,17 @@ def save_user_from_frame(frame, user_id, user_name):
         return False 
 
     # 2. Extract the cropped face image from the structured result
-    # DeepFace's 'face' output is already cropped, resized (160x160),
\ No newline at end of file
+    # DeepFace's 'face' output is already cropped, RGB and scaled to [0, 1]
+    face = detected_faces[0]["face"]
+
+    # 3. Embed through the same batched path used for live recognition
+    try:
+        embedding = get_embeddings([face])[0]
+    except Exception as e:
+        print(f"Registration embedding failed: {e}")
+        return False
+
+    # 4. Append the capture to the gallery as a template of this ID
+    open_gallery(db_path).add(user_id, user_name, embedding, replace=replace)
+    print(f"User '{user_name}' (ID: {user_id}) registered successfully.")
+    return True
@@ -1,19 +1,26 @@
 import pickle
 import os
 
-def load_embeddings(file_path):
-    # 1. Load the raw dictionary data
+def load_embeddings_dict(file_path):
+    """Returns the raw {key: entry} dictionary stored in the pickle file (empty if missing)."""
     if os.path.exists(file_path):
         with open(file_path, 'rb') as f:
-            data = pickle.load(f)
-    else:
-        # If the file doesn't exist, start with an empty dictionary
-        data = {}
+            return pickle.load(f)
+    # If the file doesn't exist, start with an empty dictionary
+    return {}
+
+def load_embeddings(file_path):
+    # 1. Load the raw dictionary data
+    data = load_embeddings_dict(file_path)
 
     # 2. Extract keys (names) and values (embeddings) from the dictionary
-    # The keys of the dictionary are the names, and the values are the embeddings (list of arrays)
+    # The keys of the dictionary are the names, and the values are either the raw
+    # embeddings or {'name': ..., 'embedding': ...} entries written by registration
     known_names = list(data.keys())
-    known_embeddings = list(data.values())
+    known_embeddings = [
+        value['embedding'] if isinstance(value, dict) else value
+        for value in data.values()
+    ]
 
     # 3. Return the two required lists
     return known_embeddings, known_names
@@ -21,4 +28,4 @@ def load_embeddings(file_path):
 def save_embeddings(file_path, data):
     # This function should save the dictionary (data) you use for registration
     with open(file_path, 'wb') as f:
-        pickle.dump(data, f)
\ No newline at end of file
+        pickle.dump(data, f)
@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.AdaptiveDetector import AdaptiveDetector
+from src.FaceTracker import FaceTracker
+
+
+class _Detector:
+    """Returns `boxes` (in the scanned image's coordinates) and records each call's image size."""
+
+    def __init__(self, boxes=()):
+        self.boxes = list(boxes)
+        self.calls = []
+
+    def __call__(self, image):
+        self.calls.append(image.shape[:2])
+        return list(self.boxes)
+
+
+def _frame():
+    return np.zeros((480, 640, 3), dtype=np.uint8)
+
+
+def test_empty_scene_costs_one_downscaled_scan_per_frame():
+    detect_fn = _Detector()
+    detector = AdaptiveDetector(detect_fn)
+    for _ in range(5):
+        assert detector.detect(_frame()) == []
+    assert detect_fn.calls == [(240, 320)] * 5
+    assert detector.counts['escalations'] == 0
+
+
+def test_empty_full_scan_escalation_is_opt_in():
+    detect_fn = _Detector()
+    detector = AdaptiveDetector(detect_fn, escalate_empty_scans=True)
+    detector.detect(_frame())
+    assert detect_fn.calls == [(240, 320), (480, 640)]
+
+
+def test_roi_scans_follow_a_known_face():
+    detect_fn = _Detector([(100, 100, 40, 40)])
+    detector = AdaptiveDetector(detect_fn, full_scan_interval=10)
+    key = FaceTracker()
+    assert detector.detect(_frame(), key=key) == [(200, 200, 80, 80)]
+
+    detect_fn.calls.clear()
+    detect_fn.boxes = [(20, 20, 40, 40)]  # The face inside its padded ROI, at half scale
+    boxes = detector.detect(_frame(), key=key)
+    assert detector.counts['roi_scans'] == 1
+    assert boxes == [(200, 200, 80, 80)]
+    assert detect_fn.calls[0][0] < 240  # Only the ROI was scanned
+
+
+def test_streams_keep_separate_state():
+    detect_fn = _Detector([(100, 100, 40, 40)])
+    detector = AdaptiveDetector(detect_fn)
+    door, lobby = FaceTracker(), FaceTracker()
+    detector.detect(_frame(), key=door)
+    detector.detect(_frame(), key=lobby)
+    assert detector.counts['full_scans'] == 2
@@ -0,0 +1,74 @@
+import pytest
+
+from src.EventAggregator import EventAggregator, write_events
+
+
+def _face(user_id="alice", confidence=0.9, matched=True):
+    status = "Denied" if user_id == "Unknown" else "Granted"
+    return {'user_id': user_id, 'status': status, 'confidence': confidence, 'matched': matched}
+
+
+def _kinds(events):
+    return [(event['event'], event['user_id']) for event in events]
+
+
+def test_one_entry_and_one_exit_per_presence():
+    aggregator = EventAggregator(cooldown=5.0)
+    assert _kinds(aggregator.observe([_face(confidence=0.7)], "door", now=0.0)) == [('entry', "alice")]
+    for t in range(1, 10):
+        assert aggregator.observe([_face(confidence=0.7 + t / 100)], "door", now=float(t)) == []
+    assert aggregator.observe([], "door", now=12.0) == []
+
+    (exit_event,) = aggregator.observe([], "door", now=15.0)
+    assert exit_event['event'] == 'exit'
+    session = exit_event['session']
+    assert (session['first_seen'], session['last_seen'], session['frames']) == (0.0, 9.0, 10)
+    assert exit_event['confidence'] == session['peak_confidence'] == pytest.approx(0.79)
+
+
+def test_sessions_are_per_stream():
+    aggregator = EventAggregator()
+    assert _kinds(aggregator.observe([_face()], "door", now=0.0)) == [('entry', "alice")]
+    assert _kinds(aggregator.observe([_face()], "lobby", now=0.0)) == [('entry', "alice")]
+    assert aggregator.stats()['open_sessions'] == 2
+    assert _kinds(aggregator.close("door")) == [('exit', "alice")]
+    assert aggregator.stats()['open_sessions'] == 1
+
+
+def test_min_frames_drops_flickers():
+    aggregator = EventAggregator(cooldown=1.0, min_frames=3)
+    assert aggregator.observe([_face()], "door", now=0.0) == []
+    assert aggregator.observe([], "door", now=5.0) == []  # Expired unannounced: no exit either
+    for t in (10.0, 10.1):
+        assert aggregator.observe([_face()], "door", now=t) == []
+    assert _kinds(aggregator.observe([_face()], "door", now=10.2)) == [('entry', "alice")]
+
+
+def test_unknown_alerts_are_rate_limited():
+    aggregator = EventAggregator(unknown_alert_interval=30.0)
+    assert _kinds(aggregator.observe([_face("Unknown", 0.2)], "door", now=0.0)) == [('alert', "Unknown")]
+    for t in (1.0, 2.0):
+        assert aggregator.observe([_face("Unknown", 0.2)], "door", now=t) == []
+    (alert,) = aggregator.observe([_face("Unknown", 0.2)], "door", now=31.0)
+    assert alert['suppressed'] == 2
+    # Unmatched faces (no gallery / embedding failed) are unknown too
+    assert _kinds(aggregator.observe([_face(matched=False)], "lobby", now=0.0)) == [('alert', "Unknown")]
+
+
+def test_write_events_routes_to_log_manager():
+    class Recorder:
+        def __init__(self):
+            self.access, self.sessions = [], []
+
+        def log_access_event(self, user_id, status, confidence=None):
+            self.access.append((user_id, status))
+
+        def log_session(self, user_id, status, first_seen, last_seen, frames, peak_confidence, stream_id=None):
+            self.sessions.append((user_id, stream_id, frames))
+
+    aggregator = EventAggregator()
+    recorder = Recorder()
+    write_events(recorder, aggregator.observe([_face(), _face("Unknown", 0.1)], "door", now=0.0))
+    write_events(recorder, aggregator.close("door"))
+    assert sorted(recorder.access) == [("Unknown", "Denied"), ("alice", "Granted")]
+    assert recorder.sessions == [("alice", "door", 1)]
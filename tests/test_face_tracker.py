@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.FaceTracker import FaceTracker, box_iou
+
+GRANTED = {'user_id': "alice", 'status': "Granted", 'confidence': 0.9, 'matched': True}
+
+
+def test_box_iou():
+    iou = box_iou([(0, 0, 10, 10)], [(0, 0, 10, 10), (5, 0, 10, 10), (20, 20, 5, 5)])
+    assert np.allclose(iou, [[1.0, 50 / 150, 0.0]])
+
+
+def test_tracks_keep_ids_across_frames():
+    tracker = FaceTracker()
+    first = tracker.update([(0, 0, 50, 50), (200, 0, 50, 50)])
+    second = tracker.update([(205, 2, 50, 50), (3, 1, 50, 50)])  # Moved a little, reordered
+    assert second[0] is first[1]
+    assert second[1] is first[0]
+    assert len({track.track_id for track in first}) == 2
+
+
+def test_centroid_fallback_for_fast_faces():
+    tracker = FaceTracker()
+    (track,) = tracker.update([(0, 0, 50, 50)])
+    (moved,) = tracker.update([(25, 0, 50, 50)])  # IoU 1/3 after the jump
+    assert moved is track
+    (jumped,) = tracker.update([(50, 0, 50, 50)])  # No overlap, half a face width away
+    assert jumped is track
+
+
+def test_recognition_only_when_new_or_due():
+    tracker = FaceTracker(reconfirm_interval=3)
+    (track,) = tracker.update([(0, 0, 50, 50)])
+    assert tracker.needs_recognition(track)
+    assert track.set_identity(GRANTED, tracker.frame_index)
+    assert not track.set_identity(GRANTED, tracker.frame_index)  # Same identity: no change
+
+    due = []
+    for _ in range(4):
+        tracker.update([(0, 0, 50, 50)])
+        due.append(tracker.needs_recognition(track))
+    assert due == [False, False, True, True]
+
+
+def test_lost_tracks_expire():
+    tracker = FaceTracker(max_missed=2)
+    (track,) = tracker.update([(0, 0, 50, 50)])
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.tracks == []
+    (new,) = tracker.update([(0, 0, 50, 50)])
+    assert new is not track
+    assert new.track_id != track.track_id
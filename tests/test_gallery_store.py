@@ -0,0 +1,196 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.GalleryIndex import l2_normalize
+from src.GalleryStore import EMBEDDINGS_FILE, INDEX_FILE, GalleryStore, open_gallery
+
+
+def _vectors(n_rows, seed=0):
+    return l2_normalize(np.random.default_rng(seed).normal(size=(n_rows, 128)).astype(np.float32))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return GalleryStore(str(tmp_path / "gallery"))
+
+
+def test_append_and_reopen(store):
+    vectors = _vectors(3)
+    store.append(["a", "b", "c"], ["Ann", "Bob", "Cid"], vectors * 5.0)
+    assert len(store) == 3
+    assert store.ids() == ["a", "b", "c"]
+
+    reopened = GalleryStore(store.path)
+    assert reopened.names == {"a": "Ann", "b": "Bob", "c": "Cid"}
+    assert np.allclose(reopened.embeddings, vectors, atol=1e-6)  # Stored normalized
+
+
+def test_append_validates_shapes(store):
+    with pytest.raises(ValueError):
+        store.append(["a", "b"], ["Ann"], _vectors(2))
+    with pytest.raises(ValueError):
+        store.append(["a"], ["Ann"], np.ones((1, 64), dtype=np.float32))
+
+
+def test_delete_is_a_tombstone_until_compact(store):
+    store.append(["a", "b"], ["Ann", "Bob"], _vectors(2))
+    assert store.delete("a")
+    assert not store.delete("a")
+    assert "a" not in store
+    assert list(store.live_mask()) == [False, True]
+    assert len(store.embeddings) == 2
+
+    store.compact()
+    assert len(store.embeddings) == 1
+    assert store.ids() == ["b"]
+    assert GalleryStore(store.path).ids() == ["b"]
+
+
+def test_add_replaces_an_identity(store):
+    first, second = _vectors(2)
+    store.add("a", "Ann", first)
+    store.add("a", "Ann B.", second)
+    assert len(store) == 1
+    assert store.names["a"] == "Ann B."
+    assert np.allclose(store.templates("a"), second[np.newaxis], atol=1e-6)
+
+
+def test_uncommitted_rows_are_ignored(store):
+    store.append(["a"], ["Ann"], _vectors(1))
+    # An interrupted append: embedding rows and half an index line, no commit
+    with open(os.path.join(store.path, EMBEDDINGS_FILE), "ab") as f:
+        f.write(_vectors(1, seed=1).tobytes())
+    with open(os.path.join(store.path, INDEX_FILE), "ab") as f:
+        f.write(json.dumps({"op": "add", "row": 1, "id": "b"})[:10].encode())
+
+    reopened = GalleryStore(store.path)
+    assert reopened.ids() == ["a"]
+    reopened.append(["c"], ["Cid"], _vectors(1, seed=2))
+    assert GalleryStore(store.path).ids() == ["a", "c"]
+
+
+def test_open_gallery_migrates_legacy_pickle(tmp_path):
+    import pickle
+
+    legacy = tmp_path / "embeddings.pkl"
+    with open(legacy, "wb") as f:
+        pickle.dump({"a": {"name": "Ann", "embedding": _vectors(1)[0]}, "Bob": _vectors(1, seed=1)[0]}, f)
+    store = open_gallery(str(tmp_path / "gallery"), legacy_path=str(legacy))
+    assert sorted(store.ids()) == ["Bob", "a"]
+    assert store.names["a"] == "Ann"
+
+
+# --- Multi-template identities ---
+
+def test_templates_accumulate_without_replace(store):
+    vectors = _vectors(3)
+    store.add("a", "Ann", vectors[0])
+    store.append(["a", "a"], ["Ann", "Ann"], vectors[1:], replace=False)
+    assert len(store) == 1
+    assert store.template_count() == 3
+    assert np.allclose(store.templates("a"), vectors, atol=1e-6)
+
+    store.add("a", "Ann", vectors[0])  # A plain add supersedes every template
+    assert store.template_count() == 1
+
+
+def test_compact_bounds_templates_per_identity(store):
+    store.append(["a"] * 8 + ["b"], ["Ann"] * 8 + ["Bob"], _vectors(9), replace=False)
+    store.compact(max_templates=3)
+    assert len(store.live_rows["a"]) == 3
+    assert len(store.live_rows["b"]) == 1
+    assert np.allclose(np.linalg.norm(store.templates("a"), axis=1), 1.0, atol=1e-5)
+    assert GalleryStore(store.path).template_count() == 4
+
+
+@pytest.mark.parametrize("aggregate", ('max', 'mean'))
+@pytest.mark.parametrize("index_type", ('flat', 'ivf'))
+def test_gallery_index_scores_identities(store, aggregate, index_type):
+    from src.GalleryIndex import GalleryIndex
+
+    vectors = _vectors(4)
+    store.append(["a", "a", "b", "c"], ["Ann", "Ann", "Bob", "Cid"], vectors, replace=False)
+    store.delete("c")
+    gallery = GalleryIndex(index_type=index_type, aggregate=aggregate)
+    gallery.load_store(store)
+    assert len(gallery) == 3
+
+    matches = gallery.match(vectors, k=2)
+    assert [top[0][0] for top in matches[:3]] == ["a", "a", "b"]
+    assert all(user_id != "c" for top in matches for user_id, _ in top)
+    assert all(len({user_id for user_id, _ in top}) == len(top) for top in matches)
+    if aggregate == 'max':
+        assert matches[0][0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+# --- Incremental updates ---
+
+def test_refresh_applies_other_writers_records(store):
+    from src.GalleryIndex import GalleryIndex
+
+    reader = GalleryStore(store.path)
+    gallery = GalleryIndex()
+    gallery.load_store(reader)
+
+    vectors = _vectors(2)
+    store.append(["a", "b"], ["Ann", "Bob"], vectors)
+    records = reader.refresh()
+    assert [record["id"] for record in records] == ["a", "b"]
+    assert gallery.sync_store(reader)
+    assert not gallery.sync_store(reader)
+    assert gallery.match(vectors[1:], k=1)[0][0][0] == "b"
+
+    store.delete("b")
+    reader.refresh()
+    gallery.sync_store(reader)
+    assert gallery.match(vectors[1:], k=1)[0][0][0] == "a"
+
+
+def test_refresh_reloads_after_compaction(store):
+    store.append(["a", "b"], ["Ann", "Bob"], _vectors(2))
+    reader = GalleryStore(store.path)
+    generation = reader.generation
+
+    store.delete("a")
+    store.compact()
+    assert reader.refresh() is None  # Rewritten: full reload
+    assert reader.generation == generation + 1
+    assert reader.ids() == ["b"]
+    assert len(reader.embeddings) == 1
+
+
+
+def test_readers_wait_for_compaction_to_publish_both_files(store, monkeypatch):
+    import threading
+
+    from src import GalleryStore as gallery_store_module
+
+    if gallery_store_module.fcntl is None:
+        pytest.skip("needs fcntl file locks")
+    vectors = _vectors(3)
+    store.append(["a", "b", "c"], ["Ann", "Bob", "Cid"], vectors)
+    store.delete("a")
+
+    readers, threads = [], []
+    atomic_write = gallery_store_module._atomic_write
+
+    def write_then_open_reader(path, data):
+        atomic_write(path, data)
+        if path.endswith(EMBEDDINGS_FILE):
+            # New embeddings are in place but the index is not: a reader must not load now
+            thread = threading.Thread(target=lambda: readers.append(GalleryStore(store.path)))
+            thread.start()
+            thread.join(timeout=0.2)
+            assert thread.is_alive()
+            threads.append(thread)
+
+    monkeypatch.setattr(gallery_store_module, "_atomic_write", write_then_open_reader)
+    store.compact()
+    threads[0].join(timeout=5)
+
+    reader, = readers
+    assert reader.ids() == ["b", "c"]
+    assert np.allclose(reader.embeddings, vectors[1:], atol=1e-6)
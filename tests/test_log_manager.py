@@ -0,0 +1,49 @@
+import sqlite3
+
+from src.LogManager import LogManager
+
+
+def _collect(log_manager):
+    written = []
+    log_manager.add_listener(written.extend)
+    return written
+
+
+def test_listener_rows_carry_committed_ids(tmp_path):
+    db_file = str(tmp_path / "access_log.db")
+    log_manager = LogManager(db_file, flush_interval=0.05)
+    written = _collect(log_manager)
+    try:
+        log_manager.log_access_event("alice", "Granted", 0.9)
+        log_manager.flush()
+
+        # Another connection writes (and AUTOINCREMENT skips ids) between our batches
+        with sqlite3.connect(db_file) as other:
+            other.execute("INSERT INTO access_log (id, timestamp, user_id, status, confidence) "
+                          "VALUES (50, '2024-01-01 00:00:00', 'bob', 'Granted', 0.8)")
+            other.execute("DELETE FROM access_log WHERE id = 50")
+
+        log_manager.log_access_event("carol", "Granted", 0.7)
+        log_manager.log_access_event("Unknown", "Denied", 0.2)
+        log_manager.flush()
+
+        committed = {row[0]: row for row in log_manager.get_logs(limit=10)}
+        assert [row[0] for row in written] == [1, 51, 52]
+        for row in written:
+            assert committed[row[0]] == row
+    finally:
+        log_manager.close()
+
+
+def test_get_logs_pages_newest_first():
+    log_manager = LogManager(batch_size=1000)
+    try:
+        for i in range(5):
+            log_manager.log_access_event(f"user{i}", "Granted", 0.9)
+        log_manager.flush()
+        first = log_manager.get_logs(limit=2)
+        assert [row[3] for row in first] == ["user4", "user3"]
+        second = log_manager.get_logs(limit=2, before_id=first[-1][0])
+        assert [row[3] for row in second] == ["user2", "user1"]
+    finally:
+        log_manager.close()
@@ -0,0 +1,181 @@
+import numpy as np
+import pytest
+
+import src.RecognitionModel as recognition_module
+from src.PerfStats import PerfStats
+from src.RecognitionModel import RecognitionModel
+
+FACE_BOX = (40, 30, 60, 60)
+
+
+class _ReadyRegistry:
+    """Stands in for ModelRegistry: nothing to build or warm."""
+
+    def warm_up(self, background=True):
+        pass
+
+    def wait_until_ready(self, timeout=None):
+        return True
+
+    def is_ready(self):
+        return True
+
+
+def _unit(seed):
+    vector = np.random.default_rng(seed).normal(size=128).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def make_model(tmp_path, monkeypatch):
+    """RecognitionModel on an empty gallery with the DeepFace detector and embedder stubbed out."""
+    monkeypatch.chdir(tmp_path)  # Keep the legacy pickle migration away from the repo's data/
+    calls = {'detect': 0, 'embed': 0}
+
+    def make(boxes=(FACE_BOX,), embedding=None, **params):
+        def run_detector(image, backend_name):
+            calls['detect'] += 1
+            return list(boxes)
+
+        def embed(face_crops):
+            calls['embed'] += len(face_crops)
+            return np.tile(embedding if embedding is not None else _unit(0), (len(face_crops), 1))
+
+        monkeypatch.setattr(recognition_module, "extract_embeddings", embed)
+        params.setdefault('motion_gate', False)
+        model = RecognitionModel(gallery_path=str(tmp_path / "gallery"), warm_up=False, watch_gallery=False, **params)
+        model.models = _ReadyRegistry()
+        model.perf = PerfStats()
+        monkeypatch.setattr(model, "_run_detector", run_detector)
+        return model, calls
+
+    return make
+
+
+def _frame():
+    return np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("precision", ('float16', 'int8'))
+def test_reduced_precision_on_empty_gallery(make_model, precision):
+    model, _ = make_model(index_params={'precision': precision}, embedding_cache=False)
+    assert model.analyze_frame(_frame())[0]['matched'] is False
+    model.add_identity("alice", "Alice", _unit(0))
+    model.tracker.reset()
+    assert model.analyze_frame(_frame())[0]['user_id'] == "alice"
+
+
+def test_frame_without_faces(make_model):
+    model, calls = make_model(boxes=(), embedding_cache=False)
+    assert model.analyze_frame(_frame()) == []
+    assert calls['embed'] == 0
+
+
+def test_known_face_is_granted_once_per_track(make_model):
+    model, calls = make_model(embedding_cache=False)
+    model.add_identity("alice", "Alice", _unit(0))
+
+    first = model.analyze_frame(_frame())
+    assert len(first) == 1
+    assert first[0]['user_id'] == "alice"
+    assert first[0]['status'] == "Granted"
+    assert first[0]['box'] == FACE_BOX
+    assert first[0]['recognized'] and first[0]['identity_changed']
+
+    # The tracked face keeps its identity without another embedder call
+    second = model.analyze_frame(_frame())
+    assert second[0]['user_id'] == "alice"
+    assert not second[0]['recognized'] and not second[0]['identity_changed']
+    assert calls['embed'] == 1
+
+
+def test_unknown_face_is_denied(make_model):
+    model, _ = make_model(embedding=_unit(1), embedding_cache=False)
+    model.add_identity("alice", "Alice", _unit(0))
+    results = model.analyze_frame(_frame())
+    assert results[0]['user_id'] == "Unknown"
+    assert results[0]['status'] == "Denied"
+    assert results[0]['matched']
+
+
+def test_embedding_cache_skips_unchanged_crop(make_model):
+    from src.FaceTracker import FaceTracker
+
+    model, calls = make_model()
+    # Re-confirm on every frame, so only the cache can save the embedder call
+    model.tracker = FaceTracker(reconfirm_interval=0)
+    model.add_identity("alice", "Alice", _unit(0))
+    for _ in range(3):
+        results = model.analyze_frame(_frame())
+        assert results[0]['user_id'] == "alice"
+    assert calls['embed'] == 1
+    assert model.embedding_cache.stats()['hits'] == 2
+
+
+def test_new_track_at_a_cached_spot_is_embedded(make_model, monkeypatch):
+    from src.FaceTracker import FaceTracker
+
+    model, _ = make_model()
+    model.tracker = FaceTracker(max_missed=0, reconfirm_interval=0)
+    model.add_identity("alice", "Alice", _unit(0))
+    assert model.analyze_frame(_frame())[0]['user_id'] == "alice"
+
+    # Alice leaves; someone else appears at the same spot with an identical-looking crop
+    detect = model._run_detector
+    model._run_detector = lambda image, backend_name: []
+    model.analyze_frame(_frame())
+    model._run_detector = detect
+    monkeypatch.setattr(recognition_module, "extract_embeddings",
+                        lambda face_crops: np.tile(_unit(1), (len(face_crops), 1)))
+
+    results = model.analyze_frame(_frame())
+    assert results[0]['user_id'] == "Unknown"
+    assert model.embedding_cache.stats()['hits'] == 0
+
+
+def test_analyze_frames_batches_streams(make_model):
+    from src.FaceTracker import FaceTracker
+
+    model, calls = make_model(embedding_cache=False)
+    model.add_identity("alice", "Alice", _unit(0))
+    results = model.analyze_frames([_frame(), _frame()], trackers=[FaceTracker(), FaceTracker()])
+    assert [len(frame_results) for frame_results in results] == [1, 1]
+    assert calls['embed'] == 2
+
+
+def test_detector_failure_returns_none(make_model):
+    model, _ = make_model()
+
+    def broken(image, backend_name):
+        raise RuntimeError("detector down")
+
+    model._run_detector = broken
+    assert model.analyze_frame(_frame()) is None
+    assert model.perf.snapshot()['counters']['detect_failures'] == 1
+
+
+def test_frame_timer_closed_when_analysis_raises(make_model):
+    model, _ = make_model()
+
+    def broken(*args):
+        raise RuntimeError("boom")
+
+    model._analyze_frames = broken
+    model.perf.request_profile(frames=1)
+    with pytest.raises(RuntimeError):
+        model.analyze_frame(_frame())
+    assert model.perf._profiler is None
+
+
+def test_pool_worker_keys_keep_streams_apart(make_model):
+    # InferencePool workers pass one FaceTracker(reconfirm_interval=0) per stream
+    from src.FaceTracker import FaceTracker
+
+    model, calls = make_model()
+    model.add_identity("alice", "Alice", _unit(0))
+    door, lobby = FaceTracker(reconfirm_interval=0), FaceTracker(reconfirm_interval=0)
+    for key in (door, lobby, door, lobby):
+        results = model.analyze_frame(_frame(), tracker=key)
+        assert results[0]['recognized']
+    # One embedding per stream: the second frame of each stream hits its own track's cache entry
+    assert calls['embed'] == 2
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from src.GalleryIndex import GalleryIndex, l2_normalize
+from src.SearchIndex import FlatIndex, IVFIndex, quantize
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+def _gallery(n_rows, dim=128, seed=0):
+    return l2_normalize(np.random.default_rng(seed).normal(size=(n_rows, dim)).astype(np.float32))
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_flat_index_on_empty_gallery(precision):
+    index = FlatIndex(precision=precision)
+    index.build(np.empty((0, 0), dtype=np.float32))
+    assert index.codes is None
+    assert index.report()['memory_ratio'] == 1.0
+
+    # The first registration quantizes the whole (one-row) gallery
+    matrix = _gallery(1)
+    index.add(matrix)
+    rows, scores = index.search(matrix, k=1)
+    assert rows[0, 0] == 0
+    assert scores[0, 0] == pytest.approx(1.0, abs=0.02)
+    if precision != 'float32':
+        assert len(index.codes) == 1
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_flat_index_finds_each_row(precision):
+    matrix = _gallery(500)
+    index = FlatIndex(precision=precision, chunk_rows=128)
+    index.build(matrix)
+    rows, _ = index.search(matrix[:50], k=3)
+    assert np.array_equal(rows[:, 0], np.arange(50))
+
+
+@pytest.mark.parametrize("precision", ('float16', 'int8'))
+def test_flat_index_add_extends_codes(precision):
+    matrix = _gallery(300)
+    index = FlatIndex(precision=precision)
+    index.build(matrix[:200])
+    index.add(matrix)
+    assert len(index.codes) == 300
+    rows, _ = index.search(matrix[250:260], k=1)
+    assert np.array_equal(rows[:, 0], np.arange(250, 260))
+
+
+def test_int8_rerank_returns_exact_scores():
+    matrix = _gallery(1000)
+    queries = _gallery(20, seed=1)
+    index = FlatIndex(precision='int8', rerank=10)
+    index.build(matrix)
+    rows, scores = index.search(queries, k=5)
+    assert np.allclose(scores, np.einsum('qd,qkd->qk', queries, matrix[rows]), atol=1e-5)
+
+
+def test_int8_quantization_error_is_small():
+    matrix = _gallery(200)
+    codes, scales = quantize(matrix, 'int8')
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - matrix).max() < 0.01
+
+    index = FlatIndex(precision='int8')
+    index.build(matrix)
+    report = index.report()
+    assert report['memory_ratio'] > 3.5
+    assert report['max_abs_score_error'] < 0.02
+
+
+def test_dead_rows_are_masked():
+    matrix = _gallery(10)
+    dead = np.zeros(10, dtype=bool)
+    dead[3] = True
+    for index in (FlatIndex(), FlatIndex(precision='int8', rerank=4)):
+        index.build(matrix)
+        rows, scores = index.search(matrix[3:4], k=10, dead=dead)
+        assert 3 not in rows[0][np.isfinite(scores[0])]
+
+
+@pytest.mark.parametrize("precision", PRECISIONS)
+def test_gallery_index_empty_then_add(precision):
+    gallery = GalleryIndex(index_type='flat', precision=precision)
+    assert gallery.match(_gallery(1), k=1) == [[]]
+    vector = _gallery(1, seed=3)
+    gallery.add(vector[0], "alice")
+    assert gallery.match(vector, k=1)[0][0][0] == "alice"
+
+
+# --- IVF ---
+
+def _clustered(n_clusters=16, per_cluster=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = _gallery(n_clusters, seed=seed)
+    rows = np.repeat(centres, per_cluster, axis=0) + 0.05 * rng.normal(size=(n_clusters * per_cluster, 128))
+    return l2_normalize(rows.astype(np.float32))
+
+
+def test_ivf_small_gallery_is_exact():
+    matrix = _gallery(100)
+    index = IVFIndex(min_rows=4096)
+    index.build(matrix)
+    assert index.centroids is None
+    rows, _ = index.search(matrix[:10], k=1)
+    assert np.array_equal(rows[:, 0], np.arange(10))
+
+
+def test_ivf_recall_and_incremental_add(tmp_path):
+    matrix = _clustered()
+    path = str(tmp_path / "ivf.index.npz")
+    index = IVFIndex(n_lists=16, nprobe=4, min_rows=256)
+    index.build(matrix[:768], path=path)
+    assert index.centroids is not None
+
+    index.add(matrix, path=path)
+    assert len(index.assignments) == len(matrix)
+    rows, _ = index.search(matrix[::16], k=1)
+    assert np.mean(rows[:, 0] == np.arange(0, len(matrix), 16)) >= 0.95
+
+    # A fresh index reuses the persisted centroids instead of retraining
+    reloaded = IVFIndex(n_lists=16, nprobe=4, min_rows=256)
+    reloaded.build(matrix, path=path)
+    assert np.allclose(reloaded.centroids, index.centroids)
+
+
+def test_ivf_masks_dead_rows():
+    matrix = _clustered()
+    index = IVFIndex(n_lists=16, nprobe=16, min_rows=256)
+    index.build(matrix)
+    dead = np.zeros(len(matrix), dtype=bool)
+    dead[5] = True
+    rows, scores = index.search(matrix[5:6], k=3, dead=dead)
+    assert 5 not in rows[0][np.isfinite(scores[0])]